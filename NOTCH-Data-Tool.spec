@@ -6,7 +6,7 @@ a = Analysis(
     pathex=[],
     binaries=[],
     datas=[('readme.md', '.'), ('modules/*.py', 'modules'), ('weather.csv', '.')],
-    hiddenimports=['modules.app', 'modules.config', 'modules.midi', 'modules.weather_tab', 'modules.settings_tab', 'modules.midi_tab'],
+    hiddenimports=['modules.app', 'modules.config', 'modules.midi', 'modules.weather_tab', 'modules.settings_tab', 'modules.midi_tab', 'modules.weather_store', 'modules.binary_history', 'modules.history_db', 'modules.write_behind', 'modules.weather_api', 'modules.fetch_worker', 'modules.http_client', 'modules.weather_cache', 'modules.scheduler', 'modules.adaptive_polling', 'modules.rate_limiter', 'modules.circuit_breaker', 'modules.city_index', 'modules.geolocation', 'modules.forecast_store', 'modules.backfill', 'modules.midi_mapping', 'modules.cc_interpolator'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
@@ -166,7 +166,25 @@ def build_executable():
             '--hidden-import=modules.midi',
             '--hidden-import=modules.weather_tab',
             '--hidden-import=modules.settings_tab',
-            '--hidden-import=modules.midi_tab'
+            '--hidden-import=modules.midi_tab',
+            '--hidden-import=modules.weather_store',
+            '--hidden-import=modules.binary_history',
+            '--hidden-import=modules.history_db',
+            '--hidden-import=modules.write_behind',
+            '--hidden-import=modules.weather_api',
+            '--hidden-import=modules.fetch_worker',
+            '--hidden-import=modules.http_client',
+            '--hidden-import=modules.weather_cache',
+            '--hidden-import=modules.scheduler',
+            '--hidden-import=modules.adaptive_polling',
+            '--hidden-import=modules.rate_limiter',
+            '--hidden-import=modules.circuit_breaker',
+            '--hidden-import=modules.city_index',
+            '--hidden-import=modules.geolocation',
+            '--hidden-import=modules.forecast_store',
+            '--hidden-import=modules.backfill',
+            '--hidden-import=modules.midi_mapping',
+            '--hidden-import=modules.cc_interpolator'
         ])
         
         # Update to use the new main file
@@ -0,0 +1,108 @@
+"""
+Adaptive polling interval module for NOTCH Data Tool
+"""
+from modules.rate_limiter import get_limiter
+
+# Interval multipliers
+TIGHTEN_FACTOR = 0.5   # Readings are changing quickly
+ADVANCE_FACTOR = 0.8   # A new observation arrived but changed little
+BACKOFF_FACTOR = 1.5   # The provider returned the same observation again
+
+# Rates of change (per hour) that count as fast changing weather
+FAST_CHANGE_RATES = {
+    'temperature': 2.0,   # °C per hour
+    'pressure': 3.0,      # hPa per hour
+    'wind_speed': 5.0     # m/s per hour
+}
+
+
+def _to_float(value):
+    """Convert a record value to float, None if missing"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def changes_quickly(previous, latest, elapsed):
+    """
+    Check if the weather changed fast between two records
+
+    Args:
+        previous: Earlier weather_data record
+        latest: Newer weather_data record
+        elapsed: Seconds between the two observations
+    """
+    if previous.get('description') != latest.get('description'):
+        return True
+
+    hours = max(elapsed, 60) / 3600
+    for field, rate in FAST_CHANGE_RATES.items():
+        before = _to_float(previous.get(field))
+        after = _to_float(latest.get(field))
+        if before is not None and after is not None and abs(after - before) / hours >= rate:
+            return True
+    return False
+
+
+class AdaptivePolling:
+    """
+    Chooses the next polling interval from how the weather is changing
+
+    The interval is halved while readings change quickly, shortened a
+    little whenever the provider publishes a new observation, and grown
+    while the same observation keeps coming back. It always stays between
+    min_interval and max_interval, and is stretched further if needed so
+    polling stays within the daily quota of the rate limiter, which
+    counts every request made with the API key.
+    """
+
+    def __init__(self, min_interval, max_interval):
+        self.min_interval = max(1, min_interval)
+        self.max_interval = max(self.min_interval, max_interval)
+
+    def budget_interval(self, api_key, requests_per_update=1):
+        """
+        Shortest interval the daily quota of the rate limiter allows
+
+        The tokens left in the API key's day bucket plus one day of refill
+        are spread over the next 24 hours. With a full bucket updates may run
+        at twice the sustainable rate; as the bucket empties the interval
+        approaches the time the bucket needs to refill one update's requests.
+
+        Returns:
+            float: Seconds
+        """
+        limiter = get_limiter()
+        remaining = limiter.remaining(api_key)['day']
+        return 86400 * max(1, requests_per_update) / (remaining + limiter.per_day)
+
+    def next_interval(self, current, previous, latest, api_key, requests_per_update=1):
+        """
+        Interval in seconds to use after the latest reading
+
+        Args:
+            current: Interval in use now
+            previous: Previous weather_data record of the main city (or None)
+            latest: Latest weather_data record of the main city (or None)
+            api_key: API key the requests are counted against
+            requests_per_update: Requests one update needs (more with several cities)
+        """
+        interval = current
+        if previous and latest:
+            observed_before = _to_float(previous.get('observed'))
+            observed_now = _to_float(latest.get('observed'))
+            if observed_before is None or observed_now is None:
+                elapsed = current
+            else:
+                elapsed = observed_now - observed_before
+
+            if observed_before is not None and elapsed == 0:
+                interval = current * BACKOFF_FACTOR
+            elif changes_quickly(previous, latest, elapsed):
+                interval = current * TIGHTEN_FACTOR
+            else:
+                interval = current * ADVANCE_FACTOR
+
+        interval = min(self.max_interval, max(self.min_interval, interval))
+        interval = max(interval, self.budget_interval(api_key, requests_per_update))
+        return int(round(interval))
@@ -3,12 +3,24 @@ Main application module for NOTCH Data Tool
 """
 import tkinter as tk
 from tkinter import ttk
-import threading
+import os
 
-from modules.config import CONFIG_FILE, DEFAULT_CITY, DEFAULT_INTERVAL, DEFAULT_WEATHER_FILE, DEFAULT_MIDI_CONFIG
+from modules.config import (CONFIG_FILE, DEFAULT_CITY, DEFAULT_INTERVAL, DEFAULT_WEATHER_FILE, DEFAULT_MIDI_CONFIG,
+                            DEFAULT_CSV_LAYOUT, DEFAULT_ROTATION, DEFAULT_ROTATION_MAX_BYTES, DEFAULT_BINARY_HISTORY,
+                            DEFAULT_HISTORY_BACKEND, DEFAULT_FLUSH_INTERVAL, DEFAULT_FLUSH_BATCH_SIZE,
+                            DEFAULT_EXTRA_CITIES, DEFAULT_PARTITION_BY_CITY, DEFAULT_BATCH_REQUESTS,
+                            DEFAULT_API_BASE_URL, DEFAULT_CACHE_TTL, DEFAULT_CACHE_PERSIST, DEFAULT_SKIP_DUPLICATES,
+                            DEFAULT_ALIGN_UPDATES, DEFAULT_ADAPTIVE_POLLING, DEFAULT_MIN_INTERVAL,
+                            DEFAULT_MAX_INTERVAL, DEFAULT_RATE_LIMIT_PER_MINUTE,
+                            DEFAULT_RATE_LIMIT_PER_DAY, DEFAULT_STALE_FALLBACK, DEFAULT_FORECAST_ENABLED,
+                            DEFAULT_FORECAST_INTERVAL, DEFAULT_CC_RATE, DEFAULT_RAMP_SECONDS)
 from modules.weather_tab import WeatherTab
 from modules.midi_tab import MidiTab
 from modules.settings_tab import SettingsTab
+from modules.scheduler import PollScheduler
+from modules.adaptive_polling import AdaptivePolling
+from modules.rate_limiter import configure_limiter, get_limiter
+from modules.weather_store import list_segments
 
 class NOTCHDataTool:
     def __init__(self, root):
@@ -23,12 +35,43 @@ class NOTCHDataTool:
         self.city = DEFAULT_CITY
         self.update_interval = DEFAULT_INTERVAL
         self.weather_file = DEFAULT_WEATHER_FILE
+        self.csv_layout = DEFAULT_CSV_LAYOUT
+        self.rotation = DEFAULT_ROTATION
+        self.rotation_max_bytes = DEFAULT_ROTATION_MAX_BYTES
+        self.binary_history = DEFAULT_BINARY_HISTORY
+        self.history_backend = DEFAULT_HISTORY_BACKEND
+        self.flush_interval = DEFAULT_FLUSH_INTERVAL
+        self.flush_batch_size = DEFAULT_FLUSH_BATCH_SIZE
+        self.extra_cities = DEFAULT_EXTRA_CITIES
+        self.partition_by_city = DEFAULT_PARTITION_BY_CITY
+        self.batch_requests = DEFAULT_BATCH_REQUESTS
+        self.api_base_url = DEFAULT_API_BASE_URL
+        self.cache_ttl = DEFAULT_CACHE_TTL
+        self.cache_persist = DEFAULT_CACHE_PERSIST
+        self.skip_duplicates = DEFAULT_SKIP_DUPLICATES
+        self.align_updates = DEFAULT_ALIGN_UPDATES
+        self.adaptive_polling = DEFAULT_ADAPTIVE_POLLING
+        self.min_interval = DEFAULT_MIN_INTERVAL
+        self.max_interval = DEFAULT_MAX_INTERVAL
+        self.rate_limit_per_minute = DEFAULT_RATE_LIMIT_PER_MINUTE
+        self.rate_limit_per_day = DEFAULT_RATE_LIMIT_PER_DAY
+        self.stale_fallback = DEFAULT_STALE_FALLBACK
+        self.forecast_enabled = DEFAULT_FORECAST_ENABLED
+        self.forecast_interval = DEFAULT_FORECAST_INTERVAL
+        self.city_ids = {}  # Lower-case city query -> OpenWeatherMap city ID
+        self.city_coords = {}  # Lower-case city query -> (lat, lon) from geolocation
         
         # MIDI variables
         self.midi_outputs = {}
         self.current_midi_port = None
         self.midi_presets = []
         self.midi_channel = 1
+        self.midi_mappings = []  # Weather field -> CC bindings (see midi_mapping)
+        self.midi_mapping_enabled = False
+        self.midi_smoothing = False  # Ramp mapped CCs between readings (see cc_interpolator)
+        self.midi_cc_rate = DEFAULT_CC_RATE
+        self.midi_ramp_seconds = DEFAULT_RAMP_SECONDS
+        self.midi_refresh_seconds = 0  # Resend all cached CC values this often (0 = off)
         
         # Load config and MIDI settings
         self.load_config()
@@ -60,6 +103,9 @@ class NOTCHDataTool:
         # Create status bar
         self.create_status_bar()
         
+        # Per API key rate limits shared by all requests
+        configure_limiter(self.rate_limit_per_minute, self.rate_limit_per_day)
+        
         # Initialize tab modules
         self.weather = WeatherTab(self)
         self.midi = MidiTab(self)
@@ -68,12 +114,19 @@ class NOTCHDataTool:
         # Check if we need to migrate CSV format
         self.weather.check_and_migrate_csv_format()
         
-        # Start weather update thread if API key exists
-        self.running = True
+        # Periodic weather updates (started once an API key exists)
+        self.scheduler = PollScheduler(lambda: self.root.after(0, self.weather.fetch_weather),
+                                       self.update_interval, self.align_updates)
+        self.forecast_scheduler = PollScheduler(lambda: self.root.after(0, self.weather.fetch_forecast),
+                                                self.forecast_interval, self.align_updates)
+        
+        # Adaptive interval, kept within the daily quota of the rate limiter
+        self.adaptive = AdaptivePolling(self.min_interval, self.max_interval)
+        self.last_reading = None
+        self.update_interval_label()
+        self.update_quota_label()
         if self.api_key:
-            self.update_thread = threading.Thread(target=self.update_loop)
-            self.update_thread.daemon = True
-            self.update_thread.start()
+            self.start_updates()
             
             # Initial fetch
             self.weather.fetch_weather()
@@ -205,32 +258,85 @@ class NOTCHDataTool:
         self.interval_label = ttk.Label(status_frame, text=f"Update: {self.update_interval//60} min", anchor=tk.CENTER)
         self.interval_label.pack(side=tk.LEFT, padx=10, pady=5)
         
+        self.storage_label = ttk.Label(status_frame, text="Queue: 0", anchor=tk.CENTER, style="Path.TLabel")
+        self.storage_label.pack(side=tk.LEFT, padx=10, pady=5)
+        
+        self.quota_label = ttk.Label(status_frame, text="", anchor=tk.CENTER, style="Path.TLabel")
+        self.quota_label.pack(side=tk.LEFT, padx=10, pady=5)
+        
         self.refresh_button = ttk.Button(status_frame, text="Refresh", command=lambda: self.weather.fetch_weather())
         self.refresh_button.pack(side=tk.RIGHT, padx=10, pady=5)
 
-    def update_loop(self):
-        """Background thread to update weather periodically"""
-        import os
-        import time
-        
+    def start_updates(self):
+        """Show the stored weather and start the periodic updates (once)"""
+        if self.scheduler.is_running():
+            return
+            
         # Try to load existing data first
-        if os.path.exists(self.weather_file):
+        if os.path.exists(self.weather_file) or list_segments(self.weather_file):
             self.root.after(0, self.weather.load_weather_from_csv)
             
-        while self.running:
-            time.sleep(self.update_interval)  # Use the customizable interval
-            if self.running:
-                # Use after to schedule UI update on main thread
-                self.root.after(0, self.weather.fetch_weather)
+        self.scheduler.start()
+        self.start_forecast_updates()
+
+    def start_forecast_updates(self):
+        """Start the forecast updates if they are enabled (once), beginning with a refresh"""
+        if not self.forecast_enabled or not self.api_key or self.forecast_scheduler.is_running():
+            return
+        self.forecast_scheduler.start()
+        self.weather.fetch_forecast()
+
+    def adapt_interval(self, weather_data, request_count):
+        """
+        In adaptive mode, choose the next interval after an update
+        
+        Args:
+            weather_data: Latest record of the main city (None if its fetch failed)
+            request_count: HTTP requests the update made
+        """
+        if not self.adaptive_polling or weather_data is None:
+            return
+            
+        interval = self.adaptive.next_interval(self.scheduler.interval, self.last_reading, weather_data,
+                                               self.api_key, max(1, request_count))
+        self.last_reading = weather_data
+        if interval != self.scheduler.interval:
+            self.scheduler.set_interval(interval)
+        self.update_interval_label()
+
+    def update_interval_label(self):
+        """Show the interval currently used by the scheduler"""
+        interval = self.scheduler.interval
+        text = f"Update: {interval} s" if interval < 60 else f"Update: {interval / 60:.3g} min"
+        if self.adaptive_polling:
+            text += " (adaptive)"
+        self.interval_label.config(text=text)
+
+    def update_quota_label(self):
+        """Show the requests the rate limiter still allows for the API key"""
+        if not self.api_key:
+            self.quota_label.config(text="")
+            return
+        remaining = get_limiter().remaining(self.api_key)
+        self.quota_label.config(text=f"API: {remaining['minute']}/min, {remaining['day']}/day")
 
     def on_closing(self):
         """Cleanup when closing the application"""
-        self.running = False
+        # Cancel pending updates
+        self.scheduler.stop()
+        self.forecast_scheduler.stop()
         
         # Close MIDI connection if open
         if self.midi:
             self.midi.close_connection()
         
+        # Write any queued weather records and close the history stores
+        self.weather.close()
+        
+        # Close pooled HTTP connections
+        from modules.http_client import close_client
+        close_client()
+        
         self.root.destroy()
     
     def load_config(self):
@@ -243,11 +349,43 @@ class NOTCHDataTool:
             self.city = config_data['city']
             self.update_interval = config_data['update_interval']
             self.weather_file = config_data['weather_file']
+            self.csv_layout = config_data['csv_layout']
+            self.rotation = config_data['rotation']
+            self.rotation_max_bytes = config_data['rotation_max_bytes']
+            self.binary_history = config_data['binary_history']
+            self.history_backend = config_data['history_backend']
+            self.flush_interval = config_data['flush_interval']
+            self.flush_batch_size = config_data['flush_batch_size']
+            self.extra_cities = config_data['extra_cities']
+            self.partition_by_city = config_data['partition_by_city']
+            self.batch_requests = config_data['batch_requests']
+            self.api_base_url = config_data['api_base_url']
+            self.cache_ttl = config_data['cache_ttl']
+            self.cache_persist = config_data['cache_persist']
+            self.skip_duplicates = config_data['skip_duplicates']
+            self.align_updates = config_data['align_updates']
+            self.adaptive_polling = config_data['adaptive_polling']
+            self.min_interval = config_data['min_interval']
+            self.max_interval = config_data['max_interval']
+            self.rate_limit_per_minute = config_data['rate_limit_per_minute']
+            self.rate_limit_per_day = config_data['rate_limit_per_day']
+            self.stale_fallback = config_data['stale_fallback']
+            self.forecast_enabled = config_data['forecast_enabled']
+            self.forecast_interval = config_data['forecast_interval']
+            self.city_ids = config_data['city_ids']
+            self.city_coords = config_data['city_coords']
 
     def save_config(self):
         """Save configuration to config file - stub method to be implemented in config module"""
         from modules.config import save_config
-        save_config(CONFIG_FILE, self.config, self.api_key, self.city, self.update_interval, self.weather_file)
+        save_config(CONFIG_FILE, self.config, self.api_key, self.city, self.update_interval, self.weather_file,
+                    self.csv_layout, self.rotation, self.rotation_max_bytes, self.binary_history,
+                    self.history_backend, self.flush_interval, self.flush_batch_size, self.extra_cities,
+                    self.partition_by_city, self.batch_requests, self.api_base_url, self.city_ids,
+                    self.cache_ttl, self.cache_persist, self.skip_duplicates, self.align_updates,
+                    self.adaptive_polling, self.min_interval, self.max_interval,
+                    self.rate_limit_per_minute, self.rate_limit_per_day, self.stale_fallback, self.city_coords,
+                    self.forecast_enabled, self.forecast_interval)
     
     def load_midi_config(self):
         """Load MIDI configuration - stub method to be implemented in midi module"""
@@ -255,11 +393,19 @@ class NOTCHDataTool:
         midi_data = load_midi_config(DEFAULT_MIDI_CONFIG)
         self.midi_presets = midi_data['presets']
         self.midi_channel = midi_data['channel']
+        self.midi_mappings = midi_data['mappings']
+        self.midi_mapping_enabled = midi_data['mapping_enabled']
+        self.midi_smoothing = midi_data['smoothing']
+        self.midi_cc_rate = midi_data['cc_rate']
+        self.midi_ramp_seconds = midi_data['ramp_seconds']
+        self.midi_refresh_seconds = midi_data['refresh_seconds']
     
     def save_midi_config(self):
         """Save MIDI configuration - stub method to be implemented in midi module"""
         from modules.midi import save_midi_config
-        save_midi_config(DEFAULT_MIDI_CONFIG, self.midi_presets, self.midi_channel)
+        save_midi_config(DEFAULT_MIDI_CONFIG, self.midi_presets, self.midi_channel, self.midi_mappings,
+                         self.midi_mapping_enabled, self.midi_smoothing, self.midi_cc_rate, self.midi_ramp_seconds,
+                         self.midi_refresh_seconds)
     
     def init_midi(self):
         """Initialize MIDI - stub method to be implemented in midi module"""
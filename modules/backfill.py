@@ -0,0 +1,288 @@
+"""
+Historical backfill module for NOTCH Data Tool
+"""
+import argparse
+import csv
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+
+from modules.binary_history import NUMPY_AVAILABLE, BinaryHistoryStore, history_dir_for
+from modules.config import CONFIG_FILE, load_config
+from modules.history_db import BACKEND_SQLITE, HistoryDatabase, database_path_for, row_timestamp
+from modules.rate_limiter import configure_limiter
+from modules.weather_api import HISTORY_API_BASE_URL, build_history_record, fetch_history
+from modules.weather_store import (LAYOUT_NEWEST_FIRST, city_file_for, city_name, history_files,
+                                   merge_segment_rows, segment_path_for)
+
+# Parallel history requests
+DEFAULT_WORKERS = 4
+
+
+def checkpoint_path_for(weather_file):
+    """Path of the file recording the started and finished days of a backfill"""
+    return f"{weather_file}.backfill.json"
+
+def day_ranges(start, end):
+    """
+    Split a date range into whole local days
+
+    Args:
+        start: First day (date or datetime)
+        end: Last day, included
+
+    Returns:
+        list: (date string, start epoch, end epoch) per day, oldest first
+    """
+    day = datetime(start.year, start.month, start.day)
+    last = datetime(end.year, end.month, end.day)
+    days = []
+    while day <= last:
+        following = day + timedelta(days=1)
+        days.append((day.strftime("%Y-%m-%d"), int(day.timestamp()), int(following.timestamp())))
+        day = following
+    return days
+
+def oldest_row_time(weather_file, city, skip=()):
+    """
+    Epoch time of the oldest row of a city in a history (current file and rotated segments), or None
+
+    A row counts from its provider observation time when that is earlier
+    than the time it was written. Files are read oldest first and the
+    search stops at the first file holding rows of the city.
+
+    Args:
+        skip: Paths of files to leave out
+    """
+    name = city_name(city).lower()
+    for path in history_files(weather_file):
+        if path in skip:
+            continue
+        oldest = None
+        try:
+            with open(path, 'r', newline='') as f:
+                for row in csv.DictReader(f):
+                    if row.get('city', '').lower() != name:
+                        continue
+                    timestamp = row_timestamp(row)
+                    try:
+                        timestamp = min(timestamp, int(float(row['observed'])))
+                    except (KeyError, TypeError, ValueError):
+                        pass
+                    if timestamp is not None and (oldest is None or timestamp < oldest):
+                        oldest = timestamp
+        except FileNotFoundError:
+            continue
+        if oldest is not None:
+            return oldest
+    return None
+
+
+class Backfill:
+    """
+    Fills a city's history with past hourly data, one day per request
+
+    Days are fetched by a bounded pool of worker threads. Each finished
+    day is merged into its own dated segment of the history
+    (weather-YYYY-MM-DD.csv), which sorts before the current file, so the
+    history stays in timestamp order without rewriting the current file.
+    Rows at or after the city's oldest recorded row (in the current file
+    or a rotated segment, not counting the days backfilled before) are
+    left out for the same reason. With the SQLite backend the rows are
+    also inserted into the database, and with a binary store they are
+    merged into it. A checkpoint file records every day before its first
+    write and again once it is finished. An interrupted backfill started
+    again skips the finished days and fetches the others again; every
+    write of a day replaces rows of the same observation, so a day that
+    was only partly stored is completed without duplicates.
+    """
+
+    def __init__(self, api_key, city, weather_file, layout=LAYOUT_NEWEST_FIRST, base_url=HISTORY_API_BASE_URL,
+                 workers=DEFAULT_WORKERS, city_id=None, coords=None, history_db=None, checkpoint_file=None,
+                 binary_store=None):
+        self.api_key = api_key
+        self.city = city
+        self.weather_file = weather_file
+        self.layout = layout
+        self.base_url = base_url
+        self.workers = max(1, workers)
+        self.city_id = city_id
+        self.coords = coords
+        self.history_db = history_db
+        self.binary_store = binary_store
+        self.checkpoint_file = checkpoint_file or checkpoint_path_for(weather_file)
+
+        self._done, self._started = self._load_checkpoint()
+
+    def _load_checkpoint(self):
+        """
+        Days of the city already finished, and days started but not finished
+
+        Returns:
+            tuple: (finished days, started days) as sets of date strings
+        """
+        try:
+            with open(self.checkpoint_file, 'r') as f:
+                entry = json.load(f).get(self.city.lower(), {})
+        except (OSError, ValueError, AttributeError):
+            return set(), set()
+        if isinstance(entry, list):
+            # Checkpoints of older versions only list the finished days
+            return set(entry), set()
+        try:
+            return set(entry.get('done', [])), set(entry.get('started', []))
+        except AttributeError:
+            return set(), set()
+
+    def _save_checkpoint(self):
+        """Record the started and finished days (temporary file + rename)"""
+        try:
+            with open(self.checkpoint_file, 'r') as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            stored = {}
+        stored[self.city.lower()] = {'done': sorted(self._done), 'started': sorted(self._started)}
+
+        temp_file = f"{self.checkpoint_file}.tmp"
+        with open(temp_file, 'w') as f:
+            json.dump(stored, f)
+        os.replace(temp_file, self.checkpoint_file)
+
+    def _fetch_day(self, day):
+        """Fetch and convert the rows of one day (worker thread)"""
+        date_str, start, end = day
+        entries = fetch_history(self.api_key, self.city, start, end - 1, base_url=self.base_url,
+                                city_id=self.city_id, coords=self.coords)
+        name = city_name(self.city)
+        return [build_history_record(entry, name, self.coords) for entry in entries]
+
+    def run(self, start, end, progress=None):
+        """
+        Backfill the days from start to end (both included)
+
+        Args:
+            progress: Optional callback(stats) called after every finished day
+
+        Returns:
+            dict: days, skipped, done, failed, rows, seconds, rows_per_second, errors
+        """
+        started = time.perf_counter()
+        # Segments written by a backfill, including one interrupted halfway through a day
+        backfilled = {segment_path_for(self.weather_file, date_str) for date_str in self._done | self._started}
+        cutoff = oldest_row_time(self.weather_file, self.city, backfilled)
+        now = time.time()
+
+        days = day_ranges(start, end)
+        pending = [day for day in days if day[0] not in self._done and day[2] <= now
+                   and (cutoff is None or day[1] < cutoff)]
+        stats = {'days': len(days), 'skipped': len(days) - len(pending), 'done': 0, 'failed': 0,
+                 'rows': 0, 'errors': []}
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = {pool.submit(self._fetch_day, day): day for day in pending}
+            for future in as_completed(futures):
+                date_str = futures[future][0]
+                try:
+                    rows = future.result()
+                except Exception as e:
+                    stats['failed'] += 1
+                    stats['errors'].append(f"{date_str}: {str(e)}")
+                else:
+                    stats['rows'] += self._store_day(date_str, rows, cutoff)
+                    stats['done'] += 1
+                if progress:
+                    progress(dict(stats))
+
+        stats['seconds'] = time.perf_counter() - started
+        stats['rows_per_second'] = stats['rows'] / stats['seconds'] if stats['seconds'] else 0.0
+        return stats
+
+    def _store_day(self, date_str, rows, cutoff):
+        """Merge one finished day into the history and mark it done (calling thread)"""
+        rows = [row for row in rows if cutoff is None or (row_timestamp(row) or 0) < cutoff]
+        if rows:
+            # Recorded before the first write, so a rerun never takes these rows for live history
+            self._started.add(date_str)
+            self._save_checkpoint()
+
+            merge_segment_rows(self.weather_file, date_str, rows, self.layout)
+            if self.history_db:
+                self.history_db.insert_many((row, row_timestamp(row)) for row in rows)
+            if self.binary_store is not None:
+                self.binary_store.merge_many([(row, row_timestamp(row)) for row in rows])
+
+        self._done.add(date_str)
+        self._started.discard(date_str)
+        self._save_checkpoint()
+        return len(rows)
+
+
+def _parse_date(text):
+    """argparse type for YYYY-MM-DD dates"""
+    try:
+        return datetime.strptime(text, "%Y-%m-%d")
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid date '{text}', expected YYYY-MM-DD")
+
+def main(argv=None):
+    """
+    Command line entry point: backfill a city's history from the settings in config.ini
+
+    Returns:
+        int: Exit code
+    """
+    parser = argparse.ArgumentParser(prog="notch_data_tool.py backfill",
+                                     description="Fill the weather history with past hourly data")
+    parser.add_argument("--start", type=_parse_date, required=True, help="First day (YYYY-MM-DD)")
+    parser.add_argument("--end", type=_parse_date, help="Last day, included (default: yesterday)")
+    parser.add_argument("--city", help="City to backfill (default: the city in config.ini)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Parallel requests")
+    parser.add_argument("--base-url", default=HISTORY_API_BASE_URL, help="History API base URL")
+    args = parser.parse_args(argv)
+
+    settings = load_config(CONFIG_FILE)
+    if not settings['api_key']:
+        print("No API key in config.ini - save one in the Settings tab first")
+        return 1
+    configure_limiter(settings['rate_limit_per_minute'], settings['rate_limit_per_day'])
+
+    city = args.city or settings['city']
+    end = args.end or datetime.now() - timedelta(days=1)
+    weather_file = settings['weather_file']
+    if city.lower() != settings['city'].lower() and settings['partition_by_city']:
+        weather_file = city_file_for(weather_file, city)
+
+    history_db = None
+    if settings['history_backend'] == BACKEND_SQLITE:
+        history_db = HistoryDatabase(database_path_for(settings['weather_file']))
+
+    # The binary history only holds the main city
+    binary_store = None
+    if settings['binary_history'] and NUMPY_AVAILABLE and city.lower() == settings['city'].lower():
+        binary_store = BinaryHistoryStore(history_dir_for(settings['weather_file']))
+
+    backfill = Backfill(settings['api_key'], city, weather_file, settings['csv_layout'], args.base_url,
+                        args.workers, settings['city_ids'].get(city.lower()),
+                        settings['city_coords'].get(city.lower()), history_db, binary_store=binary_store)
+
+    def report(stats):
+        finished = stats['done'] + stats['failed']
+        print(f"{finished}/{stats['days'] - stats['skipped']} days, {stats['rows']} rows")
+
+    try:
+        stats = backfill.run(args.start, end, progress=report)
+    finally:
+        if history_db:
+            history_db.close()
+
+    print(f"Backfilled {stats['rows']} rows for {city} in {stats['seconds']:.1f} s "
+          f"({stats['rows_per_second']:.0f} rows/s, {stats['skipped']} days already done or not needed)")
+    for error in stats['errors']:
+        print(f"Failed: {error}")
+    return 1 if stats['failed'] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,258 @@
+"""
+Binary weather history module for NOTCH Data Tool
+"""
+import os
+import shutil
+import sys
+from array import array
+
+# NumPy is optional - without it the binary history is disabled
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+# Epoch timestamp column (seconds, int64)
+TIMESTAMP_COLUMN = 'epoch'
+
+# Numeric columns and the weather_data keys they are read from (float64)
+VALUE_COLUMNS = {
+    'temperature': 'temperature',
+    'feels_like': 'feels_like',
+    'humidity': 'humidity',
+    'pressure': 'pressure',
+    'wind_speed': 'wind_speed',
+    'wind_deg': 'wind_deg',
+    'visibility': 'visibility',
+    'lon': 'longitude',
+    'lat': 'latitude',
+    'stale_seconds': 'stale_seconds',
+    'observed': 'observed'
+}
+
+# array typecode, numpy dtype and file extension per column kind
+_TIMESTAMP_FORMAT = ('q', '<i8', '.i8')
+_VALUE_FORMAT = ('d', '<f8', '.f8')
+
+
+def history_dir_for(weather_file):
+    """Directory of the binary history that belongs to a weather CSV file"""
+    stem, _ = os.path.splitext(os.path.abspath(weather_file))
+    return f"{stem}_history"
+
+def _to_float(value):
+    """Convert a CSV/JSON value to float, using NaN for missing data"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float('nan')
+
+
+class BinaryHistoryStore:
+    """
+    Append-only columnar store backed by memory-mapped files
+
+    Numeric weather fields are kept as fixed-width little-endian columns,
+    one file per column, next to the CSV that NOTCH reads. Rows are
+    appended with plain buffered writes (one small write per column). Reads
+    map the column files read-only and hand out NumPy views into the
+    mapping, so a range query never copies or parses the data. Timestamps
+    must be appended in ascending order, which allows range lookups by
+    binary search.
+    """
+
+    def __init__(self, directory):
+        if not NUMPY_AVAILABLE:
+            raise RuntimeError("NumPy is required for the binary history store")
+
+        self.directory = directory
+
+        # A merge interrupted between its two renames leaves the previous store aside
+        if not os.path.exists(directory) and os.path.exists(f"{directory}.old"):
+            os.replace(f"{directory}.old", directory)
+        os.makedirs(directory, exist_ok=True)
+
+        self._formats = {TIMESTAMP_COLUMN: _TIMESTAMP_FORMAT}
+        for column in VALUE_COLUMNS:
+            self._formats[column] = _VALUE_FORMAT
+        self._add_missing_columns()
+
+    def _add_missing_columns(self):
+        """
+        Create the files of columns added after the store was started
+
+        The new column gets NaN for every row already stored, so the store
+        keeps its length instead of being truncated to the shortest column.
+        """
+        existing = [column for column in self._formats if os.path.exists(self._path(column))]
+        missing = [column for column in self._formats if column not in existing]
+        if not existing or not missing:
+            return
+
+        count = min(os.path.getsize(self._path(column)) // np.dtype(self._formats[column][1]).itemsize
+                    for column in existing)
+        for column in missing:
+            typecode = self._formats[column][0]
+            values = array(typecode, [0 if typecode == 'q' else float('nan')]) * count
+            if sys.byteorder != 'little':
+                values.byteswap()
+            with open(self._path(column), 'wb') as f:
+                f.write(values.tobytes())
+
+    def _path(self, column):
+        """File path of a column"""
+        return os.path.join(self.directory, column + self._formats[column][2])
+
+    def __len__(self):
+        """Number of complete rows (the shortest column wins after a torn write)"""
+        counts = []
+        for column, (_, dtype, _) in self._formats.items():
+            try:
+                size = os.path.getsize(self._path(column))
+            except FileNotFoundError:
+                size = 0
+            counts.append(size // np.dtype(dtype).itemsize)
+        return min(counts)
+
+    def append(self, weather_data, timestamp):
+        """Append a single weather record with its epoch timestamp"""
+        self.append_many([(weather_data, timestamp)])
+
+    def append_many(self, records):
+        """
+        Append several (weather_data, timestamp) records at once
+
+        Each column is written with one call, so batching amortises the
+        per-write overhead.
+        """
+        if not records:
+            return
+
+        # Truncate any partially written row before appending
+        count = len(self)
+        for column, (_, dtype, _) in self._formats.items():
+            path = self._path(column)
+            if os.path.exists(path) and os.path.getsize(path) != count * np.dtype(dtype).itemsize:
+                with open(path, 'r+b') as f:
+                    f.truncate(count * np.dtype(dtype).itemsize)
+
+        columns = {TIMESTAMP_COLUMN: array('q', (int(timestamp) for _, timestamp in records))}
+        for column, key in VALUE_COLUMNS.items():
+            columns[column] = array('d', (_to_float(data.get(key)) for data, _ in records))
+
+        for column, values in columns.items():
+            if sys.byteorder != 'little':
+                values.byteswap()
+            with open(self._path(column), 'ab') as f:
+                f.write(values.tobytes())
+
+    def merge_many(self, records):
+        """
+        Add (weather_data, timestamp) records that may be older than the stored rows
+
+        Used for backfilled history. Records whose timestamp is already
+        stored, or whose provider observation time is already stored as an
+        observation, are skipped. Timestamps and observation times are
+        compared separately, so one can never suppress a row through the
+        other. All columns are
+        rewritten in timestamp order into a new directory, which then takes
+        the place of the store, so an interruption leaves the previous
+        history intact.
+
+        Returns:
+            int: Number of records added
+        """
+        count = len(self)
+        timestamps = self.column(TIMESTAMP_COLUMN, count)
+        observed = self.column('observed', count)
+        known_timestamps = set(timestamps.tolist())
+        known_observed = {value for value in observed.tolist() if value == value}
+
+        new = {}
+        for weather_data, timestamp in records:
+            timestamp = int(timestamp)
+            seen = _to_float(weather_data.get('observed'))
+            if timestamp in known_timestamps or seen in known_observed:
+                continue
+            new[timestamp] = weather_data
+            known_timestamps.add(timestamp)
+            if seen == seen:
+                known_observed.add(seen)
+        if not new:
+            return 0
+
+        added = np.array(sorted(new), dtype=self._formats[TIMESTAMP_COLUMN][1])
+        order = np.argsort(np.concatenate([timestamps, added]), kind='stable')
+
+        temp_dir = f"{self.directory}.tmp"
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        os.makedirs(temp_dir)
+        for column, (_, dtype, extension) in self._formats.items():
+            if column == TIMESTAMP_COLUMN:
+                values = added
+            else:
+                key = VALUE_COLUMNS[column]
+                values = np.array([_to_float(new[timestamp].get(key)) for timestamp in sorted(new)], dtype=dtype)
+            merged = np.concatenate([self.column(column, count), values])[order]
+            merged.astype(dtype).tofile(os.path.join(temp_dir, column + extension))
+
+        # Release the memory maps of the old columns before moving them
+        del timestamps, observed
+        old_dir = f"{self.directory}.old"
+        shutil.rmtree(old_dir, ignore_errors=True)
+        os.replace(self.directory, old_dir)
+        os.replace(temp_dir, self.directory)
+        shutil.rmtree(old_dir, ignore_errors=True)
+        return len(new)
+
+    def column(self, name, count=None):
+        """
+        Memory-map a whole column read-only
+
+        Returns:
+            numpy.ndarray: Read-only view of the column (empty if no rows)
+        """
+        count = len(self) if count is None else count
+        dtype = self._formats[name][1]
+        if count == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(self._path(name), dtype=dtype, mode='r', shape=(count,))
+
+    def read_range(self, start=None, end=None, columns=None):
+        """
+        Read all rows with start <= timestamp < end
+
+        Args:
+            start: First epoch timestamp to include (None for the beginning)
+            end: Epoch timestamp to stop before (None for the end)
+            columns: Column names to return (all columns by default)
+
+        Returns:
+            dict: Column name -> zero-copy NumPy view over the matching rows
+        """
+        count = len(self)
+        timestamps = self.column(TIMESTAMP_COLUMN, count)
+
+        lo = 0 if start is None else int(np.searchsorted(timestamps, start, side='left'))
+        hi = count if end is None else int(np.searchsorted(timestamps, end, side='left'))
+
+        names = columns or list(self._formats)
+        result = {}
+        for name in names:
+            data = timestamps if name == TIMESTAMP_COLUMN else self.column(name, count)
+            result[name] = data[lo:hi]
+        return result
+
+    def latest(self):
+        """
+        Read the most recent row
+
+        Returns:
+            dict: Column name -> value, or None if the store is empty
+        """
+        count = len(self)
+        if count == 0:
+            return None
+        return {name: self.column(name, count)[count - 1].item() for name in self._formats}
@@ -0,0 +1,225 @@
+"""
+CC interpolation module for NOTCH Data Tool
+"""
+import threading
+import time
+
+from modules.config import DEFAULT_CC_RATE, DEFAULT_RAMP_SECONDS
+
+# Tick rate limits (Hz)
+MIN_RATE = 10
+MAX_RATE = 500
+
+# Lateness of a tick that still counts as on time (seconds)
+JITTER_BUDGET = 0.002
+
+# At rates up to SPIN_MAX_RATE the last part of every wait is spent polling the
+# clock instead of sleeping, because sleep() may overshoot by a scheduler quantum.
+# Faster rates only sleep: the spin holds the GIL and would starve the Tk thread.
+SPIN_SECONDS = 0.0005
+SPIN_MAX_RATE = 100
+
+
+class CCInterpolator:
+    """
+    Real-time sender thread ramping CC values between weather readings
+
+    set_targets() starts a linear ramp for every controller from its
+    current value to the new one, lasting ramp_seconds. The thread ticks
+    at rate Hz on the high-resolution monotonic clock (perf_counter),
+    with deadlines computed from the start time so errors never add up,
+    and sends a controller only when its 7-bit value changes. A tick that
+    starts later than the jitter budget is counted as late; if the thread
+    falls more than a whole tick behind, the missed ticks are skipped
+    instead of being sent in a burst. The thread sleeps while no ramp is
+    running. Tick cost and jitter are measured and returned by stats().
+    """
+
+    def __init__(self, send, rate=DEFAULT_CC_RATE, ramp_seconds=DEFAULT_RAMP_SECONDS, jitter_budget=JITTER_BUDGET):
+        """
+        Args:
+            send: Callable(channel, cc, value) -> bool, called on the sender thread
+        """
+        self.send = send
+        self.jitter_budget = jitter_budget
+        self.configure(rate, ramp_seconds)
+
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._ramps = {}    # (channel, cc) -> (start value, end value, start time, duration)
+        self._values = {}   # (channel, cc) -> last value sent
+        self._thread = None
+        self._running = False
+        self.reset_stats()
+
+    def configure(self, rate, ramp_seconds):
+        """Change the tick rate (Hz) and the ramp duration (seconds)"""
+        self.rate = min(MAX_RATE, max(MIN_RATE, int(rate)))
+        self.period = 1.0 / self.rate
+        self.ramp_seconds = max(0.0, float(ramp_seconds))
+
+    def reset_stats(self):
+        """Clear the tick measurements"""
+        self._stats = {'ticks': 0, 'messages': 0, 'late': 0, 'skipped': 0, 'errors': 0,
+                       'jitter_total': 0.0, 'max_jitter': 0.0, 'cost_total': 0.0, 'max_cost': 0.0}
+
+    def start(self):
+        """Start the sender thread if it is not running"""
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True, name="cc-interpolator")
+        self._thread.start()
+
+    def stop(self):
+        """Stop the sender thread (running ramps are dropped)"""
+        self._running = False
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=1)
+            self._thread = None
+        with self._lock:
+            self._ramps.clear()
+
+    def forget(self):
+        """Forget the values sent so far, so the next targets are sent without a ramp (e.g. after a port change)"""
+        with self._lock:
+            self._ramps.clear()
+            self._values.clear()
+
+    def set_targets(self, messages):
+        """
+        Ramp controllers to new values
+
+        Controllers without a previous value jump to their target on the
+        next tick. A controller in the middle of a ramp starts its new
+        ramp from the value it has reached.
+
+        Args:
+            messages: (channel, cc, value) tuples, as returned by MidiMapper.burst()
+        """
+        now = time.perf_counter()
+        with self._lock:
+            for channel, cc, value in messages:
+                key = (channel, cc)
+                current = self._current_value(key, now)
+                if current is None or self.ramp_seconds <= 0:
+                    self._ramps[key] = (value, value, now, 0.0)
+                else:
+                    self._ramps[key] = (current, value, now, self.ramp_seconds)
+        self.start()
+        self._wake.set()
+
+    def _current_value(self, key, now):
+        """Value a controller has at time now (lock must be held)"""
+        ramp = self._ramps.get(key)
+        if ramp is None:
+            return self._values.get(key)
+        start_value, end_value, start_time, duration = ramp
+        if duration <= 0 or now >= start_time + duration:
+            return end_value
+        return start_value + (end_value - start_value) * (now - start_time) / duration
+
+    def _run(self):
+        """Sender thread: tick while ramps are running, sleep otherwise"""
+        while self._running:
+            self._wake.wait()
+            self._wake.clear()
+            if not self._running:
+                break
+
+            period = self.period
+            deadline = time.perf_counter()
+            while self._running:
+                self._wait_until(deadline)
+                started = time.perf_counter()
+                jitter = started - deadline
+
+                active = self._tick(started)
+
+                finished = time.perf_counter()
+                self._record_tick(jitter, finished - started)
+                if not active:
+                    break
+
+                # Next deadline on the fixed grid; skip the ticks already missed
+                deadline += period
+                if finished > deadline + period:
+                    missed = int((finished - deadline) / period)
+                    deadline += missed * period
+                    self._stats['skipped'] += missed
+
+    def _wait_until(self, deadline):
+        """Sleep until a deadline; at low rates sleep until shortly before it and poll the clock for the rest"""
+        spin = SPIN_SECONDS if self.rate <= SPIN_MAX_RATE else 0.0
+        remaining = deadline - time.perf_counter()
+        if remaining > spin:
+            time.sleep(remaining - spin)
+        while time.perf_counter() < deadline:
+            pass
+
+    def _tick(self, now):
+        """
+        Send the controllers whose value changed since the last tick
+
+        Returns:
+            bool: True while ramps are still running
+        """
+        changes = []
+        with self._lock:
+            for key, (start_value, end_value, start_time, duration) in list(self._ramps.items()):
+                if duration <= 0 or now >= start_time + duration:
+                    value = end_value
+                    del self._ramps[key]
+                else:
+                    value = int(start_value + (end_value - start_value) * (now - start_time) / duration + 0.5)
+                if self._values.get(key) != value:
+                    self._values[key] = value
+                    changes.append((key[0], key[1], value))
+            active = bool(self._ramps)
+
+        for channel, cc, value in changes:
+            if self.send(channel, cc, value):
+                self._stats['messages'] += 1
+            else:
+                self._stats['errors'] += 1
+        return active
+
+    def _record_tick(self, jitter, cost):
+        """Add one tick to the measurements"""
+        stats = self._stats
+        stats['ticks'] += 1
+        stats['jitter_total'] += jitter
+        stats['cost_total'] += cost
+        if jitter > stats['max_jitter']:
+            stats['max_jitter'] = jitter
+        if cost > stats['max_cost']:
+            stats['max_cost'] = cost
+        if jitter > self.jitter_budget:
+            stats['late'] += 1
+
+    def stats(self):
+        """
+        Tick measurements since the last reset
+
+        Returns:
+            dict: rate, active (running ramps), ticks, messages, late, skipped, errors,
+            avg_jitter, max_jitter, avg_cost, max_cost (seconds)
+        """
+        stats = dict(self._stats)
+        ticks = stats['ticks'] or 1
+        with self._lock:
+            active = len(self._ramps)
+        return {
+            'rate': self.rate,
+            'active': active,
+            'ticks': stats['ticks'],
+            'messages': stats['messages'],
+            'late': stats['late'],
+            'skipped': stats['skipped'],
+            'errors': stats['errors'],
+            'avg_jitter': stats['jitter_total'] / ticks,
+            'max_jitter': stats['max_jitter'],
+            'avg_cost': stats['cost_total'] / ticks,
+            'max_cost': stats['max_cost']
+        }
@@ -0,0 +1,125 @@
+"""
+Circuit breaker module for NOTCH Data Tool
+"""
+import threading
+import time
+from urllib.parse import urlparse
+
+# Breaker states
+STATE_CLOSED = "closed"        # Requests pass
+STATE_OPEN = "open"            # Requests are refused without touching the network
+STATE_HALF_OPEN = "half-open"  # A single probe request decides whether to close again
+
+# Consecutive failed requests (after the HTTP client's own retries) that open the circuit
+FAILURE_THRESHOLD = 3
+
+# Seconds the circuit stays open before a probe, doubled after every failed probe
+RESET_TIMEOUT = 30.0
+MAX_RESET_TIMEOUT = 900.0
+
+
+class CircuitOpenError(Exception):
+    """A request was refused because the provider is considered down"""
+    pass
+
+
+class CircuitBreaker:
+    """
+    Stops requests to a failing provider and probes it before resuming
+
+    The circuit opens after failure_threshold consecutive failures. While
+    it is open every request is refused at once. After reset_timeout the
+    next request is let through as a probe (half-open); its success closes
+    the circuit, its failure opens it again for twice as long (up to
+    max_reset_timeout). Other requests are refused while the probe runs.
+    """
+
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT,
+                 max_reset_timeout=MAX_RESET_TIMEOUT):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max(reset_timeout, max_reset_timeout)
+
+        self._lock = threading.Lock()
+        self._state = STATE_CLOSED
+        self._failures = 0
+        self._timeout = reset_timeout
+        self._opened_at = 0.0
+        self._probing = False
+
+    def before_request(self):
+        """
+        Check that a request may be sent
+
+        Raises:
+            CircuitOpenError: While the circuit is open or a probe is running
+        """
+        with self._lock:
+            if self._state == STATE_CLOSED:
+                return
+            if self._state == STATE_OPEN:
+                wait = self._opened_at + self._timeout - time.monotonic()
+                if wait > 0:
+                    raise CircuitOpenError(f"Weather service unavailable - next try in {wait:.0f} s")
+                self._state = STATE_HALF_OPEN
+            if self._probing:
+                raise CircuitOpenError("Weather service unavailable - checking if it is back")
+            self._probing = True
+
+    def release(self):
+        """Give back a probe slot taken by before_request() when no request was sent"""
+        with self._lock:
+            self._probing = False
+
+    def record_success(self):
+        """A request reached the provider and got a usable answer"""
+        with self._lock:
+            self._state = STATE_CLOSED
+            self._failures = 0
+            self._timeout = self.reset_timeout
+            self._probing = False
+
+    def record_failure(self):
+        """A request failed because of the provider (network error, timeout, 5xx, 429)"""
+        with self._lock:
+            if self._state == STATE_HALF_OPEN:
+                self._timeout = min(self.max_reset_timeout, self._timeout * 2)
+                self._open()
+                return
+
+            self._failures += 1
+            if self._state == STATE_CLOSED and self._failures >= self.failure_threshold:
+                self._open()
+
+    def _open(self):
+        """Open the circuit (lock must be held)"""
+        self._state = STATE_OPEN
+        self._opened_at = time.monotonic()
+        self._probing = False
+
+    def state(self):
+        """Current state, moving from open to half-open once the timeout has passed"""
+        with self._lock:
+            if self._state == STATE_OPEN and time.monotonic() >= self._opened_at + self._timeout:
+                return STATE_HALF_OPEN
+            return self._state
+
+    def retry_in(self):
+        """Seconds until the next probe is allowed (0 unless the circuit is open)"""
+        with self._lock:
+            if self._state != STATE_OPEN:
+                return 0.0
+            return max(0.0, self._opened_at + self._timeout - time.monotonic())
+
+
+# One breaker per provider host
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+def get_breaker(url):
+    """Return the shared circuit breaker of the host of a URL"""
+    host = urlparse(url).netloc
+    with _breakers_lock:
+        if host not in _breakers:
+            _breakers[host] = CircuitBreaker()
+        return _breakers[host]
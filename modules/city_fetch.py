@@ -0,0 +1,122 @@
+"""
+Multi-city fetch module for NOTCH Data Tool
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from modules.circuit_breaker import CircuitOpenError
+from modules.rate_limiter import PRIORITY_HIGH, PRIORITY_LOW, RateLimitExceeded
+from modules.weather_api import (API_BASE_URL, GROUP_MAX_IDS, WeatherAPIError, build_weather_record,
+                                 fetch_current_weather, fetch_weather_group)
+from modules.weather_cache import cache_key
+
+# Maximum number of cities fetched in parallel (stays below the HTTP pool size)
+MAX_CONCURRENT_FETCHES = 8
+
+# Status codes of a group request rejected as a whole, retried city by city
+GROUP_REJECTED_STATUS = (400, 404)
+
+
+def fetch_cities(cities, api_key, cache, base_url=API_BASE_URL, city_ids=None, city_coords=None, batch=False):
+    """
+    Fetch and parse the current weather of several cities
+
+    Cities with a fresh cached response are answered without a request.
+    The remaining requests run in parallel over the shared connection
+    pool, so the call takes about as long as the slowest single request.
+    With batch set, cities with a known city ID are fetched GROUP_MAX_IDS
+    at a time through the group endpoint; the others are fetched by name,
+    which resolves their ID for the next update. Cities missing from a
+    group response, and the cities of a group request the API rejected,
+    are fetched by name instead. Requests for the first city are sent with
+    high priority and wait for the rate limiter; the other cities are
+    skipped first when the limit is close.
+
+    Args:
+        cities: City names, the main city first
+        cache: WeatherCache shared by all fetches
+        city_ids: Lower-case city name -> OWM city ID
+        city_coords: Lower-case city name -> (lat, lon)
+
+    Returns:
+        tuple: ([(city, result, error), ...] in the order of the cities, request count),
+        where result is (data, weather_data, now, fetched_at). The count only
+        includes requests sent to the API, not cached or shared responses.
+    """
+    city_ids = city_ids or {}
+    city_coords = city_coords or {}
+    priority = {city: PRIORITY_HIGH if i == 0 else PRIORITY_LOW for i, city in enumerate(cities)}
+    requests_sent = []  # One entry per request that reached the API (appended from the pool threads)
+
+    def request(call):
+        """Make an API call, counting it unless the circuit breaker or the rate limiter refused it"""
+        refused = False
+        try:
+            return call()
+        except (CircuitOpenError, RateLimitExceeded):
+            refused = True
+            raise
+        finally:
+            if not refused:
+                requests_sent.append(call)
+
+    def fetch_city(city, by_id=True):
+        """Fetch (or take from the cache) and parse the weather of one city, capturing any error"""
+        city_id = city_ids.get(city.lower()) if by_id else None
+        coords = city_coords.get(city.lower())
+        try:
+            data, fetched_at = cache.get_or_fetch(
+                cache_key(city), lambda: request(lambda: fetch_current_weather(
+                    api_key, city, base_url=base_url, priority=priority[city], city_id=city_id, coords=coords)))
+            now = datetime.now()
+            return city, (data, build_weather_record(data, now), now, fetched_at), None
+        except Exception as e:
+            return city, None, e
+
+    def fetch_group(chunk):
+        """Fetch a group of (city, city_id) pairs in one request and split the response per city"""
+        chunk_priority = PRIORITY_HIGH if any(city == cities[0] for city, _ in chunk) else PRIORITY_LOW
+        try:
+            entries = request(lambda: fetch_weather_group(api_key, [city_id for _, city_id in chunk],
+                                                          base_url=base_url, priority=chunk_priority))
+        except WeatherAPIError as e:
+            if e.status_code not in GROUP_REJECTED_STATUS:
+                return [(city, None, e) for city, _ in chunk]
+            entries = {}
+        except Exception as e:
+            return [(city, None, e) for city, _ in chunk]
+
+        now = datetime.now()
+        results = []
+        for city, city_id in chunk:
+            data = entries.get(city_id)
+            if data is None:
+                # Unknown or outdated ID: resolve the city by name again
+                results.append(fetch_city(city, by_id=False))
+            else:
+                _, fetched_at = cache.put(cache_key(city), data)
+                results.append((city, (data, build_weather_record(data, now), now, fetched_at), None))
+        return results
+
+    cached = {city for city in cities if cache.get(cache_key(city))}
+    finished = [[fetch_city(city)] for city in cached]
+    pending = [city for city in cities if city not in cached]
+
+    grouped = []
+    if batch and len(pending) > 1:
+        grouped = [(city, city_ids[city.lower()]) for city in pending if city.lower() in city_ids]
+    grouped_cities = {city for city, _ in grouped}
+
+    calls = [lambda city=city: [fetch_city(city)] for city in pending if city not in grouped_cities]
+    for i in range(0, len(grouped), GROUP_MAX_IDS):
+        calls.append(lambda chunk=grouped[i:i + GROUP_MAX_IDS]: fetch_group(chunk))
+
+    if len(calls) == 1:
+        finished.append(calls[0]())
+    elif calls:
+        with ThreadPoolExecutor(max_workers=min(len(calls), MAX_CONCURRENT_FETCHES)) as pool:
+            finished.extend(pool.map(lambda call: call(), calls))
+
+    # Restore the order of the cities (the main city first)
+    by_city = {entry[0]: entry for results in finished for entry in results}
+    return [by_city[city] for city in cities], len(requests_sent)
@@ -0,0 +1,203 @@
+"""
+Offline city index module for NOTCH Data Tool
+"""
+import bisect
+import gzip
+import json
+import os
+import threading
+import unicodedata
+
+from modules.http_client import get_client
+
+# OpenWeatherMap bulk city list (id, name, state, country, coord of every city)
+CITY_LIST_URL = "https://bulk.openweathermap.org/sample/city.list.json.gz"
+
+# Local copies of the bulk list used instead of downloading it
+CITY_LIST_FILES = ["city.list.json.gz", "city.list.json"]
+
+# Compact index built from the bulk list: one sorted, tab separated line per city
+CITY_INDEX_FILE = "city_index.tsv.gz"
+
+# (connect, read) timeout for the bulk list download (about 10 MB)
+DOWNLOAD_TIMEOUT = (10, 120)
+
+# Default number of autocomplete suggestions
+MAX_SUGGESTIONS = 10
+
+
+def normalize(text):
+    """Search key of a city name: case-folded, without accents or extra spaces"""
+    decomposed = unicodedata.normalize('NFKD', text)
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return " ".join(stripped.casefold().split())
+
+def city_label(entry):
+    """
+    City query for an index entry in the API's q format
+
+    US cities include their state ("Springfield,IL,US"), others only the
+    country code ("London,GB").
+    """
+    parts = [entry['name']]
+    if entry['state'] and entry['country'] == "US":
+        parts.append(entry['state'])
+    if entry['country']:
+        parts.append(entry['country'])
+    return ",".join(parts)
+
+def load_city_list():
+    """
+    Read the OWM bulk city list from a local copy, or download it
+
+    Returns:
+        list: City dicts with id, name, state, country and coord
+    """
+    for path in CITY_LIST_FILES:
+        if os.path.exists(path):
+            opener = gzip.open if path.endswith('.gz') else open
+            with opener(path, 'rt', encoding='utf-8') as f:
+                return json.load(f)
+
+    response = get_client().get(CITY_LIST_URL, timeout=DOWNLOAD_TIMEOUT)
+    response.raise_for_status()
+    return json.loads(gzip.decompress(response.content).decode('utf-8'))
+
+def build_city_index(cities, path=CITY_INDEX_FILE):
+    """
+    Write the compact index of a city list, sorted by search key
+
+    Returns:
+        int: Number of cities indexed
+    """
+    rows = []
+    for city in cities:
+        try:
+            name = " ".join(str(city['name']).split())
+            coord = city.get('coord') or {}
+            rows.append((normalize(name), name, city.get('state') or "", city.get('country') or "",
+                         int(city['id']), float(coord.get('lat', 0)), float(coord.get('lon', 0))))
+        except (KeyError, TypeError, ValueError):
+            continue
+        if not rows[-1][0]:
+            rows.pop()
+    rows.sort()
+
+    temp_file = f"{path}.tmp"
+    with gzip.open(temp_file, 'wt', encoding='utf-8', newline='\n') as f:
+        for key, name, state, country, city_id, lat, lon in rows:
+            f.write(f"{key}\t{name}\t{state}\t{country}\t{city_id}\t{lat:.4f}\t{lon:.4f}\n")
+    os.replace(temp_file, path)
+    return len(rows)
+
+
+class CityIndex:
+    """
+    Sorted arrays of city search keys for prefix search and name resolution
+
+    Lookups use binary search on the sorted keys, so autocomplete and
+    resolution stay instant with the full list of about 200,000 cities.
+    """
+
+    def __init__(self, path=CITY_INDEX_FILE):
+        self.keys = []
+        self._entries = []
+
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                fields = line.rstrip('\n').split('\t')
+                if len(fields) != 7:
+                    continue
+                self.keys.append(fields[0])
+                self._entries.append(fields[1:])
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _entry(self, index):
+        """Index entry as a dict"""
+        name, state, country, city_id, lat, lon = self._entries[index]
+        return {'name': name, 'state': state, 'country': country, 'id': int(city_id),
+                'lat': float(lat), 'lon': float(lon)}
+
+    def _prefix_range(self, key):
+        """Range of positions whose key starts with key"""
+        start = bisect.bisect_left(self.keys, key)
+        end = bisect.bisect_left(self.keys, key + "\U0010ffff", start)
+        return start, end
+
+    def search(self, text, limit=MAX_SUGGESTIONS):
+        """
+        Cities whose name starts with text (ignoring case and accents)
+
+        A trailing ",CC" (or its first letters) restricts the results to a country.
+
+        Returns:
+            list: Up to limit entry dicts in key order (exact name matches sort first)
+        """
+        parts = text.split(',')
+        key = normalize(parts[0])
+        if not key:
+            return []
+        country = parts[-1].strip().upper() if len(parts) > 1 else ""
+
+        start, end = self._prefix_range(key)
+        results = []
+        for index in range(start, end):
+            entry = self._entry(index)
+            if country and not entry['country'].startswith(country):
+                continue
+            results.append(entry)
+            if len(results) >= limit:
+                break
+        return results
+
+    def resolve(self, query):
+        """
+        Resolve a city query ("London", "London,GB", "Springfield,IL,US")
+
+        Returns:
+            dict: The matching entry, or None if the query is unknown or
+            ambiguous (several cities of that name, no country given)
+        """
+        parts = [part.strip() for part in query.split(',')]
+        key = normalize(parts[0])
+        country = parts[-1].upper() if len(parts) > 1 else ""
+        state = parts[1].upper() if len(parts) > 2 else ""
+        if not key:
+            return None
+
+        start = bisect.bisect_left(self.keys, key)
+        end = bisect.bisect_right(self.keys, key, start)
+        matches = [self._entry(index) for index in range(start, end)]
+        matches = [entry for entry in matches
+                   if (not country or entry['country'] == country) and (not state or entry['state'] == state)]
+        return matches[0] if len(matches) == 1 else None
+
+
+# Shared index, loaded (and built on first use) on a background thread
+_index = None
+_index_lock = threading.Lock()
+
+def get_city_index():
+    """Return the loaded city index, or None if it is not available yet"""
+    return _index
+
+def load_city_index(path=CITY_INDEX_FILE, build=True):
+    """
+    Load the city index, building it from the bulk city list first if needed
+
+    Blocking; call it from a background thread.
+
+    Returns:
+        CityIndex: The shared index, or None if there is no index and build is False
+    """
+    global _index
+    with _index_lock:
+        if _index is None:
+            if not os.path.exists(path):
+                if not build:
+                    return None
+                build_city_index(load_city_list(), path)
+            _index = CityIndex(path)
+        return _index
@@ -11,6 +11,31 @@ DEFAULT_CITY = "London"
 DEFAULT_INTERVAL = 120  # Default update interval in seconds (2 minutes)
 DEFAULT_WEATHER_FILE = "weather.csv"
 DEFAULT_MIDI_CONFIG = "midi_presets.json"
+DEFAULT_CSV_LAYOUT = "newest_first"  # "newest_first" (newest row at the top) or "append"
+DEFAULT_ROTATION = "none"  # History rotation policy: "none", "daily" or "size"
+DEFAULT_ROTATION_MAX_BYTES = 1024 * 1024  # Size limit of the current file for size-based rotation
+DEFAULT_BINARY_HISTORY = False  # Mirror numeric fields into the memory-mapped binary history
+DEFAULT_HISTORY_BACKEND = "csv"  # Backend serving history queries: "csv" or "sqlite"
+DEFAULT_FLUSH_INTERVAL = 1.0  # Seconds a weather record may wait in the write queue
+DEFAULT_FLUSH_BATCH_SIZE = 50  # Queued records that trigger an immediate write
+DEFAULT_EXTRA_CITIES = ()  # Cities monitored in addition to the main city (semicolon separated)
+DEFAULT_PARTITION_BY_CITY = False  # Write each extra city to its own CSV file
+DEFAULT_BATCH_REQUESTS = False  # Fetch additional cities in OWM group requests by city ID
+DEFAULT_API_BASE_URL = "https://api.openweathermap.org/data/2.5"  # Can point at a local test server
+DEFAULT_CACHE_TTL = 600  # Seconds a weather response is reused (0 disables it; capped at half the update interval)
+DEFAULT_CACHE_PERSIST = False  # Keep cached responses across restarts
+DEFAULT_SKIP_DUPLICATES = True  # Skip rows whose provider observation time (dt) is unchanged
+DEFAULT_ALIGN_UPDATES = True  # Start updates on wall-clock multiples of the interval
+DEFAULT_ADAPTIVE_POLLING = False  # Adjust the interval to how fast the weather changes
+DEFAULT_MIN_INTERVAL = 60  # Shortest adaptive interval in seconds
+DEFAULT_MAX_INTERVAL = 1800  # Longest adaptive interval in seconds
+DEFAULT_RATE_LIMIT_PER_MINUTE = 60  # OWM calls allowed per API key and minute
+DEFAULT_RATE_LIMIT_PER_DAY = 30000  # OWM calls allowed per API key and day
+DEFAULT_STALE_FALLBACK = True  # Keep writing the last good reading while the provider is down
+DEFAULT_FORECAST_ENABLED = False  # Fetch the 5 day / 3 hour forecast
+DEFAULT_FORECAST_INTERVAL = 3600  # Seconds between forecast updates
+DEFAULT_CC_RATE = 100  # Ticks per second of the CC interpolation thread
+DEFAULT_RAMP_SECONDS = 5.0  # Seconds a mapped CC takes to reach a new reading
 
 def load_config(config_file):
     """
@@ -22,6 +47,31 @@ def load_config(config_file):
     city = DEFAULT_CITY
     update_interval = DEFAULT_INTERVAL
     weather_file = DEFAULT_WEATHER_FILE
+    csv_layout = DEFAULT_CSV_LAYOUT
+    rotation = DEFAULT_ROTATION
+    rotation_max_bytes = DEFAULT_ROTATION_MAX_BYTES
+    binary_history = DEFAULT_BINARY_HISTORY
+    history_backend = DEFAULT_HISTORY_BACKEND
+    flush_interval = DEFAULT_FLUSH_INTERVAL
+    flush_batch_size = DEFAULT_FLUSH_BATCH_SIZE
+    extra_cities = DEFAULT_EXTRA_CITIES
+    partition_by_city = DEFAULT_PARTITION_BY_CITY
+    batch_requests = DEFAULT_BATCH_REQUESTS
+    api_base_url = DEFAULT_API_BASE_URL
+    cache_ttl = DEFAULT_CACHE_TTL
+    cache_persist = DEFAULT_CACHE_PERSIST
+    skip_duplicates = DEFAULT_SKIP_DUPLICATES
+    align_updates = DEFAULT_ALIGN_UPDATES
+    adaptive_polling = DEFAULT_ADAPTIVE_POLLING
+    min_interval = DEFAULT_MIN_INTERVAL
+    max_interval = DEFAULT_MAX_INTERVAL
+    rate_limit_per_minute = DEFAULT_RATE_LIMIT_PER_MINUTE
+    rate_limit_per_day = DEFAULT_RATE_LIMIT_PER_DAY
+    stale_fallback = DEFAULT_STALE_FALLBACK
+    forecast_enabled = DEFAULT_FORECAST_ENABLED
+    forecast_interval = DEFAULT_FORECAST_INTERVAL
+    city_ids = {}
+    city_coords = {}
     
     if os.path.exists(config_file):
         config.read(config_file)
@@ -45,16 +95,166 @@ def load_config(config_file):
             
             if 'weather_file' in config['Settings']:
                 weather_file = config['Settings']['weather_file']
+            
+            if 'csv_layout' in config['Settings']:
+                csv_layout = config['Settings']['csv_layout']
+            
+            if 'rotation' in config['Settings']:
+                rotation = config['Settings']['rotation']
+                
+            if 'rotation_max_bytes' in config['Settings']:
+                try:
+                    rotation_max_bytes = int(config['Settings']['rotation_max_bytes'])
+                except:
+                    rotation_max_bytes = DEFAULT_ROTATION_MAX_BYTES
+            
+            if 'binary_history' in config['Settings']:
+                binary_history = config['Settings'].getboolean('binary_history', DEFAULT_BINARY_HISTORY)
+            
+            if 'history_backend' in config['Settings']:
+                history_backend = config['Settings']['history_backend']
+            
+            if 'flush_interval' in config['Settings']:
+                try:
+                    flush_interval = float(config['Settings']['flush_interval'])
+                except:
+                    flush_interval = DEFAULT_FLUSH_INTERVAL
+                    
+            if 'flush_batch_size' in config['Settings']:
+                try:
+                    flush_batch_size = int(config['Settings']['flush_batch_size'])
+                except:
+                    flush_batch_size = DEFAULT_FLUSH_BATCH_SIZE
+            
+            if 'extra_cities' in config['Settings']:
+                extra_cities = [c.strip() for c in config['Settings']['extra_cities'].split(';') if c.strip()]
+            
+            if 'partition_by_city' in config['Settings']:
+                partition_by_city = config['Settings'].getboolean('partition_by_city', DEFAULT_PARTITION_BY_CITY)
+            
+            if 'batch_requests' in config['Settings']:
+                batch_requests = config['Settings'].getboolean('batch_requests', DEFAULT_BATCH_REQUESTS)
+            
+            if 'api_base_url' in config['Settings']:
+                api_base_url = config['Settings']['api_base_url']
+            
+            if 'cache_ttl' in config['Settings']:
+                try:
+                    cache_ttl = int(config['Settings']['cache_ttl'])
+                except:
+                    cache_ttl = DEFAULT_CACHE_TTL
+            
+            if 'cache_persist' in config['Settings']:
+                cache_persist = config['Settings'].getboolean('cache_persist', DEFAULT_CACHE_PERSIST)
+            
+            if 'skip_duplicates' in config['Settings']:
+                skip_duplicates = config['Settings'].getboolean('skip_duplicates', DEFAULT_SKIP_DUPLICATES)
+            
+            if 'align_updates' in config['Settings']:
+                align_updates = config['Settings'].getboolean('align_updates', DEFAULT_ALIGN_UPDATES)
+            
+            if 'adaptive_polling' in config['Settings']:
+                adaptive_polling = config['Settings'].getboolean('adaptive_polling', DEFAULT_ADAPTIVE_POLLING)
+            
+            if 'min_interval' in config['Settings']:
+                try:
+                    min_interval = int(config['Settings']['min_interval'])
+                except:
+                    min_interval = DEFAULT_MIN_INTERVAL
+            
+            if 'max_interval' in config['Settings']:
+                try:
+                    max_interval = int(config['Settings']['max_interval'])
+                except:
+                    max_interval = DEFAULT_MAX_INTERVAL
+            
+            if 'rate_limit_per_minute' in config['Settings']:
+                try:
+                    rate_limit_per_minute = int(config['Settings']['rate_limit_per_minute'])
+                except:
+                    rate_limit_per_minute = DEFAULT_RATE_LIMIT_PER_MINUTE
+            
+            if 'rate_limit_per_day' in config['Settings']:
+                try:
+                    rate_limit_per_day = int(config['Settings']['rate_limit_per_day'])
+                except:
+                    rate_limit_per_day = DEFAULT_RATE_LIMIT_PER_DAY
+            
+            if 'stale_fallback' in config['Settings']:
+                stale_fallback = config['Settings'].getboolean('stale_fallback', DEFAULT_STALE_FALLBACK)
+            
+            if 'forecast_enabled' in config['Settings']:
+                forecast_enabled = config['Settings'].getboolean('forecast_enabled', DEFAULT_FORECAST_ENABLED)
+            
+            if 'forecast_interval' in config['Settings']:
+                try:
+                    forecast_interval = int(config['Settings']['forecast_interval'])
+                except:
+                    forecast_interval = DEFAULT_FORECAST_INTERVAL
+        
+        # OpenWeatherMap city IDs resolved so far, keyed by the lower-case city query
+        if 'CityIDs' in config:
+            for city, city_id in config['CityIDs'].items():
+                try:
+                    city_ids[city] = int(city_id)
+                except ValueError:
+                    pass
+        
+        # Coordinates (lat, lon) of cities found by geolocation, keyed by the lower-case city query
+        if 'CityCoords' in config:
+            for city, coords in config['CityCoords'].items():
+                try:
+                    lat, lon = (float(value) for value in coords.split(','))
+                    city_coords[city] = (lat, lon)
+                except ValueError:
+                    pass
     
     return {
         'config_obj': config,
         'api_key': api_key,
         'city': city,
         'update_interval': update_interval,
-        'weather_file': weather_file
+        'weather_file': weather_file,
+        'csv_layout': csv_layout,
+        'rotation': rotation,
+        'rotation_max_bytes': rotation_max_bytes,
+        'binary_history': binary_history,
+        'history_backend': history_backend,
+        'flush_interval': flush_interval,
+        'flush_batch_size': flush_batch_size,
+        'extra_cities': extra_cities,
+        'partition_by_city': partition_by_city,
+        'batch_requests': batch_requests,
+        'api_base_url': api_base_url,
+        'city_ids': city_ids,
+        'city_coords': city_coords,
+        'cache_ttl': cache_ttl,
+        'cache_persist': cache_persist,
+        'skip_duplicates': skip_duplicates,
+        'align_updates': align_updates,
+        'adaptive_polling': adaptive_polling,
+        'min_interval': min_interval,
+        'max_interval': max_interval,
+        'rate_limit_per_minute': rate_limit_per_minute,
+        'rate_limit_per_day': rate_limit_per_day,
+        'stale_fallback': stale_fallback,
+        'forecast_enabled': forecast_enabled,
+        'forecast_interval': forecast_interval
     }
 
-def save_config(config_file, config, api_key, city, update_interval, weather_file):
+def save_config(config_file, config, api_key, city, update_interval, weather_file, csv_layout=DEFAULT_CSV_LAYOUT,
+                rotation=DEFAULT_ROTATION, rotation_max_bytes=DEFAULT_ROTATION_MAX_BYTES,
+                binary_history=DEFAULT_BINARY_HISTORY, history_backend=DEFAULT_HISTORY_BACKEND,
+                flush_interval=DEFAULT_FLUSH_INTERVAL, flush_batch_size=DEFAULT_FLUSH_BATCH_SIZE,
+                extra_cities=DEFAULT_EXTRA_CITIES, partition_by_city=DEFAULT_PARTITION_BY_CITY,
+                batch_requests=DEFAULT_BATCH_REQUESTS, api_base_url=DEFAULT_API_BASE_URL, city_ids=None,
+                cache_ttl=DEFAULT_CACHE_TTL, cache_persist=DEFAULT_CACHE_PERSIST,
+                skip_duplicates=DEFAULT_SKIP_DUPLICATES, align_updates=DEFAULT_ALIGN_UPDATES,
+                adaptive_polling=DEFAULT_ADAPTIVE_POLLING, min_interval=DEFAULT_MIN_INTERVAL,
+                max_interval=DEFAULT_MAX_INTERVAL, rate_limit_per_minute=DEFAULT_RATE_LIMIT_PER_MINUTE,
+                rate_limit_per_day=DEFAULT_RATE_LIMIT_PER_DAY,
+                stale_fallback=DEFAULT_STALE_FALLBACK, city_coords=None, forecast_enabled=DEFAULT_FORECAST_ENABLED,
+                forecast_interval=DEFAULT_FORECAST_INTERVAL):
     """
     Save configuration to config file
     """
@@ -72,6 +272,37 @@ def save_config(config_file, config, api_key, city, update_interval, weather_fil
     config['Settings']['city'] = city
     config['Settings']['update_interval'] = str(update_interval)
     config['Settings']['weather_file'] = weather_file
+    config['Settings']['csv_layout'] = csv_layout
+    config['Settings']['rotation'] = rotation
+    config['Settings']['rotation_max_bytes'] = str(rotation_max_bytes)
+    config['Settings']['binary_history'] = str(binary_history)
+    config['Settings']['history_backend'] = history_backend
+    config['Settings']['flush_interval'] = str(flush_interval)
+    config['Settings']['flush_batch_size'] = str(flush_batch_size)
+    config['Settings']['extra_cities'] = "; ".join(extra_cities)
+    config['Settings']['partition_by_city'] = str(partition_by_city)
+    config['Settings']['batch_requests'] = str(batch_requests)
+    config['Settings']['api_base_url'] = api_base_url
+    config['Settings']['cache_ttl'] = str(cache_ttl)
+    config['Settings']['cache_persist'] = str(cache_persist)
+    config['Settings']['skip_duplicates'] = str(skip_duplicates)
+    config['Settings']['align_updates'] = str(align_updates)
+    config['Settings']['adaptive_polling'] = str(adaptive_polling)
+    config['Settings']['min_interval'] = str(min_interval)
+    config['Settings']['max_interval'] = str(max_interval)
+    # The daily budget of older versions is now the daily rate limit
+    config.remove_option('Settings', 'daily_request_budget')
+    config['Settings']['rate_limit_per_minute'] = str(rate_limit_per_minute)
+    config['Settings']['rate_limit_per_day'] = str(rate_limit_per_day)
+    config['Settings']['stale_fallback'] = str(stale_fallback)
+    config['Settings']['forecast_enabled'] = str(forecast_enabled)
+    config['Settings']['forecast_interval'] = str(forecast_interval)
+    
+    if city_ids:
+        config['CityIDs'] = {city: str(city_id) for city, city_id in city_ids.items()}
+    
+    if city_coords:
+        config['CityCoords'] = {city: f"{lat:.4f},{lon:.4f}" for city, (lat, lon) in city_coords.items()}
     
     with open(config_file, 'w') as f:
         config.write(f)
\ No newline at end of file
@@ -0,0 +1,81 @@
+"""
+Background fetch worker for NOTCH Data Tool
+"""
+import queue
+import threading
+
+
+class FetchWorker:
+    """
+    Runs blocking fetch jobs on a background thread
+
+    Jobs are submitted from the UI thread and executed one at a time by the
+    worker. Finished jobs are placed on a thread-safe results queue which
+    the UI drains from a Tk after() callback, so widgets are only touched on
+    the main thread and a hanging request never freezes the window. A job
+    that is already waiting is not queued a second time.
+    """
+
+    def __init__(self, fetch_func):
+        """
+        Args:
+            fetch_func: Function called with a job on the worker thread; its
+                return value (or exception) is posted to the results queue
+        """
+        self.fetch_func = fetch_func
+        self.results = queue.Queue()
+
+        self._requests = queue.Queue()
+        self._waiting = set()
+        self._lock = threading.Lock()
+
+        self._thread = threading.Thread(target=self._run, name="FetchWorker")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def submit(self, job):
+        """
+        Queue a job for the worker thread
+
+        Returns:
+            bool: False if the same job is already waiting to run
+        """
+        with self._lock:
+            if job in self._waiting:
+                return False
+            self._waiting.add(job)
+        self._requests.put(job)
+        return True
+
+    def poll(self):
+        """
+        Collect finished jobs without blocking
+
+        Returns:
+            list: (job, result, error) tuples in completion order
+        """
+        finished = []
+        while True:
+            try:
+                finished.append(self.results.get_nowait())
+            except queue.Empty:
+                return finished
+
+    def stop(self):
+        """Stop the worker thread after the current job"""
+        self._requests.put(None)
+
+    def _run(self):
+        """Worker thread loop"""
+        while True:
+            job = self._requests.get()
+            if job is None:
+                break
+
+            with self._lock:
+                self._waiting.discard(job)
+
+            try:
+                self.results.put((job, self.fetch_func(job), None))
+            except Exception as e:
+                self.results.put((job, None, e))
@@ -0,0 +1,151 @@
+"""
+Weather forecast store module for NOTCH Data Tool
+"""
+import csv
+import os
+import threading
+import time
+
+from modules.weather_store import ROTATION_NONE, append_weather_rows, ensure_parent_dir, rotate_history
+
+# Column order of the forecast CSV read by NOTCH, one row per slot
+# ('target' is the forecast slot in epoch seconds, 'issued' the refresh that wrote the row)
+FORECAST_FIELDNAMES = ['city', 'target_date', 'target_time', 'target', 'description', 'temperature',
+                       'feels_like', 'humidity', 'pressure', 'wind_speed', 'wind_deg', 'clouds',
+                       'pop', 'issued']
+
+# Column order of the change log ('change' tells whether the slot was 'added' or 'changed')
+CHANGE_FIELDNAMES = FORECAST_FIELDNAMES + ['change']
+
+# Fields compared to decide whether a slot has changed
+FORECAST_VALUE_FIELDS = ['description', 'temperature', 'feels_like', 'humidity', 'pressure',
+                         'wind_speed', 'wind_deg', 'clouds', 'pop']
+
+# Slots kept after their target time has passed (seconds)
+PAST_SLOT_GRACE = 3 * 3600
+
+
+def forecast_file_for(weather_file):
+    """Path of the forecast CSV that belongs to a weather CSV file ("weather.csv" -> "weather_forecast.csv")"""
+    stem, ext = os.path.splitext(weather_file)
+    return f"{stem}_forecast{ext}"
+
+def change_log_for(forecast_file):
+    """Path of the change log of a forecast CSV ("weather_forecast.csv" -> "weather_forecast_changes.csv")"""
+    stem, ext = os.path.splitext(forecast_file)
+    return f"{stem}_changes{ext}"
+
+def _same_values(old, new):
+    """Compare two slot records on their forecast values"""
+    return all(str(old.get(field, '')) == str(new.get(field, '')) for field in FORECAST_VALUE_FIELDS)
+
+
+class ForecastStore:
+    """
+    Forecast slots keyed by (city, target time), backed by two CSV files
+
+    The forecast file read by NOTCH holds exactly one row per current slot.
+    Each refresh is merged slot by slot, and the file is only rewritten
+    (temporary file + rename) when a slot was added, changed or dropped, so
+    NOTCH never has to pick the newest of several rows. The slots that
+    were added or changed are also appended to a separate change log, so
+    a refresh logs a diff instead of the whole table. Slots whose target
+    time is long past are dropped.
+    """
+
+    def __init__(self, path, change_log=None):
+        self.path = path
+        self.change_log = change_log or change_log_for(path)
+        self._lock = threading.Lock()
+        self._slots = {}  # (lower-case city, target epoch) -> record
+        self._load()
+
+    def _load(self):
+        """Rebuild the current slots from the forecast file"""
+        rows = 0
+        try:
+            with open(self.path, 'r', newline='') as f:
+                for row in csv.DictReader(f):
+                    rows += 1
+                    try:
+                        key = (row['city'].lower(), int(row['target']))
+                    except (KeyError, TypeError, ValueError):
+                        continue
+                    self._slots[key] = row
+        except FileNotFoundError:
+            return
+
+        # Files written by older versions hold several rows per slot
+        if self._prune(time.time()) or rows != len(self._slots):
+            self._write_slots()
+
+    def _prune(self, now):
+        """
+        Drop slots whose target time is long past (lock must be held or not yet shared)
+
+        Returns:
+            bool: True if a slot was dropped
+        """
+        expired = [key for key in self._slots if key[1] < now - PAST_SLOT_GRACE]
+        for key in expired:
+            del self._slots[key]
+        return bool(expired)
+
+    def _write_slots(self):
+        """Rewrite the forecast file with the current slots (temporary file + rename)"""
+        rows = sorted(self._slots.values(), key=lambda row: (row['city'].lower(), int(row['target'])))
+        ensure_parent_dir(self.path)
+        temp_file = f"{self.path}.tmp"
+        with open(temp_file, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=FORECAST_FIELDNAMES, extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(rows)
+        os.replace(temp_file, self.path)
+
+    def merge(self, records, now=None, rotation=ROTATION_NONE, max_bytes=0):
+        """
+        Merge the slots of one forecast refresh
+
+        The forecast file is rewritten if anything changed, and the added
+        or changed slots are appended to the change log. The change log is
+        rolled into dated segments under the same policy as the weather
+        history (see rotate_history).
+
+        Args:
+            records: Slot records (FORECAST_FIELDNAMES)
+            rotation: Rotation policy of the change log
+            max_bytes: Size limit for the size-based policy
+
+        Returns:
+            list: The records that were added or changed, each with its 'change'
+        """
+        now = now or time.time()
+        changes = []
+        with self._lock:
+            for record in records:
+                key = (record['city'].lower(), int(record['target']))
+                previous = self._slots.get(key)
+                if previous is not None and _same_values(previous, record):
+                    continue
+                self._slots[key] = record
+                changes.append(dict(record, change='added' if previous is None else 'changed'))
+
+            if self._prune(now) or changes:
+                self._write_slots()
+            if changes:
+                rotate_history(self.change_log, rotation, max_bytes)
+                append_weather_rows(self.change_log, changes, CHANGE_FIELDNAMES)
+        return changes
+
+    def slots(self, city=None, start=None):
+        """
+        Current forecast slots, ordered by target time
+
+        Args:
+            city: Only this city (case-insensitive)
+            start: Only slots with a target at or after this epoch time
+        """
+        with self._lock:
+            rows = [row for (slot_city, target), row in self._slots.items()
+                    if (city is None or slot_city == city.lower()) and (start is None or target >= start)]
+        return sorted(rows, key=lambda row: int(row['target']))
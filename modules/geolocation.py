@@ -0,0 +1,133 @@
+"""
+IP geolocation module for NOTCH Data Tool
+"""
+import json
+import os
+import threading
+import time
+
+from modules.http_client import get_client
+
+# Service returning the caller's public IP address as plain text
+PUBLIC_IP_URL = "https://api.ipify.org"
+
+# Free IP geolocation service (the IP is appended to the URL)
+GEOLOCATION_URL = "http://ip-api.com/json/"
+
+# File keeping geolocation results across restarts
+GEOLOCATION_FILE = "geolocation.json"
+
+# Seconds a location stays valid for the same public IP
+DEFAULT_GEO_TTL = 86400
+
+# (connect, read) timeout of the small geolocation requests
+GEO_TIMEOUT = (3, 5)
+
+
+class GeolocationError(Exception):
+    """The location could not be determined"""
+    pass
+
+
+def fetch_public_ip():
+    """Return the public IP address of this machine"""
+    response = get_client().get(PUBLIC_IP_URL, timeout=GEO_TIMEOUT, retries=1)
+    response.raise_for_status()
+    return response.text.strip()
+
+
+class GeoLocator:
+    """
+    IP geolocation with results cached per public IP
+
+    The public IP is checked on every lookup (one small request); the
+    location service is only asked again when the IP has changed or its
+    cached location is older than ttl seconds. If the IP cannot be
+    determined, the most recent cached location is used. Results are
+    saved to a JSON file so restarts reuse them.
+    """
+
+    def __init__(self, ttl=DEFAULT_GEO_TTL, path=GEOLOCATION_FILE):
+        self.ttl = ttl
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = {}  # public IP -> location dict with 'located_at'
+        self._load()
+
+    def locate(self):
+        """
+        Location of this machine (blocking; call it from a background thread)
+
+        Returns:
+            dict: city, country, country_code, lat, lon, ip, located_at, cached (bool)
+
+        Raises:
+            GeolocationError: If neither the service nor the cache has a location
+        """
+        try:
+            ip = fetch_public_ip()
+        except Exception:
+            ip = None
+
+        with self._lock:
+            if ip is None:
+                entry = max(self._entries.values(), key=lambda e: e['located_at'], default=None)
+            else:
+                entry = self._entries.get(ip)
+            if entry and (ip is None or time.time() - entry['located_at'] < self.ttl):
+                return dict(entry, cached=True)
+
+        location = self._lookup(ip)
+        with self._lock:
+            self._entries[location['ip']] = location
+        self._save()
+        return dict(location, cached=False)
+
+    def _lookup(self, ip):
+        """Ask the geolocation service for the location of an IP (None for the caller's own)"""
+        try:
+            response = get_client().get(GEOLOCATION_URL + (ip or ""), timeout=GEO_TIMEOUT, retries=1)
+        except Exception as e:
+            raise GeolocationError(f"Geolocation error: {str(e)}")
+        if response.status_code != 200:
+            raise GeolocationError(f"Geolocation error: {response.status_code}")
+
+        data = response.json()
+        if data.get("status") != "success":
+            raise GeolocationError("Geolocation failed")
+        if not data.get("city"):
+            raise GeolocationError("Could not determine your city")
+
+        return {
+            'ip': data.get("query") or ip or "",
+            'city': data["city"],
+            'country': data.get("country", ""),
+            'country_code': data.get("countryCode", ""),
+            'lat': float(data["lat"]),
+            'lon': float(data["lon"]),
+            'located_at': time.time()
+        }
+
+    def _load(self):
+        """Read the cached locations"""
+        if not self.path:
+            return
+        try:
+            with open(self.path, 'r') as f:
+                self._entries = json.load(f)
+        except (OSError, ValueError):
+            self._entries = {}
+
+    def _save(self):
+        """Write the cached locations (temporary file + rename)"""
+        if not self.path:
+            return
+        with self._lock:
+            entries = json.dumps(self._entries)
+        temp_file = f"{self.path}.tmp"
+        try:
+            with open(temp_file, 'w') as f:
+                f.write(entries)
+            os.replace(temp_file, self.path)
+        except OSError as e:
+            print(f"Error saving geolocation cache: {e}")
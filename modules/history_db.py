@@ -0,0 +1,318 @@
+"""
+SQLite weather history module for NOTCH Data Tool
+"""
+import csv
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+from modules.weather_store import (LAYOUT_NEWEST_FIRST, LAYOUT_APPEND, WEATHER_FIELDNAMES,
+                                   ensure_parent_dir, iter_history_newest_first, list_segments,
+                                   read_latest_row)
+
+# History backends
+BACKEND_CSV = "csv"
+BACKEND_SQLITE = "sqlite"
+HISTORY_BACKENDS = [BACKEND_CSV, BACKEND_SQLITE]
+
+# Numeric columns that can be aggregated
+NUMERIC_FIELDS = ['temperature', 'feels_like', 'humidity', 'pressure', 'wind_speed',
+                  'wind_deg', 'visibility', 'longitude', 'latitude']
+
+# Rows per executemany() call when importing or inserting in bulk
+INSERT_BATCH_SIZE = 500
+
+# Rows per transaction when importing a CSV history, so other writers get the lock in between
+IMPORT_CHUNK_SIZE = 10000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS observations (
+    city TEXT NOT NULL,
+    timestamp INTEGER NOT NULL,
+    date TEXT,
+    time TEXT,
+    description TEXT,
+    temperature NUMERIC,
+    feels_like NUMERIC,
+    humidity NUMERIC,
+    pressure NUMERIC,
+    wind_speed NUMERIC,
+    wind_deg NUMERIC,
+    visibility NUMERIC,
+    longitude NUMERIC,
+    latitude NUMERIC,
+    observed INTEGER,
+    stale_seconds INTEGER,
+    PRIMARY KEY (city, timestamp)
+);
+CREATE INDEX IF NOT EXISTS idx_observations_timestamp ON observations (timestamp);
+CREATE INDEX IF NOT EXISTS idx_observations_city_nocase ON observations (city COLLATE NOCASE, timestamp);
+"""
+
+_COLUMNS = ['city', 'timestamp', 'date', 'time', 'description'] + NUMERIC_FIELDS + ['observed', 'stale_seconds']
+
+# Columns added after the first release: name -> SQL type
+_ADDED_COLUMNS = {'observed': 'INTEGER', 'stale_seconds': 'INTEGER'}
+
+
+def database_path_for(weather_file):
+    """Path of the SQLite history that belongs to a weather CSV file"""
+    stem, _ = os.path.splitext(os.path.abspath(weather_file))
+    return f"{stem}.db"
+
+def _to_number(value):
+    """Convert a CSV/JSON value to a number, using NULL for missing data"""
+    if isinstance(value, (int, float)):
+        return value
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        pass
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def row_timestamp(row):
+    """
+    Epoch timestamp of a CSV row
+
+    Uses the separate date/time columns, falling back to the legacy combined
+    timestamp column. Returns None if the row has no usable time.
+    """
+    text = f"{row.get('date', '')} {row.get('time', '')}".strip()
+    if not row.get('date') and row.get('timestamp'):
+        text = row['timestamp']
+    try:
+        return int(datetime.strptime(text, "%Y-%m-%d %H:%M:%S").timestamp())
+    except (TypeError, ValueError):
+        return None
+
+
+class HistoryDatabase:
+    """
+    Weather history stored in an indexed SQLite table
+
+    Rows are keyed by (city, timestamp) with secondary indexes on the
+    timestamp and on the case-insensitive city name, so "latest per city"
+    and time range queries are index lookups instead of CSV scans. Cities
+    are always matched case-insensitively. The database runs in WAL mode so readers
+    never block the writer. A single connection is shared between threads
+    and serialised with a lock.
+    """
+
+    def __init__(self, path):
+        ensure_parent_dir(path)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(_SCHEMA)
+            self._add_missing_columns()
+            self._conn.commit()
+
+    def _add_missing_columns(self):
+        """Upgrade a database created by an older version (lock must be held)"""
+        existing = {row['name'] for row in self._conn.execute("PRAGMA table_info(observations)")}
+        for column, sql_type in _ADDED_COLUMNS.items():
+            if column not in existing:
+                self._conn.execute(f"ALTER TABLE observations ADD COLUMN {column} {sql_type}")
+
+    def close(self):
+        """Close the database connection"""
+        with self._lock:
+            self._conn.close()
+
+    def _record(self, weather_data, timestamp):
+        """Convert a weather_data dict into a parameter tuple"""
+        values = [weather_data.get('city', ''), int(timestamp), weather_data.get('date', ''),
+                  weather_data.get('time', ''), weather_data.get('description', '')]
+        values.extend(_to_number(weather_data.get(field)) for field in NUMERIC_FIELDS)
+        values.append(_to_number(weather_data.get('observed')))
+        values.append(_to_number(weather_data.get('stale_seconds')))
+        return values
+
+    def insert(self, weather_data, timestamp):
+        """Insert (or replace) a single weather record"""
+        self.insert_many([(weather_data, timestamp)])
+
+    def insert_many(self, records):
+        """
+        Insert several (weather_data, timestamp) records in one transaction
+
+        Returns:
+            int: Number of records written
+        """
+        placeholders = ", ".join("?" for _ in _COLUMNS)
+        sql = f"INSERT OR REPLACE INTO observations ({', '.join(_COLUMNS)}) VALUES ({placeholders})"
+
+        count = 0
+        batch = []
+        with self._lock:
+            with self._conn:
+                for weather_data, timestamp in records:
+                    batch.append(self._record(weather_data, timestamp))
+                    if len(batch) >= INSERT_BATCH_SIZE:
+                        self._conn.executemany(sql, batch)
+                        count += len(batch)
+                        batch = []
+                if batch:
+                    self._conn.executemany(sql, batch)
+                    count += len(batch)
+        return count
+
+    def _query(self, sql, params=()):
+        """Run a query and return the rows as dictionaries"""
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(sql, params)]
+
+    def count(self):
+        """Number of stored observations"""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM observations").fetchone()[0]
+
+    def latest(self, city=None):
+        """
+        Most recent observation, optionally for a single city (matched case-insensitively)
+
+        Returns:
+            dict: The newest row, or None if there is none
+        """
+        if city:
+            rows = self._query("SELECT * FROM observations WHERE city = ? COLLATE NOCASE "
+                               "ORDER BY timestamp DESC LIMIT 1", (city,))
+        else:
+            rows = self._query("SELECT * FROM observations ORDER BY timestamp DESC LIMIT 1")
+        return rows[0] if rows else None
+
+    def latest_per_city(self):
+        """Most recent observation of every city"""
+        return self._query(
+            "SELECT o.* FROM observations o "
+            "JOIN (SELECT city, MAX(timestamp) AS timestamp FROM observations GROUP BY city) latest "
+            "ON o.city = latest.city AND o.timestamp = latest.timestamp "
+            "ORDER BY o.city"
+        )
+
+    def range(self, start=None, end=None, city=None):
+        """
+        Observations with start <= timestamp < end, oldest first
+
+        Args:
+            start: First epoch timestamp to include (None for the beginning)
+            end: Epoch timestamp to stop before (None for the end)
+            city: Restrict the query to one city
+        """
+        sql, params = self._range_clause(start, end, city)
+        return self._query(f"SELECT * FROM observations{sql} ORDER BY timestamp", params)
+
+    def aggregate(self, field, start=None, end=None, city=None):
+        """
+        Minimum, maximum, average and count of a numeric field over a time range
+
+        Returns:
+            dict: Keys min, max, avg and count
+        """
+        if field not in NUMERIC_FIELDS:
+            raise ValueError(f"Cannot aggregate field '{field}'")
+
+        sql, params = self._range_clause(start, end, city)
+        rows = self._query(
+            f"SELECT MIN({field}) AS min, MAX({field}) AS max, AVG({field}) AS avg, "
+            f"COUNT({field}) AS count FROM observations{sql}", params
+        )
+        return rows[0]
+
+    def _range_clause(self, start, end, city):
+        """Build the WHERE clause shared by range queries"""
+        conditions = []
+        params = []
+        if city:
+            conditions.append("city = ? COLLATE NOCASE")
+            params.append(city)
+        if start is not None:
+            conditions.append("timestamp >= ?")
+            params.append(int(start))
+        if end is not None:
+            conditions.append("timestamp < ?")
+            params.append(int(end))
+
+        if not conditions:
+            return "", params
+        return " WHERE " + " AND ".join(conditions), params
+
+    def import_csv(self, weather_file, layout=LAYOUT_NEWEST_FIRST):
+        """
+        Import an existing CSV history (including rotated segments)
+
+        Rows without a usable date/time are skipped. The rows are committed
+        in chunks of IMPORT_CHUNK_SIZE, so records inserted by another
+        thread do not wait for the whole import.
+
+        Returns:
+            int: Number of rows imported
+        """
+        count = 0
+        chunk = []
+        for row in iter_history_newest_first(weather_file, layout):
+            timestamp = row_timestamp(row)
+            if timestamp is None:
+                continue
+            chunk.append((row, timestamp))
+            if len(chunk) >= IMPORT_CHUNK_SIZE:
+                count += self.insert_many(chunk)
+                chunk = []
+        if chunk:
+            count += self.insert_many(chunk)
+        return count
+
+    def export_csv(self, weather_file, layout=LAYOUT_NEWEST_FIRST, cities=None):
+        """
+        Regenerate the current file of a NOTCH CSV history from the database
+
+        Only the rows of the given cities (matched case-insensitively) that
+        are newer than the file's rotated segments are written, so the file
+        ends up with the same rows it would have had from the writer. Rows
+        are streamed from a cursor into a temporary file which then replaces
+        the target, so NOTCH never sees a half-written file.
+
+        Args:
+            cities: City names stored in the file (None for every city)
+
+        Returns:
+            int: Number of rows written
+        """
+        ensure_parent_dir(weather_file)
+        order = "DESC" if layout != LAYOUT_APPEND else "ASC"
+
+        # Rows up to the newest one in the segments have been rolled out of the current file
+        segments = list_segments(weather_file)
+        start = None
+        if segments:
+            newest = row_timestamp(read_latest_row(segments[-1], layout) or {})
+            start = newest + 1 if newest is not None else None
+        sql, params = self._range_clause(start, None, None)
+        if cities:
+            condition = f"city COLLATE NOCASE IN ({', '.join('?' for _ in cities)})"
+            sql = f"{sql} AND {condition}" if sql else f" WHERE {condition}"
+            params.extend(cities)
+
+        count = 0
+        temp_file = f"{weather_file}.tmp"
+        with self._lock:
+            cursor = self._conn.execute(f"SELECT * FROM observations{sql} ORDER BY timestamp {order}", params)
+            with open(temp_file, 'w', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=WEATHER_FIELDNAMES, extrasaction='ignore')
+                writer.writeheader()
+                for row in cursor:
+                    writer.writerow({field: '' if row[field] is None else row[field]
+                                     for field in WEATHER_FIELDNAMES})
+                    count += 1
+
+        os.replace(temp_file, weather_file)
+        return count
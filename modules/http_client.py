@@ -0,0 +1,164 @@
+"""
+Shared HTTP client module for NOTCH Data Tool
+"""
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# (connect, read) timeout in seconds
+DEFAULT_TIMEOUT = (5, 15)
+
+# Retry policy
+DEFAULT_RETRIES = 3           # Extra attempts after the first request
+DEFAULT_BACKOFF = 0.5         # Base delay in seconds, doubled on every retry
+DEFAULT_BACKOFF_MAX = 8.0     # Upper bound for a single delay
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Connection pool size per host
+POOL_SIZE = 10
+
+# Number of recent request latencies kept per host
+LATENCY_WINDOW = 100
+
+
+class HttpClient:
+    """
+    Persistent HTTP session shared by every network call in the app
+
+    Connections are pooled and kept alive, so repeated calls to the same
+    host skip the TCP and TLS handshakes. Every request gets a connect/read
+    timeout, and connection errors, timeouts and retryable status codes are
+    retried with exponential backoff and full jitter. Per-host latency
+    statistics are recorded for every attempt.
+    """
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES,
+                 backoff=DEFAULT_BACKOFF, backoff_max=DEFAULT_BACKOFF_MAX):
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def get(self, url, params=None, timeout=None, retries=None, before_retry=None):
+        """
+        Send a GET request with timeouts and retries
+
+        Returns the last response even if its status is an error, so callers
+        can report the API's own message. Raises the last exception if every
+        attempt failed without a response.
+
+        Args:
+            before_retry: Optional callable run before every retry, e.g. to take
+                a rate limit token; if it raises, no further attempt is made and
+                the last response is returned (or the last exception raised)
+        """
+        timeout = timeout or self.timeout
+        retries = self.retries if retries is None else retries
+        host = requests.utils.urlparse(url).netloc
+
+        response = None
+        error = None
+        for attempt in range(retries + 1):
+            if attempt and before_retry:
+                try:
+                    before_retry()
+                except Exception:
+                    if response is not None:
+                        return response
+                    raise error
+
+            start = time.perf_counter()
+            try:
+                response = self.session.get(url, params=params, timeout=timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self._record(host, time.perf_counter() - start, failed=True)
+                if attempt >= retries:
+                    raise
+                response, error = None, e
+            else:
+                self._record(host, time.perf_counter() - start,
+                             failed=response.status_code >= 500)
+                if response.status_code not in RETRY_STATUS_CODES or attempt >= retries:
+                    return response
+                # Honour the server's Retry-After for rate limits when it is short
+                retry_after = response.headers.get("Retry-After")
+                if retry_after and retry_after.isdigit() and int(retry_after) <= self.backoff_max:
+                    time.sleep(int(retry_after))
+                    continue
+
+            time.sleep(self._backoff_delay(attempt))
+
+    def _backoff_delay(self, attempt):
+        """Exponential backoff with full jitter"""
+        return random.uniform(0, min(self.backoff_max, self.backoff * (2 ** attempt)))
+
+    def _record(self, host, latency, failed=False):
+        """Record the latency of one attempt"""
+        with self._lock:
+            metrics = self._metrics.setdefault(host, {
+                'requests': 0,
+                'failures': 0,
+                'latencies': []
+            })
+            metrics['requests'] += 1
+            if failed:
+                metrics['failures'] += 1
+            metrics['latencies'].append(latency)
+            if len(metrics['latencies']) > LATENCY_WINDOW:
+                del metrics['latencies'][0]
+
+    def metrics(self):
+        """
+        Request statistics per host
+
+        Returns:
+            dict: host -> requests, failures, last/avg/p95 latency in seconds
+        """
+        with self._lock:
+            result = {}
+            for host, metrics in self._metrics.items():
+                latencies = sorted(metrics['latencies'])
+                result[host] = {
+                    'requests': metrics['requests'],
+                    'failures': metrics['failures'],
+                    'last_latency': metrics['latencies'][-1] if latencies else 0.0,
+                    'avg_latency': sum(latencies) / len(latencies) if latencies else 0.0,
+                    'p95_latency': latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else 0.0
+                }
+            return result
+
+    def close(self):
+        """Close all pooled connections"""
+        self.session.close()
+
+
+# Shared client used by all modules
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """Return the shared HTTP client, creating it on first use"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = HttpClient()
+        return _client
+
+def close_client():
+    """Close the shared HTTP client"""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
@@ -5,8 +5,11 @@ import os
 import json
 import time
 import sys
+import threading
 import traceback
 
+from modules.config import DEFAULT_CC_RATE, DEFAULT_RAMP_SECONDS
+
 # Import the MIDI wrapper module - handles DLL issues and import errors gracefully
 from modules.midi_wrapper import midi_support
 
@@ -32,6 +35,10 @@ else:
     print("Warning: No MIDI library available. MIDI features will be disabled.")
 
 
+# Serializes sends on the shared rtmidi output (UI thread and CC interpolation thread)
+_send_lock = threading.Lock()
+
+
 def init_midi():
     """Initialize MIDI output"""
     midi_outputs = {}
@@ -247,10 +254,205 @@ def get_midi_ports():
         'system_devices': system_midi_info
     }
 
-def send_midi_message(midi_outputs, port, message_type, channel, data1, data2=0):
+# Seconds between attempts to reopen a mido port that failed to open
+REOPEN_DELAY = 1.0
+
+
+class MidoPortPool:
+    """
+    Open mido output ports, reused for every message
+    
+    Each port is opened on first use and kept open, so a send costs no
+    more than on the rtmidi path. If a send fails the port is closed,
+    reopened and the message sent once more; a port that cannot be
+    reopened is not tried again for REOPEN_DELAY seconds, so a vanished
+    device does not stall a fast sender. Sends are serialized because
+    mido ports are not thread-safe.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ports = {}        # port name -> open mido output port
+        self._failed_at = {}    # port name -> time of the last failed open
+        self.reconnects = 0
+    
+    def open(self, name):
+        """
+        Open a port unless it is already open
+        
+        Raises:
+            Exception: The error of mido.open_output() if the port cannot be opened
+        """
+        with self._lock:
+            return self._open(name)
+    
+    def _open(self, name):
+        """Return the open port, opening it if needed (lock must be held)"""
+        port = self._ports.get(name)
+        if port is not None and not port.closed:
+            return port
+        
+        failed_at = self._failed_at.get(name)
+        if failed_at is not None and time.monotonic() - failed_at < REOPEN_DELAY:
+            raise IOError(f"MIDI port '{name}' is unavailable")
+        try:
+            port = mido.open_output(name)
+        except Exception:
+            self._failed_at[name] = time.monotonic()
+            raise
+        self._failed_at.pop(name, None)
+        self._ports[name] = port
+        return port
+    
+    def send(self, name, message):
+        """Send a message, reconnecting the port once if the send fails"""
+        with self._lock:
+            port = self._open(name)
+            try:
+                port.send(message)
+                return
+            except Exception as e:
+                print(f"MIDI port '{name}' failed ({e}), reconnecting")
+                self._close(name)
+            
+            self.reconnects += 1
+            self._open(name).send(message)
+    
+    def close(self, name=None):
+        """Close one port, or all of them"""
+        with self._lock:
+            for port_name in ([name] if name is not None else list(self._ports)):
+                self._close(port_name)
+    
+    def _close(self, name):
+        """Close a port (lock must be held)"""
+        port = self._ports.pop(name, None)
+        if port is not None:
+            try:
+                port.close()
+            except Exception as e:
+                print(f"Error closing MIDI port: {e}")
+
+
+# Ports of the mido backend, shared by every sender
+_port_pool = MidoPortPool()
+
+def get_port_pool():
+    """Return the shared mido port pool"""
+    return _port_pool
+
+
+class ControllerCache:
+    """
+    Last value sent per (port, channel, controller)
+    
+    Control changes repeating the value a controller already has are
+    suppressed, which saves bandwidth on 31.25 kbit/s DIN links when many
+    mapped controllers are driven. refresh() returns every cached value so
+    receivers that start listening late can be brought up to date.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = {}  # (port, channel, controller) -> value
+        self.sent = 0
+        self.suppressed = 0
+        self.refreshed = 0
+    
+    def send(self, port, channel, control, value, send, force=False):
+        """
+        Send a control change unless the controller already has the value
+        
+        The comparison, the send and the cache update happen under one
+        lock, so concurrent senders (UI and interpolation thread) cannot
+        leave the cache holding a value other than the last one sent.
+        
+        Args:
+            send: Callable() -> bool doing the actual send
+            force: Send even if the value is unchanged
+        
+        Returns:
+            bool: True if the message was sent or did not need to be
+        """
+        key = (port, channel, control)
+        with self._lock:
+            if not force and self._values.get(key) == value:
+                self.suppressed += 1
+                return True
+            if not send():
+                self._values.pop(key, None)
+                return False
+            self._values[key] = value
+            self.sent += 1
+            return True
+    
+    def forget(self, port=None):
+        """Forget the values of one port, or of all ports"""
+        with self._lock:
+            if port is None:
+                self._values.clear()
+            else:
+                for key in [key for key in self._values if key[0] == port]:
+                    del self._values[key]
+    
+    def refresh(self, port):
+        """
+        Every cached value of a port, for a full resend
+        
+        Returns:
+            list: (channel, controller, value) tuples
+        """
+        with self._lock:
+            values = [(channel, control, value) for (key_port, channel, control), value in self._values.items()
+                      if key_port == port]
+            self.refreshed += len(values)
+        return values
+    
+    def stats(self):
+        """
+        Returns:
+            dict: sent, suppressed, refreshed, controllers, saved (fraction of control changes not sent)
+        """
+        with self._lock:
+            total = self.sent + self.suppressed
+            return {
+                'sent': self.sent,
+                'suppressed': self.suppressed,
+                'refreshed': self.refreshed,
+                'controllers': len(self._values),
+                'saved': self.suppressed / total if total else 0.0
+            }
+
+
+# Values sent by send_midi_message, shared by every sender
+_controller_cache = ControllerCache()
+
+def get_controller_cache():
+    """Return the shared controller cache"""
+    return _controller_cache
+
+def refresh_controllers(midi_outputs, port):
+    """
+    Send every cached controller value of a port again
+    
+    Returns:
+        int: Number of messages sent
+    """
+    sent = 0
+    for channel, control, value in _controller_cache.refresh(port):
+        if send_midi_message(midi_outputs, port, "control_change", channel, control, value, force=True):
+            sent += 1
+    return sent
+
+
+def send_midi_message(midi_outputs, port, message_type, channel, data1, data2=0, force=False):
     """
     Send a MIDI message
     
+    Control changes that repeat the last value sent to the same port,
+    channel and controller are skipped (and count as sent) unless force
+    is set.
+    
     Args:
         midi_outputs: MIDI output object
         port: Port to send to
@@ -258,7 +460,17 @@ def send_midi_message(midi_outputs, port, message_type, channel, data1, data2=0)
         channel: MIDI channel (1-16)
         data1: First data byte (note number or CC number)
         data2: Second data byte (velocity or CC value)
+        force: Send a control change even if the controller already has the value
     """
+    if message_type == "control_change":
+        return _controller_cache.send(
+            port, channel, data1, data2,
+            lambda: _send_message(midi_outputs, port, message_type, channel, data1, data2), force)
+    
+    return _send_message(midi_outputs, port, message_type, channel, data1, data2)
+
+def _send_message(midi_outputs, port, message_type, channel, data1, data2):
+    """Send a MIDI message on the active backend"""
     channel = channel - 1  # Convert to 0-15 range for internal use
     
     if MIDI_LIBRARY == "rtmidi":
@@ -272,7 +484,8 @@ def send_midi_message(midi_outputs, port, message_type, channel, data1, data2=0)
             else:
                 return False
                 
-            midi_outputs["rtmidi"].send_message(msg)
+            with _send_lock:
+                midi_outputs["rtmidi"].send_message(msg)
             return True
         except Exception as e:
             print(f"MIDI Error: {str(e)}")
@@ -280,16 +493,13 @@ def send_midi_message(midi_outputs, port, message_type, channel, data1, data2=0)
             
     elif MIDI_LIBRARY == "mido":
         try:
-            with mido.open_output(port) as mido_port:
-                mido_msg = mido.Message(
-                    message_type,
-                    note=data1 if message_type in ["note_on", "note_off"] else None,
-                    velocity=data2 if message_type in ["note_on", "note_off"] else None,
-                    control=data1 if message_type == "control_change" else None,
-                    value=data2 if message_type == "control_change" else None,
-                    channel=channel
-                )
-                mido_port.send(mido_msg)
+            if message_type in ["note_on", "note_off"]:
+                mido_msg = mido.Message(message_type, note=data1, velocity=data2, channel=channel)
+            elif message_type == "control_change":
+                mido_msg = mido.Message(message_type, control=data1, value=data2, channel=channel)
+            else:
+                return False
+            _port_pool.send(port, mido_msg)
             return True
         except Exception as e:
             print(f"MIDI Error: {str(e)}")
@@ -299,6 +509,9 @@ def send_midi_message(midi_outputs, port, message_type, channel, data1, data2=0)
 
 def close_midi_port(midi_outputs, port_index=None):
     """Close a MIDI port connection"""
+    # A reopened port may lead to a receiver that has not seen any values yet
+    _controller_cache.forget(port_index)
+    
     if MIDI_LIBRARY == "rtmidi":
         try:
             if port_index is not None:
@@ -308,12 +521,23 @@ def close_midi_port(midi_outputs, port_index=None):
             print(f"Error closing MIDI port: {e}")
             return False
     
-    return True  # mido handles port closing in its context manager
+    elif MIDI_LIBRARY == "mido":
+        _port_pool.close(port_index)
+    
+    return True
 
 def load_midi_config(config_file):
     """Load MIDI configuration from file"""
+    from modules.midi_mapping import DEFAULT_BINDINGS
+    
     presets = []
     channel = 1
+    mappings = [dict(binding) for binding in DEFAULT_BINDINGS]
+    mapping_enabled = False
+    smoothing = False
+    cc_rate = DEFAULT_CC_RATE
+    ramp_seconds = DEFAULT_RAMP_SECONDS
+    refresh_seconds = 0
     
     try:
         if os.path.exists(config_file):
@@ -321,20 +545,39 @@ def load_midi_config(config_file):
                 data = json.load(f)
                 presets = data.get('presets', [])
                 channel = data.get('last_channel', 1)
+                mappings = data.get('mappings', mappings)
+                mapping_enabled = data.get('mapping_enabled', False)
+                smoothing = data.get('smoothing', False)
+                cc_rate = data.get('cc_rate', DEFAULT_CC_RATE)
+                ramp_seconds = data.get('ramp_seconds', DEFAULT_RAMP_SECONDS)
+                refresh_seconds = data.get('refresh_seconds', 0)
     except Exception as e:
         print(f"Error loading MIDI config: {e}")
     
     return {
         'presets': presets,
-        'channel': channel
+        'channel': channel,
+        'mappings': mappings,
+        'mapping_enabled': mapping_enabled,
+        'smoothing': smoothing,
+        'cc_rate': cc_rate,
+        'ramp_seconds': ramp_seconds,
+        'refresh_seconds': refresh_seconds
     }
 
-def save_midi_config(config_file, presets, channel):
+def save_midi_config(config_file, presets, channel, mappings=None, mapping_enabled=False, smoothing=False,
+                     cc_rate=DEFAULT_CC_RATE, ramp_seconds=DEFAULT_RAMP_SECONDS, refresh_seconds=0):
     """Save MIDI configuration to file"""
     try:
         data = {
             'presets': presets,
-            'last_channel': channel
+            'last_channel': channel,
+            'mappings': mappings or [],
+            'mapping_enabled': mapping_enabled,
+            'smoothing': smoothing,
+            'cc_rate': cc_rate,
+            'ramp_seconds': ramp_seconds,
+            'refresh_seconds': refresh_seconds
         }
         with open(config_file, 'w') as f:
             json.dump(data, f, indent=2)
@@ -523,7 +766,7 @@ def force_open_midi_port(port_name):
             for p in ports:
                 if port_name in p:
                     try:
-                        mido.open_output(p)
+                        _port_pool.open(p)
                         return (True, p, f"Successfully connected to {p}")
                     except Exception as e:
                         return (False, None, f"Error opening port {p}: {e}")
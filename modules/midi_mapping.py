@@ -0,0 +1,157 @@
+"""
+Weather to MIDI mapping module for NOTCH Data Tool
+"""
+import math
+
+# Weather record fields that can drive a controller
+MAPPABLE_FIELDS = ['temperature', 'feels_like', 'humidity', 'pressure', 'wind_speed', 'wind_deg',
+                   'visibility', 'stale_seconds']
+
+# Transfer functions from the normalized field value (0..1) to the CC value
+CURVE_LINEAR = "linear"
+CURVE_LOG = "log"      # Fast rise at the low end: log(1 + shape * x) / log(1 + shape)
+CURVE_CURVE = "curve"  # Power curve x ** shape (shape > 1 slow start, < 1 fast start)
+CURVES = [CURVE_LINEAR, CURVE_LOG, CURVE_CURVE]
+
+# Default shape of the log and power curves
+DEFAULT_SHAPE = {CURVE_LINEAR: 1.0, CURVE_LOG: 9.0, CURVE_CURVE: 2.0}
+
+# Entries of a scaling table (one per CC value)
+TABLE_SIZE = 128
+
+# Bindings offered before the user has saved any (CC 20-26 are unassigned in the MIDI spec)
+DEFAULT_BINDINGS = [
+    {'field': 'temperature', 'channel': 1, 'cc': 20, 'min': -20.0, 'max': 40.0, 'curve': CURVE_LINEAR},
+    {'field': 'humidity', 'channel': 1, 'cc': 21, 'min': 0.0, 'max': 100.0, 'curve': CURVE_LINEAR},
+    {'field': 'wind_speed', 'channel': 1, 'cc': 22, 'min': 0.0, 'max': 30.0, 'curve': CURVE_LOG},
+    {'field': 'wind_deg', 'channel': 1, 'cc': 23, 'min': 0.0, 'max': 360.0, 'curve': CURVE_LINEAR},
+    {'field': 'pressure', 'channel': 1, 'cc': 24, 'min': 950.0, 'max': 1050.0, 'curve': CURVE_LINEAR},
+]
+
+
+def make_binding(field, channel, cc, minimum, maximum, curve=CURVE_LINEAR, shape=None):
+    """
+    Validate the settings of a binding and return it as a dict
+
+    Raises:
+        ValueError: If a setting is out of range
+    """
+    if field not in MAPPABLE_FIELDS:
+        raise ValueError(f"Unknown weather field '{field}'")
+    if curve not in CURVES:
+        raise ValueError(f"Unknown curve '{curve}'")
+    channel, cc = int(channel), int(cc)
+    if not 1 <= channel <= 16:
+        raise ValueError("MIDI channel must be between 1 and 16")
+    if not 0 <= cc <= 127:
+        raise ValueError("CC number must be between 0 and 127")
+    minimum, maximum = float(minimum), float(maximum)
+    if minimum == maximum:
+        raise ValueError("Min and max must be different")
+    shape = DEFAULT_SHAPE[curve] if shape in (None, '') else float(shape)
+    if shape <= 0:
+        raise ValueError("Curve shape must be greater than 0")
+
+    return {'field': field, 'channel': channel, 'cc': cc, 'min': minimum, 'max': maximum,
+            'curve': curve, 'shape': shape}
+
+def valid_bindings(items):
+    """Validated copies of saved bindings, skipping (and reporting) broken ones"""
+    bindings = []
+    for item in items:
+        try:
+            bindings.append(make_binding(item['field'], item['channel'], item['cc'], item['min'], item['max'],
+                                         item.get('curve', CURVE_LINEAR), item.get('shape')))
+        except (KeyError, TypeError, ValueError) as e:
+            print(f"Skipping invalid MIDI mapping {item}: {e}")
+    return bindings
+
+def binding_label(binding):
+    """One line description of a binding for lists"""
+    return (f"{binding['field']} {binding['min']:g}..{binding['max']:g} -> "
+            f"ch {binding['channel']} CC {binding['cc']} ({binding['curve']})")
+
+def compile_table(curve, shape=None):
+    """
+    Precompute the output of a transfer function for every input step
+
+    Returns:
+        bytes: TABLE_SIZE CC values; entry i is the output for the normalized input i / 127
+    """
+    shape = DEFAULT_SHAPE[curve] if shape is None else shape
+    if curve == CURVE_LOG:
+        scale = math.log1p(shape)
+        transfer = lambda x: math.log1p(shape * x) / scale
+    elif curve == CURVE_CURVE:
+        transfer = lambda x: x ** shape
+    else:
+        transfer = lambda x: x
+
+    last = TABLE_SIZE - 1
+    return bytes(min(127, max(0, round(127 * transfer(i / last)))) for i in range(TABLE_SIZE))
+
+
+class MidiMapper:
+    """
+    Turns weather records into bursts of CC messages
+
+    Each binding is compiled once into a 128-entry table holding the CC
+    value for every input step, plus the offset and scale that turn a
+    field value into a table index. Converting a record then costs one
+    index computation and one table lookup per binding; the curves
+    themselves are never evaluated again. Min above max inverts the
+    mapping. Values outside the range are clamped.
+    """
+
+    def __init__(self, bindings=None):
+        self.bindings = []
+        self._compiled = []
+        self.set_bindings(bindings or [])
+
+    def set_bindings(self, bindings):
+        """Replace the bindings and compile their tables"""
+        tables = {}
+        compiled = []
+        for binding in bindings:
+            key = (binding['curve'], binding.get('shape'))
+            if key not in tables:
+                tables[key] = compile_table(*key)
+            steps = TABLE_SIZE - 1
+            compiled.append((binding['field'], binding['channel'], binding['cc'], binding['min'],
+                             steps / (binding['max'] - binding['min']), tables[key]))
+        self.bindings = list(bindings)
+        self._compiled = compiled
+
+    def burst(self, record):
+        """
+        CC messages for a weather record
+
+        Fields that are missing or not numeric are skipped.
+
+        Returns:
+            list: (channel, cc, value) tuples in binding order
+        """
+        messages = []
+        for field, channel, cc, offset, scale, table in self._compiled:
+            try:
+                index = int((float(record[field]) - offset) * scale + 0.5)
+            except (KeyError, TypeError, ValueError):
+                continue
+            messages.append((channel, cc, table[0 if index < 0 else 127 if index > 127 else index]))
+        return messages
+
+
+def send_burst(midi_outputs, port, messages):
+    """
+    Send a burst of CC messages
+
+    Returns:
+        int: Number of messages sent successfully
+    """
+    from modules.midi import send_midi_message
+
+    sent = 0
+    for channel, cc, value in messages:
+        if send_midi_message(midi_outputs, port, "control_change", channel, cc, value):
+            sent += 1
+    return sent
@@ -4,12 +4,24 @@ MIDI tab functionality for NOTCH Data Tool
 import tkinter as tk
 from tkinter import ttk, messagebox
 
+from modules.cc_interpolator import MAX_RATE, MIN_RATE, CCInterpolator
+from modules.midi_mapping import (CURVES, CURVE_LINEAR, MAPPABLE_FIELDS, MidiMapper, binding_label,
+                                  make_binding, send_burst, valid_bindings)
+
 class MidiTab:
     def __init__(self, app):
         """Initialize the MIDI tab with the main application reference"""
         self.app = app
         self.tab = app.midi_content  # Use the scrollable content area instead of the direct frame
         
+        # Compiled weather -> CC mappings
+        self.mapper = MidiMapper(valid_bindings(self.app.midi_mappings))
+        
+        # Sender thread ramping mapped CCs between readings
+        self._stats_after = None
+        self._refresh_after = None
+        self.interpolator = CCInterpolator(self._send_cc_value, self.app.midi_cc_rate, self.app.midi_ramp_seconds)
+        
         # Create the MIDI Tab UI
         self.create_midi_tab()
         
@@ -137,6 +149,109 @@ class MidiTab:
         send_cc_btn = ttk.Button(cc_frame, text="Send CC", command=self.send_cc)
         send_cc_btn.grid(row=3, column=0, sticky=tk.W, padx=5, pady=5)
         
+        # Weather mapping
+        mapping_frame = ttk.LabelFrame(self.tab, text="Weather Mapping")
+        mapping_frame.pack(fill=tk.X, pady=10)
+        
+        mapping_controls = ttk.Frame(mapping_frame)
+        mapping_controls.pack(fill=tk.X, pady=10, padx=10)
+        
+        self.mapping_enabled_var = tk.BooleanVar(value=self.app.midi_mapping_enabled)
+        mapping_check = ttk.Checkbutton(mapping_controls, text="Send each new weather reading as CC messages",
+                                        variable=self.mapping_enabled_var, command=self.on_mapping_toggled)
+        mapping_check.grid(row=0, column=0, columnspan=6, sticky=tk.W, pady=(0, 10))
+        
+        ttk.Label(mapping_controls, text="Field:").grid(row=1, column=0, sticky=tk.W, padx=5)
+        self.map_field_var = tk.StringVar(value=MAPPABLE_FIELDS[0])
+        ttk.Combobox(mapping_controls, textvariable=self.map_field_var, state="readonly", width=14,
+                     values=MAPPABLE_FIELDS).grid(row=1, column=1, sticky=tk.W, padx=5)
+        
+        ttk.Label(mapping_controls, text="Channel:").grid(row=1, column=2, sticky=tk.W, padx=5)
+        self.map_channel_var = tk.IntVar(value=self.app.midi_channel)
+        ttk.Spinbox(mapping_controls, from_=1, to=16, textvariable=self.map_channel_var,
+                    width=5).grid(row=1, column=3, sticky=tk.W, padx=5)
+        
+        ttk.Label(mapping_controls, text="CC:").grid(row=1, column=4, sticky=tk.W, padx=5)
+        self.map_cc_var = tk.IntVar(value=20)
+        ttk.Spinbox(mapping_controls, from_=0, to=127, textvariable=self.map_cc_var,
+                    width=5).grid(row=1, column=5, sticky=tk.W, padx=5)
+        
+        ttk.Label(mapping_controls, text="Min:").grid(row=2, column=0, sticky=tk.W, padx=5, pady=5)
+        self.map_min_var = tk.StringVar(value="0")
+        ttk.Entry(mapping_controls, textvariable=self.map_min_var, width=8).grid(row=2, column=1, sticky=tk.W, padx=5)
+        
+        ttk.Label(mapping_controls, text="Max:").grid(row=2, column=2, sticky=tk.W, padx=5, pady=5)
+        self.map_max_var = tk.StringVar(value="100")
+        ttk.Entry(mapping_controls, textvariable=self.map_max_var, width=8).grid(row=2, column=3, sticky=tk.W, padx=5)
+        
+        ttk.Label(mapping_controls, text="Curve:").grid(row=2, column=4, sticky=tk.W, padx=5, pady=5)
+        self.map_curve_var = tk.StringVar(value=CURVE_LINEAR)
+        ttk.Combobox(mapping_controls, textvariable=self.map_curve_var, state="readonly", width=8,
+                     values=CURVES).grid(row=2, column=5, sticky=tk.W, padx=5)
+        
+        ttk.Label(mapping_controls, text="Shape:").grid(row=3, column=0, sticky=tk.W, padx=5, pady=5)
+        self.map_shape_var = tk.StringVar(value="")
+        ttk.Entry(mapping_controls, textvariable=self.map_shape_var, width=8).grid(row=3, column=1, sticky=tk.W, padx=5)
+        shape_help = ttk.Label(mapping_controls, text="Empty for the default (log: 9, curve: 2); min > max inverts",
+                               foreground="gray", font=("Arial", 8))
+        shape_help.grid(row=3, column=2, columnspan=4, sticky=tk.W, padx=5)
+        
+        self.smoothing_var = tk.BooleanVar(value=self.app.midi_smoothing)
+        smoothing_check = ttk.Checkbutton(mapping_controls, text="Ramp CC values between readings",
+                                          variable=self.smoothing_var, command=self.save_cc_settings)
+        smoothing_check.grid(row=4, column=0, columnspan=2, sticky=tk.W, padx=5, pady=(10, 5))
+        
+        ttk.Label(mapping_controls, text="Rate (Hz):").grid(row=4, column=2, sticky=tk.W, padx=5, pady=(10, 5))
+        self.cc_rate_var = tk.IntVar(value=self.interpolator.rate)
+        ttk.Spinbox(mapping_controls, from_=MIN_RATE, to=MAX_RATE, increment=10, textvariable=self.cc_rate_var,
+                    width=5).grid(row=4, column=3, sticky=tk.W, padx=5, pady=(10, 5))
+        
+        ttk.Label(mapping_controls, text="Ramp (s):").grid(row=4, column=4, sticky=tk.W, padx=5, pady=(10, 5))
+        self.ramp_seconds_var = tk.DoubleVar(value=self.interpolator.ramp_seconds)
+        ttk.Spinbox(mapping_controls, from_=0, to=600, increment=1, textvariable=self.ramp_seconds_var,
+                    width=5).grid(row=4, column=5, sticky=tk.W, padx=5, pady=(10, 5))
+        
+        apply_smoothing_btn = ttk.Button(mapping_controls, text="Apply", command=self.save_cc_settings)
+        apply_smoothing_btn.grid(row=4, column=6, sticky=tk.W, padx=5, pady=(10, 5))
+        
+        ttk.Label(mapping_controls, text="Resend all CCs every (s):").grid(row=5, column=0, columnspan=2, sticky=tk.W,
+                                                                           padx=5, pady=5)
+        self.refresh_seconds_var = tk.IntVar(value=self.app.midi_refresh_seconds)
+        ttk.Spinbox(mapping_controls, from_=0, to=3600, increment=10, textvariable=self.refresh_seconds_var,
+                    width=5).grid(row=5, column=2, sticky=tk.W, padx=5, pady=5)
+        refresh_help = ttk.Label(mapping_controls, text="0 = only send values that changed",
+                                 foreground="gray", font=("Arial", 8))
+        refresh_help.grid(row=5, column=3, columnspan=4, sticky=tk.W, padx=5)
+        
+        self.interpolation_label = ttk.Label(mapping_controls, text="", foreground="gray", font=("Arial", 8))
+        self.interpolation_label.grid(row=6, column=0, columnspan=7, sticky=tk.W, padx=5)
+        
+        self.delta_label = ttk.Label(mapping_controls, text="", foreground="gray", font=("Arial", 8))
+        self.delta_label.grid(row=7, column=0, columnspan=7, sticky=tk.W, padx=5)
+        
+        mapping_list_frame = ttk.Frame(mapping_frame)
+        mapping_list_frame.pack(fill=tk.X, padx=10, pady=(0, 10))
+        
+        self.mapping_listbox = tk.Listbox(mapping_list_frame, height=5)
+        self.mapping_listbox.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        mapping_scrollbar = ttk.Scrollbar(mapping_list_frame, orient="vertical", command=self.mapping_listbox.yview)
+        mapping_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.mapping_listbox.config(yscrollcommand=mapping_scrollbar.set)
+        self.mapping_listbox.bind("<Double-1>", self.load_selected_mapping)
+        
+        mapping_buttons_frame = ttk.Frame(mapping_frame)
+        mapping_buttons_frame.pack(fill=tk.X, padx=10, pady=(0, 10))
+        
+        add_mapping_btn = ttk.Button(mapping_buttons_frame, text="Add / Update", command=self.save_mapping)
+        add_mapping_btn.pack(side=tk.LEFT, padx=(0, 5))
+        
+        delete_mapping_btn = ttk.Button(mapping_buttons_frame, text="Delete Mapping", command=self.delete_mapping)
+        delete_mapping_btn.pack(side=tk.LEFT, padx=5)
+        
+        send_weather_btn = ttk.Button(mapping_buttons_frame, text="Send Current Weather",
+                                      command=self.send_current_weather)
+        send_weather_btn.pack(side=tk.LEFT, padx=5)
+        
         # Preset management
         preset_frame = ttk.LabelFrame(self.tab, text="Presets")
         preset_frame.pack(fill=tk.X, pady=10)
@@ -179,6 +294,9 @@ class MidiTab:
         # Populate with available MIDI ports
         self.refresh_midi_ports()
         self.refresh_preset_list()
+        self.refresh_mapping_list()
+        self.update_midi_stats()
+        self.schedule_controller_refresh()
         
     def refresh_midi_ports(self):
         """Refresh the list of available MIDI ports"""
@@ -285,6 +403,9 @@ class MidiTab:
                 
             return
             
+        # The new device has not received any ramped values yet
+        self.interpolator.forget()
+        
         # Close any existing connection first
         if self.app.current_midi_port is not None:
             close_midi_port(self.app.midi_outputs, self.app.current_midi_port)
@@ -310,15 +431,13 @@ class MidiTab:
                 self.connection_indicator.configure(style="Green.TFrame")
                 
             elif MIDI_LIBRARY == "mido":
-                # For mido, we'll verify the port exists and is accessible
+                # For mido, open the port in the shared pool and keep it open for sending
                 self.midi_status.config(text=f"Selecting {selected_port}...", foreground="blue")
                 self.connection_indicator.configure(style="Yellow.TFrame")
                 self.tab.update()  # Force UI update
                 
-                # Try opening and immediately closing the port to test
-                import mido
-                with mido.open_output(selected_port) as port:
-                    pass  # Just testing if we can open it
+                from modules.midi import get_port_pool
+                get_port_pool().open(selected_port)
                     
                 self.app.current_midi_port = selected_port
                 self.midi_status.config(text=f"MIDI Status: Ready to use {selected_port}", foreground="green")
@@ -411,7 +530,8 @@ class MidiTab:
             "control_change",
             self.app.midi_channel,
             cc_num,
-            cc_val
+            cc_val,
+            force=True
         )
         
         if success:
@@ -494,12 +614,203 @@ class MidiTab:
         for preset in self.app.midi_presets:
             self.preset_listbox.insert(tk.END, preset['name'])
             
+    def on_mapping_toggled(self):
+        """Turn sending weather readings as CC messages on or off"""
+        self.app.midi_mapping_enabled = self.mapping_enabled_var.get()
+        self.app.save_midi_config()
+        
+    def save_cc_settings(self):
+        """Apply and save the CC ramp and refresh settings"""
+        try:
+            self.interpolator.configure(self.cc_rate_var.get(), self.ramp_seconds_var.get())
+            refresh_seconds = max(0, int(self.refresh_seconds_var.get()))
+        except (tk.TclError, ValueError):
+            messagebox.showerror("Mapping Error", "Rate, ramp time and resend interval must be numbers")
+            return
+        self.cc_rate_var.set(self.interpolator.rate)
+        self.refresh_seconds_var.set(refresh_seconds)
+        
+        self.app.midi_smoothing = self.smoothing_var.get()
+        self.app.midi_cc_rate = self.interpolator.rate
+        self.app.midi_ramp_seconds = self.interpolator.ramp_seconds
+        self.app.midi_refresh_seconds = refresh_seconds
+        self.app.save_midi_config()
+        
+        if not self.app.midi_smoothing:
+            self.interpolator.stop()
+        self.schedule_controller_refresh()
+        self.update_midi_stats()
+    
+    def update_midi_stats(self):
+        """Show the sender thread measurements and the CC messages saved, refreshed every second"""
+        from modules.midi import get_controller_cache
+        
+        if self.app.midi_smoothing:
+            stats = self.interpolator.stats()
+            self.interpolation_label.config(
+                text=f"{stats['rate']} Hz, {stats['active']} ramping, {stats['messages']} sent - "
+                     f"tick {stats['avg_cost'] * 1e6:.0f} µs avg / {stats['max_cost'] * 1e6:.0f} µs max, "
+                     f"jitter {stats['max_jitter'] * 1000:.2f} ms max, {stats['late']} late, {stats['skipped']} skipped")
+        else:
+            self.interpolation_label.config(text="")
+        
+        stats = get_controller_cache().stats()
+        self.delta_label.config(
+            text=f"CC messages: {stats['sent']} sent, {stats['suppressed']} unchanged not sent "
+                 f"({stats['saved'] * 100:.0f}% saved), {stats['refreshed']} resent by refresh")
+        
+        if self._stats_after is None:
+            self._stats_after = self.app.root.after(1000, self._refresh_midi_stats)
+    
+    def _refresh_midi_stats(self):
+        """Periodic refresh of the MIDI measurements"""
+        self._stats_after = None
+        self.update_midi_stats()
+    
+    def schedule_controller_refresh(self):
+        """(Re)start the periodic resend of all CC values"""
+        if self._refresh_after is not None:
+            self.app.root.after_cancel(self._refresh_after)
+            self._refresh_after = None
+        if self.app.midi_refresh_seconds > 0:
+            self._refresh_after = self.app.root.after(self.app.midi_refresh_seconds * 1000, self._refresh_controllers)
+    
+    def _refresh_controllers(self):
+        """Resend every CC value the current port has received, for receivers that joined late"""
+        from modules.midi import refresh_controllers
+        
+        self._refresh_after = None
+        if self._port_connected():
+            refresh_controllers(self.app.midi_outputs, self.app.current_midi_port)
+        self.schedule_controller_refresh()
+        
+    def save_mapping(self):
+        """Add the mapping in the form, or replace the one for the same channel and CC"""
+        try:
+            binding = make_binding(self.map_field_var.get(), self.map_channel_var.get(), self.map_cc_var.get(),
+                                   self.map_min_var.get(), self.map_max_var.get(), self.map_curve_var.get(),
+                                   self.map_shape_var.get().strip())
+        except (tk.TclError, ValueError) as e:
+            messagebox.showerror("Mapping Error", f"Invalid mapping: {str(e)}")
+            return
+        
+        for i, existing in enumerate(self.app.midi_mappings):
+            if existing['channel'] == binding['channel'] and existing['cc'] == binding['cc']:
+                self.app.midi_mappings[i] = binding
+                break
+        else:
+            self.app.midi_mappings.append(binding)
+        
+        self._apply_mappings()
+        self.midi_status.config(text=f"MIDI Status: Mapping {binding_label(binding)} saved", foreground="green")
+        
+    def load_selected_mapping(self, event=None):
+        """Show the selected mapping in the form"""
+        selected = self.mapping_listbox.curselection()
+        if not selected or selected[0] >= len(self.mapper.bindings):
+            return
+        
+        binding = self.mapper.bindings[selected[0]]
+        self.map_field_var.set(binding['field'])
+        self.map_channel_var.set(binding['channel'])
+        self.map_cc_var.set(binding['cc'])
+        self.map_min_var.set(f"{binding['min']:g}")
+        self.map_max_var.set(f"{binding['max']:g}")
+        self.map_curve_var.set(binding['curve'])
+        self.map_shape_var.set(f"{binding['shape']:g}")
+        
+    def delete_mapping(self):
+        """Delete the selected mapping"""
+        selected = self.mapping_listbox.curselection()
+        if not selected or selected[0] >= len(self.mapper.bindings):
+            return
+        
+        binding = self.mapper.bindings[selected[0]]
+        self.app.midi_mappings = [existing for existing in self.app.midi_mappings
+                                  if (existing['channel'], existing['cc']) != (binding['channel'], binding['cc'])]
+        self._apply_mappings()
+        self.midi_status.config(text=f"MIDI Status: Mapping {binding_label(binding)} deleted", foreground="green")
+        
+    def _apply_mappings(self):
+        """Recompile the mappings, save them and update the list"""
+        self.mapper.set_bindings(valid_bindings(self.app.midi_mappings))
+        self.app.midi_mappings = list(self.mapper.bindings)
+        self.app.save_midi_config()
+        self.refresh_mapping_list()
+        
+    def refresh_mapping_list(self):
+        """Update the mapping listbox"""
+        self.mapping_listbox.delete(0, tk.END)
+        for binding in self.mapper.bindings:
+            self.mapping_listbox.insert(tk.END, binding_label(binding))
+            
+    def send_weather_burst(self, record):
+        """
+        Send the mapped CC messages of a new weather reading (called by the weather tab)
+        
+        Does nothing while mapping is off or no MIDI device is connected.
+        
+        Returns:
+            int: Number of messages sent
+        """
+        if not self.app.midi_mapping_enabled or not self._port_connected():
+            return 0
+        return self._send_weather(record)
+        
+    def send_current_weather(self):
+        """Send the mapped CC messages of the latest reading of the main city"""
+        if not self._port_connected():
+            self.midi_status.config(text="MIDI Status: Not connected", foreground="red")
+            messagebox.showerror("MIDI Error", "No MIDI device connected.\nPlease select a MIDI device first.")
+            return
+        
+        record = self.app.weather.latest_reading()
+        if not record:
+            messagebox.showinfo("Weather Mapping", "No weather reading yet.\nFetch the weather first.")
+            return
+        self._send_weather(record)
+        
+    def _port_connected(self):
+        """True if a MIDI output port is selected"""
+        return bool(self.app.current_midi_port is not None and self.app.current_midi_port != "No MIDI ports available")
+        
+    def _send_cc_value(self, channel, cc, value):
+        """Send one ramped CC value (interpolation thread)"""
+        from modules.midi import send_midi_message
+        
+        port = self.app.current_midi_port
+        if port is None or port == "No MIDI ports available":
+            return False
+        return send_midi_message(self.app.midi_outputs, port, "control_change", channel, cc, value)
+        
+    def _send_weather(self, record):
+        """Convert a reading into a burst and send it, reporting the result in the status"""
+        messages = self.mapper.burst(record)
+        if not messages:
+            return 0
+        
+        if self.app.midi_smoothing:
+            self.interpolator.set_targets(messages)
+            self.midi_status.config(text=f"MIDI Status: Ramping {len(messages)} weather CC messages", foreground="green")
+            return len(messages)
+        
+        sent = send_burst(self.app.midi_outputs, self.app.current_midi_port, messages)
+        if sent == len(messages):
+            self.midi_status.config(text=f"MIDI Status: Sent {sent} weather CC messages", foreground="green")
+        else:
+            self.midi_status.config(text=f"MIDI Error: Sent {sent} of {len(messages)} weather CC messages",
+                                    foreground="red")
+        return sent
+            
     def close_connection(self):
         """Close MIDI connection if open"""
         from modules.midi import MIDI_LIBRARY, close_midi_port
         
+        self.interpolator.stop()
         if MIDI_LIBRARY == "rtmidi" and self.app.current_midi_port is not None:
             close_midi_port(self.app.midi_outputs, self.app.current_midi_port)
+        elif MIDI_LIBRARY == "mido":
+            close_midi_port(self.app.midi_outputs)  # All pooled ports
             
     def _try_audio_interface_mode(self):
         """Special detection mode for audio interfaces with MIDI capabilities"""
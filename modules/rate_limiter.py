@@ -0,0 +1,194 @@
+"""
+API rate limiter module for NOTCH Data Tool
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+# File holding the bucket levels across restarts
+RATE_LIMIT_FILE = "rate_limits.json"
+
+# Default limits (OpenWeatherMap free tier: 60 calls/minute, 1,000,000 calls/month)
+DEFAULT_PER_MINUTE = 60
+DEFAULT_PER_DAY = 30000
+
+# Request priorities
+PRIORITY_HIGH = "high"  # Waits for a token (main city, user actions)
+PRIORITY_LOW = "low"    # Shed when tokens run low (additional cities, background work)
+
+# Share of each bucket kept back for high priority requests
+LOW_PRIORITY_RESERVE = 0.2
+
+# Longest time a high priority request waits for a token
+MAX_WAIT = 30.0
+
+
+def key_fingerprint(api_key):
+    """Short hash identifying an API key without storing the key itself"""
+    return hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:12]
+
+
+class RateLimitExceeded(Exception):
+    """A request was refused by the rate limiter"""
+    pass
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at capacity tokens per period
+
+    Levels are tracked against wall-clock time so they can be saved and
+    restored after a restart.
+    """
+
+    def __init__(self, capacity, period, tokens=None, stamp=None):
+        self.capacity = max(1, capacity)
+        self.rate = self.capacity / period
+        self.tokens = self.capacity if tokens is None else min(self.capacity, tokens)
+        self.stamp = stamp or time.time()
+
+    def refill(self, now):
+        """Add the tokens earned since the last refill"""
+        self.tokens = min(self.capacity, self.tokens + max(0.0, now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def wait_time(self, count, floor=0.0):
+        """Seconds until count tokens are available above floor"""
+        missing = count + floor - self.tokens
+        return max(0.0, missing / self.rate)
+
+
+class RateLimiter:
+    """
+    Per API key token buckets for a minute and a day window
+
+    Every request takes one token from both buckets of its API key. High
+    priority requests wait (up to max_wait) for tokens to be refilled; low
+    priority requests never wait and are refused once a bucket drops to
+    its reserve, so background work cannot starve the main city. Bucket
+    levels are saved to a JSON file after every request.
+    """
+
+    def __init__(self, per_minute=DEFAULT_PER_MINUTE, per_day=DEFAULT_PER_DAY, path=RATE_LIMIT_FILE):
+        self.per_minute = per_minute
+        self.per_day = per_day
+        self.path = path
+        self._cond = threading.Condition()
+        self._save_lock = threading.Lock()
+        self._buckets = {}  # fingerprint -> {'minute': TokenBucket, 'day': TokenBucket}
+        self._load()
+
+    def _buckets_for(self, api_key):
+        """Buckets of an API key, created full on first use (lock must be held)"""
+        fingerprint = key_fingerprint(api_key)
+        if fingerprint not in self._buckets:
+            self._buckets[fingerprint] = {
+                'minute': TokenBucket(self.per_minute, 60),
+                'day': TokenBucket(self.per_day, 86400)
+            }
+        return self._buckets[fingerprint]
+
+    def acquire(self, api_key, priority=PRIORITY_HIGH, max_wait=MAX_WAIT):
+        """
+        Take a token for one request
+
+        Raises:
+            RateLimitExceeded: If a low priority request finds the buckets at
+                their reserve, or a high priority request would wait too long
+        """
+        deadline = time.monotonic() + max_wait
+        with self._cond:
+            while True:
+                buckets = self._buckets_for(api_key).values()
+                now = time.time()
+                for bucket in buckets:
+                    bucket.refill(now)
+
+                reserve = LOW_PRIORITY_RESERVE if priority == PRIORITY_LOW else 0.0
+                if all(bucket.tokens >= 1 + bucket.capacity * reserve for bucket in buckets):
+                    for bucket in buckets:
+                        bucket.tokens -= 1
+                    break
+
+                if priority == PRIORITY_LOW:
+                    raise RateLimitExceeded("Rate limit reached - request skipped")
+
+                wait = max(bucket.wait_time(1) for bucket in buckets)
+                if wait > deadline - time.monotonic():
+                    raise RateLimitExceeded(f"Rate limit reached - next request possible in {wait:.0f} s")
+                self._cond.wait(wait)
+
+        self._save()
+
+    def remaining(self, api_key):
+        """
+        Whole tokens left for an API key
+
+        Returns:
+            dict: 'minute' and 'day' token counts
+        """
+        with self._cond:
+            buckets = self._buckets_for(api_key)
+            now = time.time()
+            result = {}
+            for window, bucket in buckets.items():
+                bucket.refill(now)
+                result[window] = int(bucket.tokens)
+            return result
+
+    def _load(self):
+        """Restore the bucket levels from the rate limit file"""
+        if not self.path:
+            return
+        try:
+            with open(self.path, 'r') as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return
+
+        for fingerprint, windows in stored.items():
+            try:
+                self._buckets[fingerprint] = {
+                    'minute': TokenBucket(self.per_minute, 60, *windows['minute']),
+                    'day': TokenBucket(self.per_day, 86400, *windows['day'])
+                }
+            except (KeyError, TypeError, ValueError):
+                continue
+
+    def _save(self):
+        """Write the bucket levels to the rate limit file"""
+        if not self.path:
+            return
+        with self._cond:
+            stored = {fingerprint: {window: [bucket.tokens, bucket.stamp] for window, bucket in buckets.items()}
+                      for fingerprint, buckets in self._buckets.items()}
+        with self._save_lock:
+            temp_file = f"{self.path}.tmp"
+            try:
+                with open(temp_file, 'w') as f:
+                    json.dump(stored, f)
+                os.replace(temp_file, self.path)
+            except OSError as e:
+                print(f"Error saving rate limits: {e}")
+
+
+# Shared limiter used by all API calls
+_limiter = None
+_limiter_lock = threading.Lock()
+
+def configure_limiter(per_minute=DEFAULT_PER_MINUTE, per_day=DEFAULT_PER_DAY, path=RATE_LIMIT_FILE):
+    """Replace the shared limiter with one using the given limits"""
+    global _limiter
+    with _limiter_lock:
+        _limiter = RateLimiter(per_minute, per_day, path)
+        return _limiter
+
+def get_limiter():
+    """Return the shared limiter, creating it with the default limits on first use"""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = RateLimiter()
+        return _limiter
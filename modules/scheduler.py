@@ -0,0 +1,111 @@
+"""
+Polling scheduler module for NOTCH Data Tool
+"""
+import threading
+import time
+
+
+class PollScheduler:
+    """
+    Calls a function at a fixed interval on a single background thread
+
+    Ticks are planned on the monotonic clock as start + n * interval, so
+    the time the callback takes never accumulates as drift. With align
+    enabled the first tick falls on a wall-clock multiple of the interval
+    (every minute on the minute, every 5 minutes at :00, :05, ...). Ticks
+    missed while the system was suspended are skipped rather than fired in
+    a burst. Changing the interval or stopping wakes the thread at once.
+    """
+
+    def __init__(self, callback, interval, align=True):
+        """
+        Args:
+            callback: Function called on every tick (scheduler thread); it
+                should return quickly, e.g. by handing work to another thread
+            interval: Seconds between ticks
+            align: Align ticks to wall-clock multiples of the interval
+        """
+        self.callback = callback
+        self.interval = max(1, interval)
+        self.align = align
+
+        self._wakeup = threading.Condition()
+        self._stopped = False
+        self._replan = True
+        self._next_tick = None
+        self._thread = None
+
+    def start(self):
+        """Start the scheduler thread (does nothing if it is already running)"""
+        with self._wakeup:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stopped = False
+            self._replan = True
+            self._thread = threading.Thread(target=self._run, name="PollScheduler")
+            self._thread.daemon = True
+            self._thread.start()
+
+    def is_running(self):
+        """True while the scheduler thread is alive"""
+        return bool(self._thread and self._thread.is_alive())
+
+    def set_interval(self, interval, align=None):
+        """Change the interval; the next tick is planned again right away"""
+        with self._wakeup:
+            self.interval = max(1, interval)
+            if align is not None:
+                self.align = align
+            if self._next_tick is not None:
+                self._next_tick = self._first_tick(time.monotonic())
+            self._wakeup.notify_all()
+
+    def seconds_until_next_tick(self):
+        """Seconds until the next planned tick, or None if nothing is planned"""
+        with self._wakeup:
+            if self._next_tick is None:
+                return None
+            return max(0.0, self._next_tick - time.monotonic())
+
+    def stop(self, timeout=2.0):
+        """Cancel all future ticks and wait for the thread to finish"""
+        with self._wakeup:
+            self._stopped = True
+            self._wakeup.notify_all()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    def _first_tick(self, now):
+        """Monotonic time of the first tick after (re)planning"""
+        if not self.align:
+            return now + self.interval
+        wall = time.time()
+        return now + (self.interval - wall % self.interval)
+
+    def _run(self):
+        """Scheduler thread loop"""
+        with self._wakeup:
+            while not self._stopped:
+                now = time.monotonic()
+                if self._replan:
+                    self._next_tick = self._first_tick(now)
+                    self._replan = False
+
+                remaining = self._next_tick - now
+                if remaining > 0:
+                    self._wakeup.wait(remaining)
+                    continue
+
+                # Plan the following tick before running this one, skipping missed ticks
+                missed = int((now - self._next_tick) // self.interval)
+                self._next_tick += (missed + 1) * self.interval
+
+                self._wakeup.release()
+                try:
+                    self.callback()
+                except Exception as e:
+                    print(f"Scheduled update failed: {e}")
+                finally:
+                    self._wakeup.acquire()
+
+            self._next_tick = None
@@ -4,9 +4,29 @@ Settings tab functionality for NOTCH Data Tool
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 import os
+import threading
 import webbrowser
 
+from modules.history_db import BACKEND_CSV, BACKEND_SQLITE
+from modules.rate_limiter import configure_limiter
+from modules.weather_store import (LAYOUT_APPEND, LAYOUT_NEWEST_FIRST, ROTATION_NONE, ROTATION_DAILY,
+                                   ROTATION_SIZE, city_file_for, convert_history_layout, copy_history,
+                                   history_files)
+
 class SettingsTab:
+    # Display names of the history rotation policies
+    ROTATION_LABELS = {
+        ROTATION_NONE: "Never",
+        ROTATION_DAILY: "Daily",
+        ROTATION_SIZE: "By size"
+    }
+    
+    # Display names of the history backends
+    BACKEND_LABELS = {
+        BACKEND_CSV: "CSV",
+        BACKEND_SQLITE: "SQLite"
+    }
+    
     def __init__(self, app):
         """Initialize the Settings tab with the main application reference"""
         self.app = app
@@ -35,6 +55,18 @@ class SettingsTab:
         self.show_key_btn = ttk.Button(api_key_frame, text="Show", width=5, command=self.toggle_api_key_visibility)
         self.show_key_btn.pack(side=tk.RIGHT, padx=(5, 0))
         
+        # Request limits per API key
+        limit_frame = ttk.Frame(api_frame)
+        limit_frame.pack(fill=tk.X, padx=10, pady=5)
+        
+        ttk.Label(limit_frame, text="Rate limit:").pack(side=tk.LEFT)
+        self.rate_minute_var = tk.IntVar(value=self.app.rate_limit_per_minute)
+        ttk.Spinbox(limit_frame, from_=1, to=3000, increment=10, textvariable=self.rate_minute_var, width=6).pack(side=tk.LEFT, padx=(5, 0))
+        ttk.Label(limit_frame, text="per minute").pack(side=tk.LEFT, padx=(5, 10))
+        self.rate_day_var = tk.IntVar(value=self.app.rate_limit_per_day)
+        ttk.Spinbox(limit_frame, from_=1, to=10000000, increment=1000, textvariable=self.rate_day_var, width=9).pack(side=tk.LEFT)
+        ttk.Label(limit_frame, text="per day").pack(side=tk.LEFT, padx=(5, 0))
+        
         # Save API key button
         save_api_frame = ttk.Frame(api_frame)
         save_api_frame.pack(fill=tk.X, padx=10, pady=(5, 10))
@@ -79,9 +111,123 @@ class SettingsTab:
         self.interval_display = ttk.Label(interval_setting_frame, text=f"{current_interval} min")
         self.interval_display.pack(side=tk.LEFT, padx=(10, 0))
         
+        self.align_var = tk.BooleanVar(value=self.app.align_updates)
+        align_check = ttk.Checkbutton(
+            interval_frame,
+            text="Align updates to the clock (e.g. every minute on the minute)",
+            variable=self.align_var
+        )
+        align_check.pack(anchor="w", padx=10, pady=(0, 5))
+        
+        # Adaptive interval
+        self.adaptive_var = tk.BooleanVar(value=self.app.adaptive_polling)
+        adaptive_check = ttk.Checkbutton(
+            interval_frame,
+            text="Adapt the interval to how fast the weather changes",
+            variable=self.adaptive_var
+        )
+        adaptive_check.pack(anchor="w", padx=10, pady=(0, 5))
+        
+        adaptive_frame = ttk.Frame(interval_frame)
+        adaptive_frame.pack(fill=tk.X, padx=10, pady=(0, 5))
+        
+        ttk.Label(adaptive_frame, text="Between").pack(side=tk.LEFT)
+        self.min_interval_var = tk.IntVar(value=max(1, self.app.min_interval // 60))
+        ttk.Spinbox(adaptive_frame, from_=1, to=60, textvariable=self.min_interval_var, width=4).pack(side=tk.LEFT, padx=(5, 0))
+        ttk.Label(adaptive_frame, text="and").pack(side=tk.LEFT, padx=(5, 0))
+        self.max_interval_var = tk.IntVar(value=max(1, self.app.max_interval // 60))
+        ttk.Spinbox(adaptive_frame, from_=1, to=240, textvariable=self.max_interval_var, width=4).pack(side=tk.LEFT, padx=(5, 0))
+        ttk.Label(adaptive_frame, text="min, within the daily rate limit").pack(side=tk.LEFT, padx=(5, 0))
+        
+        # Response cache
+        cache_frame = ttk.Frame(interval_frame)
+        cache_frame.pack(fill=tk.X, padx=10, pady=(0, 10))
+        
+        ttk.Label(cache_frame, text="Reuse API responses for:").pack(side=tk.LEFT)
+        
+        self.cache_ttl_var = tk.IntVar(value=self.app.cache_ttl // 60)
+        cache_ttl_spin = ttk.Spinbox(
+            cache_frame,
+            from_=0,
+            to=60,
+            textvariable=self.cache_ttl_var,
+            width=5,
+            command=self.save_cache_settings
+        )
+        cache_ttl_spin.pack(side=tk.LEFT, padx=(5, 0))
+        ttk.Label(cache_frame, text="min").pack(side=tk.LEFT, padx=(5, 0))
+        
+        self.cache_persist_var = tk.BooleanVar(value=self.app.cache_persist)
+        cache_persist_check = ttk.Checkbutton(
+            cache_frame,
+            text="Keep across restarts",
+            variable=self.cache_persist_var,
+            command=self.save_cache_settings
+        )
+        cache_persist_check.pack(side=tk.LEFT, padx=(10, 0))
+        
+        # Forecast updates on their own, slower schedule
+        forecast_frame = ttk.Frame(interval_frame)
+        forecast_frame.pack(fill=tk.X, padx=10, pady=(0, 10))
+        
+        self.forecast_var = tk.BooleanVar(value=self.app.forecast_enabled)
+        forecast_check = ttk.Checkbutton(
+            forecast_frame,
+            text="Fetch the 5 day forecast every",
+            variable=self.forecast_var,
+            command=self.save_forecast_settings
+        )
+        forecast_check.pack(side=tk.LEFT)
+        
+        self.forecast_interval_var = tk.IntVar(value=max(1, self.app.forecast_interval // 60))
+        forecast_spin = ttk.Spinbox(
+            forecast_frame,
+            from_=30,
+            to=720,
+            increment=30,
+            textvariable=self.forecast_interval_var,
+            width=5,
+            command=self.save_forecast_settings
+        )
+        forecast_spin.pack(side=tk.LEFT, padx=(5, 0))
+        ttk.Label(forecast_frame, text="min").pack(side=tk.LEFT, padx=(5, 0))
+        
         self.save_interval_btn = ttk.Button(interval_frame, text="Save Interval", command=self.save_interval, width=15)
         self.save_interval_btn.pack(side=tk.RIGHT, padx=10, pady=(0, 10))
         
+        # Monitored Cities Section
+        cities_frame = ttk.LabelFrame(self.tab, text="Monitored Cities")
+        cities_frame.pack(fill=tk.X, pady=10)
+        
+        ttk.Label(cities_frame, text="Additional cities to monitor (separated by semicolons):").pack(anchor="w", pady=(10, 5), padx=10)
+        
+        self.extra_cities_entry = ttk.Entry(cities_frame, width=40)
+        self.extra_cities_entry.insert(0, "; ".join(self.app.extra_cities))
+        self.extra_cities_entry.pack(fill=tk.X, padx=10, pady=5)
+        
+        self.partition_var = tk.BooleanVar(value=self.app.partition_by_city)
+        partition_check = ttk.Checkbutton(
+            cities_frame,
+            text="Write each additional city to its own CSV file",
+            variable=self.partition_var
+        )
+        partition_check.pack(anchor="w", padx=10, pady=(0, 5))
+        
+        self.batch_requests_var = tk.BooleanVar(value=self.app.batch_requests)
+        batch_check = ttk.Checkbutton(
+            cities_frame,
+            text="Fetch cities in batches (one request per 20 cities)",
+            variable=self.batch_requests_var
+        )
+        batch_check.pack(anchor="w", padx=10, pady=(0, 5))
+        
+        self.save_cities_btn = ttk.Button(cities_frame, text="Save Cities", command=self.save_cities, width=15)
+        self.save_cities_btn.pack(side=tk.RIGHT, padx=10, pady=(0, 10))
+        
+        self.city_list_btn = ttk.Button(cities_frame, text="Download City List", command=self.download_city_list,
+                                        width=20)
+        self.city_list_btn.pack(side=tk.RIGHT, padx=(10, 0), pady=(0, 10))
+        
         # File Settings Section
         file_frame = ttk.LabelFrame(self.tab, text="Data File Settings")
         file_frame.pack(fill=tk.X, pady=10)
@@ -107,6 +253,110 @@ class SettingsTab:
         )
         migrate_check.pack(side=tk.LEFT)
         
+        # CSV layout option
+        layout_frame = ttk.Frame(file_frame)
+        layout_frame.pack(fill=tk.X, padx=10, pady=(0, 5))
+        
+        self.append_layout_var = tk.BooleanVar(value=self.app.csv_layout == LAYOUT_APPEND)
+        self.append_check = ttk.Checkbutton(
+            layout_frame,
+            text="Append new rows to the end of the file (faster for long histories)",
+            variable=self.append_layout_var,
+            command=self.save_csv_layout
+        )
+        self.append_check.pack(side=tk.LEFT)
+        
+        upgrade_btn = ttk.Button(layout_frame, text="Add New Columns", command=self.upgrade_csv_columns, width=16)
+        upgrade_btn.pack(side=tk.RIGHT)
+        
+        # Binary history option
+        binary_frame = ttk.Frame(file_frame)
+        binary_frame.pack(fill=tk.X, padx=10, pady=(0, 5))
+        
+        self.binary_history_var = tk.BooleanVar(value=self.app.binary_history)
+        binary_check = ttk.Checkbutton(
+            binary_frame,
+            text="Keep a binary history for analytics (requires NumPy)",
+            variable=self.binary_history_var,
+            command=self.save_binary_history
+        )
+        binary_check.pack(side=tk.LEFT)
+        
+        # Duplicate observation option
+        duplicates_frame = ttk.Frame(file_frame)
+        duplicates_frame.pack(fill=tk.X, padx=10, pady=(0, 5))
+        
+        self.skip_duplicates_var = tk.BooleanVar(value=self.app.skip_duplicates)
+        duplicates_check = ttk.Checkbutton(
+            duplicates_frame,
+            text="Only write a row when the observation has changed",
+            variable=self.skip_duplicates_var,
+            command=self.save_skip_duplicates
+        )
+        duplicates_check.pack(side=tk.LEFT)
+        
+        # Outage fallback option
+        stale_frame = ttk.Frame(file_frame)
+        stale_frame.pack(fill=tk.X, padx=10, pady=(0, 5))
+        
+        self.stale_fallback_var = tk.BooleanVar(value=self.app.stale_fallback)
+        stale_check = ttk.Checkbutton(
+            stale_frame,
+            text="Keep writing the last good reading while OpenWeatherMap is down",
+            variable=self.stale_fallback_var,
+            command=self.save_stale_fallback
+        )
+        stale_check.pack(side=tk.LEFT)
+        
+        # History backend option
+        backend_frame = ttk.Frame(file_frame)
+        backend_frame.pack(fill=tk.X, padx=10, pady=(0, 5))
+        
+        ttk.Label(backend_frame, text="History backend:").pack(side=tk.LEFT)
+        
+        self.backend_var = tk.StringVar(value=self.BACKEND_LABELS.get(self.app.history_backend, "CSV"))
+        backend_dropdown = ttk.Combobox(
+            backend_frame,
+            textvariable=self.backend_var,
+            state="readonly",
+            values=list(self.BACKEND_LABELS.values()),
+            width=10
+        )
+        backend_dropdown.pack(side=tk.LEFT, padx=(5, 0))
+        backend_dropdown.bind("<<ComboboxSelected>>", self.save_history_backend)
+        
+        self.export_csv_btn = ttk.Button(backend_frame, text="Export CSV", command=self.export_csv, width=10)
+        self.export_csv_btn.pack(side=tk.RIGHT)
+        
+        # History rotation option
+        rotation_frame = ttk.Frame(file_frame)
+        rotation_frame.pack(fill=tk.X, padx=10, pady=(0, 5))
+        
+        ttk.Label(rotation_frame, text="Split history:").pack(side=tk.LEFT)
+        
+        self.rotation_var = tk.StringVar(value=self.ROTATION_LABELS.get(self.app.rotation, "Never"))
+        rotation_dropdown = ttk.Combobox(
+            rotation_frame,
+            textvariable=self.rotation_var,
+            state="readonly",
+            values=list(self.ROTATION_LABELS.values()),
+            width=10
+        )
+        rotation_dropdown.pack(side=tk.LEFT, padx=(5, 0))
+        rotation_dropdown.bind("<<ComboboxSelected>>", self.save_rotation)
+        
+        self.rotation_size_var = tk.IntVar(value=max(1, self.app.rotation_max_bytes // (1024 * 1024)))
+        rotation_size_spin = ttk.Spinbox(
+            rotation_frame,
+            from_=1,
+            to=1024,
+            textvariable=self.rotation_size_var,
+            width=5,
+            command=self.save_rotation
+        )
+        rotation_size_spin.pack(side=tk.LEFT, padx=(10, 0))
+        ttk.Label(rotation_frame, text="MB").pack(side=tk.LEFT, padx=(5, 0))
+        
         # Save file settings button
         file_buttons_frame = ttk.Frame(file_frame)
         file_buttons_frame.pack(fill=tk.X, padx=10, pady=(0, 10))
@@ -136,29 +386,76 @@ class SettingsTab:
 
     def save_interval(self):
         """Save the selected update interval"""
-        import time
-        
         minutes = self.interval_var.get()
         if minutes < 1:
             minutes = 1
             
         # Convert to seconds
         self.app.update_interval = minutes * 60
-        self.app.interval_label.config(text=f"Update: {minutes} min")
+        self.app.align_updates = self.align_var.get()
+        
+        # Adaptive mode bounds (the fixed interval is the starting point)
+        try:
+            min_minutes = max(1, int(self.min_interval_var.get()))
+            max_minutes = max(min_minutes, int(self.max_interval_var.get()))
+        except (ValueError, tk.TclError):
+            messagebox.showerror("Error", "Adaptive interval limits must be whole numbers")
+            return
+        self.app.adaptive_polling = self.adaptive_var.get()
+        self.app.min_interval = min_minutes * 60
+        self.app.max_interval = max_minutes * 60
+        self.app.adaptive.min_interval = self.app.min_interval
+        self.app.adaptive.max_interval = self.app.max_interval
+        self.app.last_reading = None
         self.app.save_config()
         
-        # Restart the update thread with new interval
-        self.app.running = False
-        if hasattr(self.app, 'update_thread') and self.app.update_thread.is_alive():
-            time.sleep(0.5)  # Give thread time to stop
-            
-        self.app.running = True
-        self.app.update_thread = self.app.threading.Thread(target=self.app.update_loop)
-        self.app.update_thread.daemon = True
-        self.app.update_thread.start()
+        # Cached responses must expire before the next update
+        self.app.weather.cache.ttl = self.app.weather.cache_ttl()
+        
+        # The next update is planned with the new interval right away
+        self.app.scheduler.set_interval(self.app.update_interval, self.app.align_updates)
+        self.app.update_interval_label()
         
         messagebox.showinfo("Success", f"Update interval set to {minutes} minutes")
 
+    def save_cache_settings(self):
+        """Save how long API responses are reused and whether they are kept on disk"""
+        try:
+            minutes = max(0, int(self.cache_ttl_var.get()))
+        except (ValueError, tk.TclError):
+            minutes = 0
+        self.app.cache_ttl = minutes * 60
+        self.app.cache_persist = self.cache_persist_var.get()
+        self.app.save_config()
+        
+        self.app.weather.open_cache()
+        ttl = self.app.weather.cache.ttl
+        if ttl < self.app.cache_ttl:
+            self.app.status_label.config(text=f"API responses reused for {ttl} s (capped at half the update interval)")
+        elif minutes:
+            self.app.status_label.config(text=f"API responses reused for {minutes} min")
+        else:
+            self.app.status_label.config(text="Response cache disabled")
+
+    def save_forecast_settings(self):
+        """Enable or disable the forecast updates and set their interval"""
+        try:
+            minutes = max(1, int(self.forecast_interval_var.get()))
+        except (ValueError, tk.TclError):
+            minutes = self.app.forecast_interval // 60
+        self.app.forecast_enabled = self.forecast_var.get()
+        self.app.forecast_interval = minutes * 60
+        self.app.save_config()
+        
+        self.app.forecast_scheduler.set_interval(self.app.forecast_interval)
+        if self.app.forecast_enabled:
+            self.app.start_forecast_updates()
+            self.app.status_label.config(text=f"Forecast updated every {minutes} min")
+        else:
+            self.app.forecast_scheduler.stop()
+            self.app.status_label.config(text="Forecast updates disabled")
+        self.app.weather.update_forecast_ui()
+
     def save_api_key(self):
         """Save the API key from the settings tab"""
         new_key = self.api_key_entry.get().strip()
@@ -166,20 +463,206 @@ class SettingsTab:
             messagebox.showerror("Error", "API Key cannot be empty")
             return
         
+        try:
+            per_minute = max(1, int(self.rate_minute_var.get()))
+            per_day = max(1, int(self.rate_day_var.get()))
+        except (ValueError, tk.TclError):
+            messagebox.showerror("Error", "Rate limits must be whole numbers")
+            return
+        
         self.app.api_key = new_key
+        if (per_minute, per_day) != (self.app.rate_limit_per_minute, self.app.rate_limit_per_day):
+            self.app.rate_limit_per_minute = per_minute
+            self.app.rate_limit_per_day = per_day
+            configure_limiter(per_minute, per_day)
         self.app.save_config()
+        self.app.update_quota_label()
         
-        # Start the update thread if it doesn't exist
-        if not hasattr(self.app, 'update_thread') or not self.app.update_thread.is_alive():
-            self.app.update_thread = self.app.threading.Thread(target=self.app.update_loop)
-            self.app.update_thread.daemon = True
-            self.app.update_thread.start()
+        # Start the periodic updates if they are not running yet
+        self.app.start_updates()
         
         # Switch to weather tab and fetch data
         self.app.notebook.select(self.app.weather_tab_frame)
         self.app.weather.fetch_weather()
         messagebox.showinfo("Success", "API key saved successfully")
 
+    def save_cities(self):
+        """Save the additional cities and how their rows are stored"""
+        cities = [city.strip() for city in self.extra_cities_entry.get().split(';') if city.strip()]
+        
+        # Rows already queued are written with the old settings
+        self.app.weather.after_writes(lambda: self._apply_cities(cities))
+
+    def _apply_cities(self, cities):
+        """Switch to the new cities once the queued rows are written"""
+        self.app.extra_cities = cities
+        self.app.partition_by_city = self.partition_var.get()
+        self.app.batch_requests = self.batch_requests_var.get()
+        self.app.save_config()
+        
+        self.app.weather.refresh_city_list()
+        self.app.weather.resolve_city_ids()
+        self.app.status_label.config(text=f"Monitoring {len(self.app.weather.monitored_cities())} cities")
+        
+        # Fetch the new cities right away
+        if self.app.api_key and cities:
+            self.app.weather.fetch_weather()
+
+    def download_city_list(self):
+        """Download the OWM city list and build the offline index for autocomplete"""
+        self.city_list_btn.config(state="disabled")
+        self.app.status_label.config(text="Downloading city list...")
+        self.app.weather.load_city_index(download=True,
+                                         on_complete=lambda: self.city_list_btn.config(state="normal"))
+
+    def save_csv_layout(self):
+        """Switch between the newest-first and append CSV layouts"""
+        new_layout = LAYOUT_APPEND if self.append_layout_var.get() else LAYOUT_NEWEST_FIRST
+        if new_layout == self.app.csv_layout:
+            return
+        
+        # Queued rows are written in the old layout first
+        self.app.weather.after_writes(
+            lambda: self._convert_csv_layout(new_layout),
+            on_timeout=lambda: self.append_layout_var.set(self.app.csv_layout == LAYOUT_APPEND))
+
+    def _convert_csv_layout(self, new_layout):
+        """
+        Reorder the existing rows once so the files match the new layout
+        
+        The files are rewritten on a background thread. The writer is paused
+        meanwhile, so new records are written in the new layout afterwards.
+        """
+        self.append_check.config(state="disabled")
+        self.app.status_label.config(text="Converting CSV layout...")
+        self.app.weather.writer.pause()
+        
+        weather_files = self.app.weather.csv_files()
+        old_layout = self.app.csv_layout
+        
+        def run():
+            try:
+                for weather_file in weather_files:
+                    convert_history_layout(weather_file, old_layout, new_layout)
+                error = None
+            except Exception as e:
+                error = e
+            self.app.root.after(0, lambda: self._finish_layout_conversion(new_layout, error))
+            
+        thread = threading.Thread(target=run)
+        thread.daemon = True
+        thread.start()
+    
+    def _finish_layout_conversion(self, new_layout, error):
+        """Switch to the converted layout and resume writing (UI thread)"""
+        self.append_check.config(state="normal")
+        if error:
+            self.app.weather.writer.resume()
+            self.append_layout_var.set(self.app.csv_layout == LAYOUT_APPEND)
+            messagebox.showerror("Conversion Error", f"Error converting CSV layout: {str(error)}")
+            self.app.status_label.config(text="CSV layout unchanged")
+            return
+        
+        self.app.csv_layout = new_layout
+        self.app.weather.writer.resume()
+        self.app.save_config()
+        
+        if new_layout == LAYOUT_APPEND:
+            self.app.status_label.config(text="CSV layout: newest row at the end")
+        else:
+            self.app.status_label.config(text="CSV layout: newest row at the top")
+
+    def upgrade_csv_columns(self):
+        """Rewrite CSV files with an older header to the current columns once the queued records are written"""
+        self.app.weather.after_writes(lambda: self.app.weather.migrate_csv_format(upgrade=True))
+
+    def save_rotation(self, event=None):
+        """Save the history rotation policy"""
+        labels = {label: policy for policy, label in self.ROTATION_LABELS.items()}
+        self.app.rotation = labels.get(self.rotation_var.get(), ROTATION_NONE)
+        
+        try:
+            megabytes = max(1, int(self.rotation_size_var.get()))
+        except (ValueError, tk.TclError):
+            megabytes = 1
+        self.app.rotation_max_bytes = megabytes * 1024 * 1024
+        
+        self.app.save_config()
+        self.app.status_label.config(text=f"History rotation: {self.rotation_var.get()}")
+
+    def save_binary_history(self):
+        """Enable or disable the binary history store once the queued records are written"""
+        self.app.weather.after_writes(
+            self._apply_binary_history,
+            on_timeout=lambda: self.binary_history_var.set(self.app.binary_history))
+
+    def _apply_binary_history(self):
+        """Open or close the binary history store"""
+        self.app.binary_history = self.binary_history_var.get()
+        self.app.save_config()
+        
+        if self.app.weather.open_binary_store():
+            self.app.status_label.config(text="Binary history enabled")
+        elif not self.app.binary_history:
+            self.app.status_label.config(text="Binary history disabled")
+
+    def save_skip_duplicates(self):
+        """Enable or disable skipping unchanged observations"""
+        self.app.skip_duplicates = self.skip_duplicates_var.get()
+        self.app.save_config()
+        
+        if self.app.skip_duplicates:
+            self.app.status_label.config(text="Unchanged observations are skipped")
+        else:
+            self.app.status_label.config(text="Every update is written")
+
+    def save_stale_fallback(self):
+        """Enable or disable writing the last good reading during outages"""
+        self.app.stale_fallback = self.stale_fallback_var.get()
+        self.app.save_config()
+        
+        if self.app.stale_fallback:
+            self.app.status_label.config(text="Last good reading is repeated during outages")
+        else:
+            self.app.status_label.config(text="Nothing is written during outages")
+
+    def save_history_backend(self, event=None):
+        """Switch the backend that serves history queries once the queued records are written"""
+        self.app.weather.after_writes(
+            self._apply_history_backend,
+            on_timeout=lambda: self.backend_var.set(self.BACKEND_LABELS.get(self.app.history_backend, "CSV")))
+
+    def _apply_history_backend(self):
+        """Open or close the SQLite history"""
+        labels = {label: backend for backend, label in self.BACKEND_LABELS.items()}
+        self.app.history_backend = labels.get(self.backend_var.get(), BACKEND_CSV)
+        self.app.save_config()
+        
+        # An empty database is indexed in the background and reports when it is ready
+        self.app.weather.open_history_db(
+            on_ready=lambda: self.app.status_label.config(text="History backend: SQLite"))
+        if self.app.history_backend == BACKEND_CSV:
+            self.app.status_label.config(text="History backend: CSV")
+
+    def export_csv(self):
+        """Regenerate the NOTCH CSV files from the SQLite history once the queued records are written"""
+        if self.app.weather.pending_history_db:
+            self.app.status_label.config(text="The weather history is still being indexed, try again later")
+            return
+        if not self.app.weather.history_db:
+            messagebox.showerror("Error", "Select the SQLite history backend to export from it")
+            return
+            
+        self.app.weather.after_writes(self._export_csv)
+
+    def _export_csv(self):
+        """Rewrite the current CSV files from the SQLite history"""
+        try:
+            count = self.app.weather.export_history_db()
+            self.app.status_label.config(text=f"Exported {count} rows to CSV")
+        except Exception as e:
+            messagebox.showerror("Export Error", f"Error exporting CSV: {str(e)}")
+
     def browse_file(self):
         """Open a dialog to choose where to save the CSV file, including filename"""
         # Get the current directory and filename
@@ -208,8 +691,6 @@ class SettingsTab:
 
     def save_file_settings(self):
         """Save the file path settings"""
-        import shutil
-        
         # Get the full file path from the label
         new_file_path = self.file_path_label.cget("text")
         
@@ -220,37 +701,47 @@ class SettingsTab:
         
         # Check if it's different from the current path
         if new_file_path != os.path.abspath(self.app.weather_file):
-            # Check if should migrate data
+            # Queued records are written to the old file first
             migrate = self.migrate_var.get()
-            
-            # Remember the old file path
-            old_file_path = self.app.weather_file
-            
-            # Update the file path
-            self.app.weather_file = new_file_path
-            
-            # Update config
-            self.app.save_config()
-            
-            # If migration is requested and the old file exists, copy the data
-            if migrate and os.path.exists(old_file_path):
-                try:
-                    # Create directory if it doesn't exist
-                    os.makedirs(os.path.dirname(new_file_path), exist_ok=True)
-                    
-                    # Copy the file
-                    shutil.copy2(old_file_path, new_file_path)
-                    messagebox.showinfo("Success", f"Weather data file location updated and data migrated.\nNew location: {new_file_path}")
-                    self.app.status_label.config(text="Data file location updated with migration")
-                except Exception as e:
-                    messagebox.showerror("Migration Error", f"Error copying data: {str(e)}\nData file location updated but data was not transferred.")
-                    self.app.status_label.config(text="Data file location updated but migration failed")
-            else:
-                messagebox.showinfo("Success", f"Weather data file location updated.\nNew location: {new_file_path}")
-                self.app.status_label.config(text="Data file location updated")
-            
-            # Update the CSV path in the weather tab
-            if hasattr(self.app.weather, 'csv_path'):
-                self.app.weather.csv_path.config(text=os.path.abspath(new_file_path))
+            self.app.weather.after_writes(lambda: self._move_data_file(new_file_path, migrate))
         else:
-            messagebox.showinfo("Info", "File location is unchanged")
\ No newline at end of file
+            messagebox.showinfo("Info", "File location is unchanged")
+
+    def _move_data_file(self, new_file_path, migrate):
+        """Switch to a new CSV file, copying the existing history if migrate is set"""
+        # Remember the old file path
+        old_file_path = self.app.weather_file
+        
+        # Update the file path
+        self.app.weather_file = new_file_path
+        
+        # Update config
+        self.app.save_config()
+        
+        # If migration is requested and the old history exists, copy the data
+        if migrate and history_files(old_file_path):
+            try:
+                # Copy the current file together with its rotated segments
+                copy_history(old_file_path, new_file_path)
+                for city in self.app.extra_cities:
+                    if history_files(city_file_for(old_file_path, city)):
+                        copy_history(city_file_for(old_file_path, city), city_file_for(new_file_path, city))
+                messagebox.showinfo("Success", f"Weather data file location updated and data migrated.\nNew location: {new_file_path}")
+                self.app.status_label.config(text="Data file location updated with migration")
+            except Exception as e:
+                messagebox.showerror("Migration Error", f"Error copying data: {str(e)}\nData file location updated but data was not transferred.")
+                self.app.status_label.config(text="Data file location updated but migration failed")
+        else:
+            messagebox.showinfo("Success", f"Weather data file location updated.\nNew location: {new_file_path}")
+            self.app.status_label.config(text="Data file location updated")
+        
+        # Update the CSV path in the weather tab
+        if hasattr(self.app.weather, 'csv_path'):
+            self.app.weather.csv_path.config(text=os.path.abspath(new_file_path))
+        
+        # A new file gets its own migration attempt
+        self.app.weather.migration_failed = False
+        
+        # The binary and SQLite histories live next to the CSV file
+        self.app.weather.open_binary_store()
+        self.app.weather.open_history_db()
\ No newline at end of file
@@ -0,0 +1,268 @@
+"""
+OpenWeatherMap API module for NOTCH Data Tool
+"""
+from datetime import datetime
+from urllib.parse import urlparse
+
+import requests
+
+from modules.circuit_breaker import CircuitOpenError, get_breaker
+from modules.http_client import get_client
+from modules.rate_limiter import PRIORITY_HIGH, RateLimitExceeded, get_limiter
+
+# API endpoints (relative to the base URL, which can point at a local test server)
+API_BASE_URL = "https://api.openweathermap.org/data/2.5"
+CURRENT_WEATHER_PATH = "/weather"
+GROUP_WEATHER_PATH = "/group"
+FORECAST_PATH = "/forecast"
+CURRENT_WEATHER_URL = API_BASE_URL + CURRENT_WEATHER_PATH
+
+# Hourly history (a separate host and subscription at OpenWeatherMap)
+HISTORY_API_BASE_URL = "https://history.openweathermap.org/data/2.5"
+HISTORY_PATH = "/history/city"
+
+# Maximum number of city IDs accepted by one group request
+GROUP_MAX_IDS = 20
+
+
+# Status codes that mean the provider itself is failing or overloaded
+PROVIDER_FAILURE_STATUS = 429
+
+
+class WeatherAPIError(Exception):
+    """Error response from the weather API"""
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def is_provider_failure(error):
+    """Check if an error was caused by the provider (network error, timeout, 5xx or 429 response)"""
+    if isinstance(error, requests.RequestException):
+        return True
+    if isinstance(error, WeatherAPIError) and error.status_code:
+        return error.status_code >= 500 or error.status_code == PROVIDER_FAILURE_STATUS
+    return False
+
+def is_unavailable(error):
+    """
+    Check if an error means no fresh data can be had right now
+
+    True for provider failures and for requests refused by the circuit
+    breaker or the rate limiter; False for errors in the request itself
+    (unknown city, invalid API key).
+    """
+    return isinstance(error, (CircuitOpenError, RateLimitExceeded)) or is_provider_failure(error)
+
+def _get(api_key, url, params, priority):
+    """
+    Send one API request through the circuit breaker and the rate limiter
+
+    Retries made by the HTTP client take a rate limit token each, since the
+    provider counts every attempt.
+
+    Returns:
+        Response: A 200 response
+
+    Raises:
+        CircuitOpenError: While the provider is considered down
+        RateLimitExceeded: If the rate limiter refused the request
+        WeatherAPIError: For error responses
+    """
+    breaker = get_breaker(url)
+    breaker.before_request()
+    limiter = get_limiter()
+    try:
+        limiter.acquire(api_key, priority)
+    except RateLimitExceeded:
+        breaker.release()
+        raise
+
+    try:
+        response = get_client().get(url, params=params, before_retry=lambda: limiter.acquire(api_key, priority))
+    except requests.RequestException:
+        breaker.record_failure()
+        raise
+
+    try:
+        _raise_for_error(response)
+    except WeatherAPIError as e:
+        if is_provider_failure(e):
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        raise
+    breaker.record_success()
+    return response
+
+def _raise_for_error(response):
+    """Raise a WeatherAPIError with the API's message for non-200 responses"""
+    if response.status_code == 200:
+        return
+
+    error_msg = f"Error: {response.status_code}"
+    try:
+        data = response.json()
+        if "message" in data:
+            error_msg += f" - {data['message']}"
+    except ValueError:
+        pass
+    raise WeatherAPIError(error_msg, response.status_code)
+
+def _location_params(city, city_id=None, coords=None):
+    """Query parameters selecting a location by coordinates, city ID or name (in that order)"""
+    if coords:
+        return {'lat': coords[0], 'lon': coords[1]}
+    if city_id:
+        return {'id': city_id}
+    return {'q': city}
+
+def fetch_current_weather(api_key, city, units="metric", base_url=API_BASE_URL, priority=PRIORITY_HIGH,
+                          city_id=None, coords=None):
+    """
+    Fetch the current weather for a city
+
+    The location is requested by its (lat, lon) coords if given (from
+    geolocation), else by its OpenWeatherMap city_id, and only otherwise by
+    name, which the API has to resolve and may find ambiguous.
+
+    The request passes the provider's circuit breaker and takes a token
+    from the API key's rate limiter first; either can refuse it with
+    CircuitOpenError or RateLimitExceeded.
+
+    Returns:
+        dict: Parsed JSON response of the current weather endpoint
+    """
+    params = _location_params(city, city_id, coords)
+    params.update({'appid': api_key, 'units': units})
+    return _get(api_key, base_url.rstrip('/') + CURRENT_WEATHER_PATH, params, priority).json()
+
+def fetch_weather_group(api_key, city_ids, units="metric", base_url=API_BASE_URL, priority=PRIORITY_HIGH):
+    """
+    Fetch the current weather for up to GROUP_MAX_IDS cities in one request
+
+    Each entry of the group response has the same shape as a current
+    weather response, so it can be passed to build_weather_record directly.
+
+    Returns:
+        dict: City ID -> parsed current weather of that city
+    """
+    if len(city_ids) > GROUP_MAX_IDS:
+        raise ValueError(f"A group request accepts at most {GROUP_MAX_IDS} city IDs")
+
+    params = {'id': ",".join(str(city_id) for city_id in city_ids), 'appid': api_key, 'units': units}
+    response = _get(api_key, base_url.rstrip('/') + GROUP_WEATHER_PATH, params, priority)
+    return {entry['id']: entry for entry in response.json().get('list', [])}
+
+def fetch_forecast(api_key, city, units="metric", base_url=API_BASE_URL, priority=PRIORITY_HIGH,
+                   city_id=None, coords=None):
+    """
+    Fetch the 5 day forecast in 3 hour steps for a city
+
+    The location is chosen like in fetch_current_weather().
+
+    Returns:
+        dict: Parsed JSON response of the forecast endpoint
+    """
+    params = _location_params(city, city_id, coords)
+    params.update({'appid': api_key, 'units': units})
+    return _get(api_key, base_url.rstrip('/') + FORECAST_PATH, params, priority).json()
+
+def build_forecast_records(data, issued=None):
+    """
+    Extract one row per 3 hour forecast slot from a forecast response
+
+    Returns:
+        list: Slot records (FORECAST_FIELDNAMES of the forecast store)
+    """
+    issued = (issued or datetime.now()).strftime("%Y-%m-%d %H:%M:%S")
+    city = data['city']['name']
+
+    records = []
+    for slot in data.get('list', []):
+        target = datetime.fromtimestamp(slot['dt'])
+        records.append({
+            'city': city,
+            'target_date': target.strftime("%Y-%m-%d"),
+            'target_time': target.strftime("%H:%M:%S"),
+            'target': slot['dt'],
+            'description': slot['weather'][0]['description'],
+            'temperature': slot['main']['temp'],
+            'feels_like': slot['main']['feels_like'],
+            'humidity': slot['main']['humidity'],
+            'pressure': slot['main']['pressure'],
+            'wind_speed': slot['wind']['speed'],
+            'wind_deg': slot['wind'].get('deg', ''),
+            'clouds': slot.get('clouds', {}).get('all', ''),
+            'pop': slot.get('pop', ''),
+            'issued': issued
+        })
+    return records
+
+def fetch_history(api_key, city, start, end, units="metric", base_url=HISTORY_API_BASE_URL,
+                  priority=PRIORITY_HIGH, city_id=None, coords=None):
+    """
+    Fetch the hourly weather history of a city between two epoch timestamps
+
+    The location is chosen like in fetch_current_weather().
+
+    Returns:
+        list: Hourly entries shaped like current weather responses (without name and coord)
+    """
+    params = _location_params(city, city_id, coords)
+    params.update({'type': 'hour', 'start': int(start), 'end': int(end), 'appid': api_key, 'units': units})
+    return _get(api_key, base_url.rstrip('/') + HISTORY_PATH, params, priority).json().get('list', [])
+
+def build_history_record(entry, city, coords=None):
+    """
+    Build a weather CSV row from one hourly history entry
+
+    The row is dated at the observation time, so backfilled rows sort into
+    the history like rows written by live updates.
+
+    Args:
+        entry: One item of fetch_history()
+        city: City name for the 'city' column
+        coords: (lat, lon) of the city, if known
+    """
+    data = dict(entry, name=city)
+    data.setdefault('coord', {'lat': coords[0], 'lon': coords[1]} if coords else {'lat': '', 'lon': ''})
+    return build_weather_record(data, datetime.fromtimestamp(entry['dt']))
+
+def api_latency(base_url=API_BASE_URL):
+    """
+    Latency statistics of requests to the weather API
+
+    Returns:
+        dict: requests, failures, last/avg/p95 latency in seconds (empty if no requests yet)
+    """
+    return get_client().metrics().get(urlparse(base_url).netloc, {})
+
+def build_weather_record(data, now=None):
+    """
+    Extract the most important weather data from an API response
+
+    Returns:
+        dict: One CSV row with separate date and time columns
+    """
+    # Get current date and time separately
+    now = now or datetime.now()
+
+    return {
+        'date': now.strftime("%Y-%m-%d"),
+        'time': now.strftime("%H:%M:%S"),
+        'city': data['name'],
+        'description': data['weather'][0]['description'],
+        'temperature': data['main']['temp'],
+        'feels_like': data['main']['feels_like'],
+        'humidity': data['main']['humidity'],
+        'pressure': data['main']['pressure'],
+        'wind_speed': data['wind']['speed'],
+        'wind_deg': data['wind'].get('deg', ''),
+        'visibility': data.get('visibility', ''),
+        'longitude': data['coord']['lon'],
+        'latitude': data['coord']['lat'],
+        'observed': data.get('dt', ''),
+        'stale_seconds': 0
+    }
@@ -0,0 +1,188 @@
+"""
+Weather response cache module for NOTCH Data Tool
+"""
+import json
+import os
+import threading
+import time
+
+# File used to keep cached responses across restarts
+CACHE_FILE = "weather_cache.json"
+
+# Default time-to-live in seconds (OWM refreshes observations about every 10 minutes)
+DEFAULT_TTL = 600
+
+# A cached response may live at most this share of the poll interval, so
+# every scheduled update finds the previous response expired
+MAX_TTL_FRACTION = 0.5
+
+
+def cache_key(city, units="metric"):
+    """Cache key of a city query"""
+    return (city.strip().lower(), units)
+
+def effective_ttl(ttl, poll_interval):
+    """Time-to-live capped below the shortest poll interval"""
+    return max(0, min(ttl, int(poll_interval * MAX_TTL_FRACTION)))
+
+
+class _Flight:
+    """A request in progress that other callers can wait for"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.entry = None
+        self.error = None
+
+
+class WeatherCache:
+    """
+    In-process cache of weather API responses keyed by (city, units)
+
+    Entries expire ttl seconds after they were fetched; a ttl of 0 disables
+    caching. get_or_fetch() coalesces concurrent misses for the same key:
+    the first caller performs the request while the others wait for its
+    result (or error) instead of sending duplicates. With a path, entries
+    are saved to a JSON file after every change and reloaded on startup.
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL, path=None, on_error=None):
+        """
+        Args:
+            on_error: Optional callback receiving the exception of a failed save
+        """
+        self.ttl = ttl
+        self.path = path
+        self.on_error = on_error
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._entries = {}    # key -> (data, fetched_at epoch seconds)
+        self._in_flight = {}  # key -> _Flight
+
+        # Statistics
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+        if path:
+            self._load()
+
+    def _fresh(self, key):
+        """Entry for a key if it has not expired (lock must be held)"""
+        entry = self._entries.get(key)
+        if entry and time.time() - entry[1] < self.ttl:
+            return entry
+        return None
+
+    def get(self, key):
+        """
+        Look up a fresh entry without counting a hit
+
+        Returns:
+            tuple: (data, fetched_at) or None if missing or expired
+        """
+        with self._lock:
+            return self._fresh(key)
+
+    def put(self, key, data, fetched_at=None):
+        """Store a response and return its (data, fetched_at) entry"""
+        entry = (data, fetched_at or time.time())
+        if self.ttl <= 0:
+            return entry
+        with self._lock:
+            self._entries[key] = entry
+        self._save()
+        return entry
+
+    def get_or_fetch(self, key, fetch_func):
+        """
+        Return a fresh entry, calling fetch_func at most once per key at a time
+
+        Returns:
+            tuple: (data, fetched_at)
+
+        Raises:
+            Whatever fetch_func raised, for the caller that made the request
+            and for every caller that waited for it
+        """
+        with self._lock:
+            entry = self._fresh(key)
+            if entry:
+                self.hits += 1
+                return entry
+
+            flight = self._in_flight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._in_flight[key] = _Flight()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error:
+                raise flight.error
+            return flight.entry
+
+        try:
+            flight.entry = self.put(key, fetch_func())
+            return flight.entry
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            flight.done.set()
+
+    def clear(self):
+        """Drop every cached entry"""
+        with self._lock:
+            self._entries = {}
+        self._save()
+
+    def stats(self):
+        """Hit, miss and coalescing counters"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced
+            }
+
+    def _load(self):
+        """Read unexpired entries from the cache file"""
+        try:
+            with open(self.path, 'r') as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return
+
+        now = time.time()
+        for item in stored.get('entries', []):
+            try:
+                if now - item['fetched_at'] < self.ttl:
+                    self._entries[(item['city'], item['units'])] = (item['data'], item['fetched_at'])
+            except (KeyError, TypeError):
+                continue
+
+    def _save(self):
+        """Write the entries to the cache file (temporary file + rename)"""
+        if not self.path:
+            return
+
+        with self._lock:
+            entries = [{'city': city, 'units': units, 'fetched_at': fetched_at, 'data': data}
+                       for (city, units), (data, fetched_at) in self._entries.items()]
+
+        with self._save_lock:
+            temp_file = f"{self.path}.tmp"
+            try:
+                with open(temp_file, 'w') as f:
+                    json.dump({'entries': entries}, f)
+                os.replace(temp_file, self.path)
+            except OSError as e:
+                if self.on_error:
+                    self.on_error(e)
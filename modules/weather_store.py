@@ -0,0 +1,556 @@
+"""
+Weather history storage module for NOTCH Data Tool
+"""
+import csv
+import io
+import os
+import re
+import shutil
+from datetime import datetime
+
+# CSV layouts
+LAYOUT_NEWEST_FIRST = "newest_first"  # Newest row directly under the header (rewrites the file)
+LAYOUT_APPEND = "append"              # Newest row at the end of the file (one append per fetch)
+CSV_LAYOUTS = [LAYOUT_NEWEST_FIRST, LAYOUT_APPEND]
+
+# History rotation policies
+ROTATION_NONE = "none"
+ROTATION_DAILY = "daily"
+ROTATION_SIZE = "size"
+ROTATION_POLICIES = [ROTATION_NONE, ROTATION_DAILY, ROTATION_SIZE]
+
+# Column order of the weather CSV read by NOTCH
+# ('observed' is the provider's observation time in epoch seconds, 'stale_seconds'
+# the age of a repeated last good reading written while the provider is down)
+WEATHER_FIELDNAMES = ['date', 'time', 'city', 'description', 'temperature',
+                      'feels_like', 'humidity', 'pressure', 'wind_speed',
+                      'wind_deg', 'visibility', 'longitude', 'latitude', 'observed',
+                      'stale_seconds']
+
+# Block size used when scanning a file backwards from EOF
+REVERSE_BLOCK_SIZE = 8192
+
+# Rows between progress reports during a migration
+MIGRATION_PROGRESS_ROWS = 1000
+
+# Rows searched for a specific city before falling back to the newest row
+CITY_SCAN_ROWS = 1000
+
+
+def ensure_parent_dir(path):
+    """Create the directory containing path if it doesn't exist"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+def read_header(weather_file):
+    """
+    Read the header row of a CSV file
+
+    Returns:
+        list: Column names, or None if the file is missing or empty
+    """
+    try:
+        with open(weather_file, 'r', newline='') as f:
+            first_line = f.readline()
+    except FileNotFoundError:
+        return None
+
+    if not first_line.strip():
+        return None
+    return next(csv.reader([first_line]))
+
+def write_header(weather_file, fieldnames=WEATHER_FIELDNAMES):
+    """Create an empty CSV file containing only the header row"""
+    ensure_parent_dir(weather_file)
+    with open(weather_file, 'w', newline='') as f:
+        csv.writer(f).writerow(fieldnames)
+
+def append_weather_rows(weather_file, rows, fieldnames=WEATHER_FIELDNAMES):
+    """
+    Append rows (oldest first) to the end of the CSV file
+
+    Only the header is read, so the cost of a write does not grow with the
+    size of the history. The rows are formatted in memory and written with
+    a single call. If the file already has a header its column order is
+    kept so existing rows stay aligned.
+    """
+    ensure_parent_dir(weather_file)
+
+    existing_fieldnames = read_header(weather_file)
+    if existing_fieldnames and 'timestamp' in existing_fieldnames:
+        # Legacy layout kept after a failed migration: fill the combined timestamp
+        rows = [dict(row, timestamp=f"{row.get('date', '')} {row.get('time', '')}") for row in rows]
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=existing_fieldnames or fieldnames, extrasaction='ignore')
+    if not existing_fieldnames:
+        writer.writeheader()
+    writer.writerows(rows)
+
+    with open(weather_file, 'a', newline='') as f:
+        f.write(buffer.getvalue())
+
+def append_weather_row(weather_file, weather_data, fieldnames=WEATHER_FIELDNAMES):
+    """Append a single row to the end of the CSV file"""
+    append_weather_rows(weather_file, [weather_data], fieldnames)
+
+def prepend_weather_rows(weather_file, rows, fieldnames=WEATHER_FIELDNAMES):
+    """
+    Write rows (oldest first) directly under the header, keeping the newest entry at the top
+
+    The existing rows are streamed into a temporary file behind the new
+    rows and the result is renamed over the original, so a batch costs one
+    rewrite no matter how many rows it holds.
+    """
+    ensure_parent_dir(weather_file)
+
+    temp_file = f"{weather_file}.tmp"
+    with open(temp_file, 'w', newline='') as dst:
+        writer = csv.DictWriter(dst, fieldnames=fieldnames, extrasaction='ignore')
+        writer.writeheader()
+
+        # Write the new rows first (newest at the top)
+        writer.writerows(reversed(rows))
+
+        # Copy all existing rows after it
+        try:
+            with open(weather_file, 'r', newline='') as src:
+                for row in csv.DictReader(src):
+                    # Ensure all rows have the same fieldnames (a file whose migration
+                    # failed may still hold legacy combined timestamps)
+                    if 'timestamp' in row:
+                        row = _migrate_row(row)
+                    writer.writerow({field: row.get(field, '') for field in fieldnames})
+        except FileNotFoundError:
+            pass
+
+    os.replace(temp_file, weather_file)
+
+def prepend_weather_row(weather_file, weather_data, fieldnames=WEATHER_FIELDNAMES):
+    """Write a single row directly under the header"""
+    prepend_weather_rows(weather_file, [weather_data], fieldnames)
+
+def save_weather_rows(weather_file, rows, layout=LAYOUT_NEWEST_FIRST):
+    """Store weather rows (oldest first) using the configured CSV layout"""
+    if not rows:
+        return
+    if layout == LAYOUT_APPEND:
+        append_weather_rows(weather_file, rows)
+    else:
+        prepend_weather_rows(weather_file, rows)
+
+def save_weather_row(weather_file, weather_data, layout=LAYOUT_NEWEST_FIRST):
+    """Store a weather row using the configured CSV layout"""
+    save_weather_rows(weather_file, [weather_data], layout)
+
+def reverse_lines(f, start=0, block_size=REVERSE_BLOCK_SIZE):
+    """
+    Yield the lines of a binary file from last to first
+
+    The file is read backwards in fixed size blocks, stopping at byte offset
+    start, so only the lines that are actually consumed are ever loaded.
+    Line endings are stripped and blank lines are skipped.
+    """
+    f.seek(0, os.SEEK_END)
+    position = f.tell()
+    remainder = b''
+
+    while position > start:
+        read_size = min(block_size, position - start)
+        position -= read_size
+        f.seek(position)
+        block = f.read(read_size) + remainder
+
+        lines = block.split(b'\n')
+        # The first piece may be the tail of a line that starts in an earlier block
+        remainder = lines.pop(0)
+        for line in reversed(lines):
+            line = line.rstrip(b'\r')
+            if line:
+                yield line
+
+    remainder = remainder.rstrip(b'\r')
+    if remainder:
+        yield remainder
+
+def _decode_row(line, fieldnames):
+    """Parse a single raw CSV line into a dictionary"""
+    values = next(csv.reader([line.decode('utf-8', errors='replace')]), [])
+    return {field: values[i] if i < len(values) else '' for i, field in enumerate(fieldnames)}
+
+def iter_rows_newest_first(weather_file, layout=LAYOUT_NEWEST_FIRST):
+    """
+    Iterate over the weather rows starting with the most recent one
+
+    Rows are produced lazily for both layouts: a newest-first file is read
+    forwards, an append file is scanned backwards from EOF. Consumers that
+    stop early (e.g. to read only the latest entry) never touch the rest of
+    the file.
+    """
+    if not os.path.exists(weather_file):
+        return
+
+    if layout == LAYOUT_APPEND:
+        fieldnames = read_header(weather_file)
+        if not fieldnames:
+            return
+
+        with open(weather_file, 'rb') as f:
+            # Scan back to the end of the header line
+            header_end = len(f.readline())
+            for line in reverse_lines(f, start=header_end):
+                yield _decode_row(line, fieldnames)
+    else:
+        with open(weather_file, 'r', newline='') as f:
+            for row in csv.DictReader(f):
+                yield row
+
+def read_latest_row(weather_file, layout=LAYOUT_NEWEST_FIRST):
+    """
+    Read only the most recent weather row
+
+    For the newest-first layout this is the record right after the header;
+    for the append layout the last block of the file is read and the final
+    complete line parsed. Either way a single record is decoded, so the
+    cost does not depend on how much history the file holds.
+
+    Returns:
+        dict: The latest row, or None if the file has no data rows
+    """
+    try:
+        if layout == LAYOUT_APPEND:
+            with open(weather_file, 'rb') as f:
+                header_line = f.readline()
+                fieldnames = next(csv.reader([header_line.decode('utf-8', errors='replace')]), None)
+                if not fieldnames:
+                    return None
+
+                for line in reverse_lines(f, start=len(header_line)):
+                    return _decode_row(line, fieldnames)
+                return None
+
+        with open(weather_file, 'r', newline='') as f:
+            reader = csv.DictReader(f)
+            return next(reader, None)
+    except FileNotFoundError:
+        return None
+
+def convert_csv_layout(weather_file, from_layout, to_layout):
+    """
+    Convert an existing CSV file between the newest-first and append layouts
+
+    Both layouts hold the same rows in opposite order, so the conversion is
+    a streaming reversal of the data rows into a temporary file followed by
+    an atomic rename. Memory use stays constant regardless of file size.
+
+    Returns:
+        bool: True if the file was rewritten
+    """
+    if from_layout == to_layout or not os.path.exists(weather_file):
+        return False
+
+    fieldnames = read_header(weather_file)
+    if not fieldnames:
+        return False
+
+    temp_file = f"{weather_file}.tmp"
+    with open(weather_file, 'rb') as src, open(temp_file, 'wb') as dst:
+        header_line = src.readline()
+        header_end = len(header_line)
+        dst.write(header_line.rstrip(b'\r\n') + b'\r\n')
+
+        for line in reverse_lines(src, start=header_end):
+            dst.write(line + b'\r\n')
+
+    os.replace(temp_file, weather_file)
+    return True
+
+
+def _segment_pattern(weather_file):
+    """Regex matching the segment files that belong to weather_file"""
+    stem, ext = os.path.splitext(os.path.basename(weather_file))
+    return re.compile(rf"^{re.escape(stem)}-(\d{{4}}-\d{{2}}-\d{{2}})(?:-(\d+))?{re.escape(ext)}$")
+
+def list_segments(weather_file):
+    """
+    List the rotated segment files of a weather history, oldest first
+
+    Segments live next to the current file and are named after it, e.g.
+    weather-2026-10-17.csv for a daily roll or weather-2026-10-17-002.csv
+    for a size-based roll.
+    """
+    directory = os.path.dirname(os.path.abspath(weather_file))
+    pattern = _segment_pattern(weather_file)
+
+    segments = []
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+
+    for name in names:
+        match = pattern.match(name)
+        if match:
+            key = (match.group(1), int(match.group(2) or 0))
+            segments.append((key, os.path.join(directory, name)))
+
+    return [path for key, path in sorted(segments)]
+
+def history_files(weather_file):
+    """All files of a weather history, oldest segment first and the current file last"""
+    files = list_segments(weather_file)
+    if os.path.exists(weather_file):
+        files.append(weather_file)
+    return files
+
+def city_name(city):
+    """City name without the country/state suffix ("Paris,FR" -> "Paris")"""
+    return city.split(',')[0].strip()
+
+def city_file_for(weather_file, city):
+    """
+    Path of the CSV file holding a single city's history
+
+    The city is appended to the file name ("weather.csv" -> "weather_paris_fr.csv"),
+    which never collides with the dated names of rotated segments.
+    """
+    stem, ext = os.path.splitext(weather_file)
+    slug = re.sub(r'[^0-9A-Za-z]+', '_', city).strip('_').lower() or "city"
+    return f"{stem}_{slug}{ext}"
+
+def segment_path_for(weather_file, date_str, counter=0):
+    """Build the path of a segment file for the given date"""
+    stem, ext = os.path.splitext(os.path.abspath(weather_file))
+    if counter:
+        return f"{stem}-{date_str}-{counter:03d}{ext}"
+    return f"{stem}-{date_str}{ext}"
+
+def merge_segment_rows(weather_file, date_str, rows, layout=LAYOUT_NEWEST_FIRST):
+    """
+    Merge rows into the segment file of one day, in timestamp order
+
+    Used to add past data to a history. Rows already in the segment with
+    the same city and either the same date and time or the same provider
+    observation time are replaced, so a live row and a backfilled row of
+    one observation are not both kept. Only this one segment is rewritten
+    (temporary file + rename), so the cost depends on a day of data rather
+    than on the size of the history.
+
+    Returns:
+        str: Path of the segment file
+    """
+    path = segment_path_for(weather_file, date_str)
+    merged = {}
+    by_observation = {}  # (city, observed) -> keys of the rows of that observation
+    try:
+        with open(path, 'r', newline='') as f:
+            for row in csv.DictReader(f):
+                key = (row.get('city', '').lower(), row.get('date', ''), row.get('time', ''))
+                merged[key] = row
+                if row.get('observed'):
+                    by_observation.setdefault((key[0], row['observed']), []).append(key)
+    except FileNotFoundError:
+        pass
+    for row in rows:
+        city = str(row.get('city', '')).lower()
+        observed = str(row.get('observed', '') or '')
+        if observed:
+            for key in by_observation.pop((city, observed), []):
+                merged.pop(key, None)
+        key = (city, row.get('date', ''), row.get('time', ''))
+        merged[key] = row
+        if observed:
+            by_observation.setdefault((city, observed), []).append(key)
+
+    ordered = sorted(merged.values(), key=lambda row: (row.get('date', ''), row.get('time', '')),
+                     reverse=layout == LAYOUT_NEWEST_FIRST)
+
+    ensure_parent_dir(path)
+    temp_file = f"{path}.tmp"
+    with open(temp_file, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=WEATHER_FIELDNAMES, restval='', extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(ordered)
+    os.replace(temp_file, path)
+    return path
+
+def rotate_history(weather_file, policy=ROTATION_NONE, max_bytes=0, now=None):
+    """
+    Roll the current weather file into a segment when the policy requires it
+
+    With the daily policy the file is rolled once its last write happened on
+    an earlier day; with the size policy once it reaches max_bytes. The
+    current file is simply renamed, so rotation costs the same regardless
+    of history size. The next write starts a fresh file with a header.
+
+    Returns:
+        str: Path of the new segment, or None if no rotation happened
+    """
+    if policy == ROTATION_NONE or not os.path.exists(weather_file):
+        return None
+
+    now = now or datetime.now()
+    stat = os.stat(weather_file)
+    if stat.st_size == 0:
+        return None
+
+    if policy == ROTATION_DAILY:
+        last_write = datetime.fromtimestamp(stat.st_mtime)
+        if last_write.date() >= now.date():
+            return None
+        date_str = last_write.strftime("%Y-%m-%d")
+        counter = 0
+    elif policy == ROTATION_SIZE:
+        if not max_bytes or stat.st_size < max_bytes:
+            return None
+        date_str = now.strftime("%Y-%m-%d")
+        counter = 1
+    else:
+        return None
+
+    # Only roll files that actually contain data rows
+    with open(weather_file, 'rb') as f:
+        f.readline()
+        if not f.readline().strip():
+            return None
+
+    segment = segment_path_for(weather_file, date_str, counter)
+    while os.path.exists(segment):
+        counter += 1
+        segment = segment_path_for(weather_file, date_str, counter)
+
+    os.replace(weather_file, segment)
+    return segment
+
+def iter_history_newest_first(weather_file, layout=LAYOUT_NEWEST_FIRST):
+    """
+    Iterate over the whole logical history (current file and segments), newest first
+
+    Files are opened one after the other, so consumers that stop early only
+    read the most recent file(s).
+    """
+    for path in reversed(history_files(weather_file)):
+        for row in iter_rows_newest_first(path, layout):
+            yield row
+
+def read_latest_history_row(weather_file, layout=LAYOUT_NEWEST_FIRST, city=None):
+    """
+    Read the most recent row of the logical history
+
+    Falls back to the newest segment when the current file has just been
+    rotated and holds no rows yet. With a city, the newest row of that city
+    is returned instead; when several cities share one file only the most
+    recent CITY_SCAN_ROWS rows are searched before falling back to the
+    newest row of any city.
+    """
+    if city:
+        name = city_name(city).lower()
+        for count, row in enumerate(iter_history_newest_first(weather_file, layout)):
+            if count >= CITY_SCAN_ROWS:
+                break
+            if row.get('city', '').lower() == name:
+                return row
+
+    for path in reversed(history_files(weather_file)):
+        row = read_latest_row(path, layout)
+        if row:
+            return row
+    return None
+
+def convert_history_layout(weather_file, from_layout, to_layout):
+    """Convert the current file and every segment to a different CSV layout"""
+    converted = False
+    for path in history_files(weather_file):
+        converted = convert_csv_layout(path, from_layout, to_layout) or converted
+    return converted
+
+def copy_history(old_file, new_file):
+    """
+    Copy a weather history to a new location
+
+    The current file and all of its segments are copied, with segments
+    renamed to match the new file name.
+    """
+    ensure_parent_dir(new_file)
+    old_pattern = _segment_pattern(old_file)
+    new_stem, new_ext = os.path.splitext(os.path.abspath(new_file))
+
+    for path in list_segments(old_file):
+        suffix = old_pattern.match(os.path.basename(path))
+        date_str, counter = suffix.group(1), suffix.group(2)
+        target = f"{new_stem}-{date_str}-{counter}{new_ext}" if counter else f"{new_stem}-{date_str}{new_ext}"
+        shutil.copy2(path, target)
+
+    if os.path.exists(old_file):
+        shutil.copy2(old_file, new_file)
+
+
+def needs_migration(weather_file, upgrade=False):
+    """
+    Check if a CSV file uses an older column layout
+
+    The legacy combined timestamp format always needs a migration. A header
+    that only lacks columns added since (such as 'observed') is still
+    written correctly, because appends keep the existing column order, so
+    it is only reported when upgrade is set.
+    """
+    header = read_header(weather_file)
+    if not header:
+        return False
+    if header[0] == 'timestamp' and 'longitude' not in header:
+        return True
+    return upgrade and header != WEATHER_FIELDNAMES and set(header) < set(WEATHER_FIELDNAMES)
+
+def _migrate_row(row):
+    """Convert a row of an older layout to the current columns (missing values stay empty)"""
+    new_row = {field: row.get(field) or '' for field in WEATHER_FIELDNAMES}
+
+    # Split a legacy combined timestamp into date and time
+    if 'timestamp' in row:
+        parts = (row['timestamp'] or '').split(' ')
+        if len(parts) >= 2:
+            new_row['date'] = parts[0]
+            new_row['time'] = parts[1]
+    return new_row
+
+def migrate_legacy_csv(weather_file, progress=None):
+    """
+    Migrate a CSV of an older layout to the current columns
+
+    The file is backed up with a streamed copy and then transformed row by
+    row into a temporary file that atomically replaces the original, so
+    memory use stays constant and the original is never left half written.
+
+    Args:
+        weather_file: CSV file to migrate
+        progress: Optional callback receiving (bytes_done, total_bytes)
+
+    Returns:
+        int: Number of rows migrated
+    """
+    backup_file = f"{weather_file}.bak"
+    shutil.copyfile(weather_file, backup_file)
+
+    total_bytes = os.path.getsize(weather_file)
+    temp_file = f"{weather_file}.tmp"
+    count = 0
+    try:
+        with open(weather_file, 'rb') as raw, open(temp_file, 'w', newline='') as dst:
+            src = io.TextIOWrapper(raw, newline='')
+            writer = csv.DictWriter(dst, fieldnames=WEATHER_FIELDNAMES)
+            writer.writeheader()
+
+            for row in csv.DictReader(src):
+                writer.writerow(_migrate_row(row))
+                count += 1
+                if progress and count % MIGRATION_PROGRESS_ROWS == 0:
+                    # The raw position shows how much the text layer has consumed
+                    progress(raw.tell(), total_bytes)
+
+        os.replace(temp_file, weather_file)
+    except Exception:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+        raise
+
+    if progress:
+        progress(total_bytes, total_bytes)
+    return count
@@ -4,11 +4,42 @@ Weather tab functionality for NOTCH Data Tool
 import tkinter as tk
 from tkinter import ttk, messagebox
 import os
-import csv
-import requests
 from datetime import datetime
 import webbrowser
 import shutil
+import threading
+import time
+
+from modules.history_db import BACKEND_SQLITE, HistoryDatabase, database_path_for
+from modules.binary_history import NUMPY_AVAILABLE, BinaryHistoryStore, history_dir_for
+from modules.fetch_worker import FetchWorker
+from modules.circuit_breaker import CircuitOpenError
+from modules.city_fetch import fetch_cities
+from modules.city_index import CITY_LIST_FILES, city_label, get_city_index, load_city_index
+from modules.geolocation import GeoLocator, GeolocationError
+from modules.forecast_store import ForecastStore, forecast_file_for
+from modules.weather_api import (WeatherAPIError, api_latency, is_unavailable, fetch_forecast,
+                                 build_forecast_records)
+from modules.rate_limiter import PRIORITY_LOW, RateLimitExceeded
+from modules.weather_cache import CACHE_FILE, WeatherCache, effective_ttl
+from modules.write_behind import WriteBehindWriter
+from modules.weather_store import (save_weather_rows, read_latest_history_row, rotate_history, write_header,
+                                   needs_migration, migrate_legacy_csv, city_file_for, city_name,
+                                   WEATHER_FIELDNAMES)
+
+# Milliseconds between checks for finished background fetches
+FETCH_POLL_MS = 100
+
+# Settings that change the history files wait this long for queued records to be written
+DRAIN_TIMEOUT_MS = 5000
+
+def format_age(seconds):
+    """Short human readable age, e.g. '45 s', '12 min', '3.5 h'"""
+    if seconds < 60:
+        return f"{seconds:.0f} s"
+    if seconds < 3600:
+        return f"{seconds / 60:.0f} min"
+    return f"{seconds / 3600:.1f} h"
 
 class WeatherTab:
     def __init__(self, app):
@@ -16,18 +47,73 @@ class WeatherTab:
         self.app = app
         self.tab = app.weather_content  # Use the scrollable content area instead of the direct frame
         
+        # Background CSV migration state
+        self.migration_thread = None
+        self.migration_callbacks = []
+        self.migration_failed = False  # Keep the original layout for the rest of the session
+        
+        # Optional binary history mirrored from the CSV
+        self.binary_store = None
+        self.open_binary_store()
+        
+        # Optional SQLite history backend (pending while it is filled from the CSV history)
+        self.history_db = None
+        self.pending_history_db = None
+        self.open_history_db()
+        
+        # All history writes go through a background writer thread
+        self.writer = WriteBehindWriter(
+            self._write_batch,
+            batch_size=self.app.flush_batch_size,
+            flush_interval=self.app.flush_interval,
+            on_flush=lambda stats: self.app.root.after(0, lambda: self._show_writer_stats(stats)),
+            on_error=lambda e: self.app.root.after(0, lambda: self.app.status_label.config(
+                text=f"Error saving weather data: {str(e)}"))
+        )
+        
+        # Provider observation time (dt) last stored per lower-case city
+        self.last_observed = {}
+        
+        # Last good (weather_data, fetched_at) per lower-case city, repeated during outages
+        self.last_good = {}
+        
+        # Recent API responses are reused instead of requested again
+        self.cache = None
+        self.open_cache()
+        
+        # HTTP requests run on a worker thread; results are polled from the UI thread
+        self.fetch_worker = FetchWorker(self._fetch_job)
+        
+        # Forecast slots merged per (city, target time) into their own CSV, on a separate worker
+        self.forecast_store = None
+        self.forecast_worker = FetchWorker(self._forecast_job)
+        
         # Create the Weather Tab UI
         self.create_weather_tab()
         
+        self.app.root.after(FETCH_POLL_MS, self.poll_fetch_results)
+        
+        # City index for autocomplete and ID lookup (downloaded from the Settings tab)
+        self.city_suggestions = {}  # Suggested label -> index entry
+        self.load_city_index()
+        
+        # IP geolocation, cached per public IP
+        self.geolocator = GeoLocator()
+        self.geolocate_thread = None
+        
     def create_weather_tab(self):
         """Create the weather tab UI"""
         # City and Location Controls
         loc_frame = ttk.Frame(self.tab)
         loc_frame.pack(fill=tk.X, pady=(0, 10))
         
-        self.city_entry = ttk.Entry(loc_frame, width=15)
+        # City entry with suggestions from the offline city index
+        self.city_entry = ttk.Combobox(loc_frame, width=25)
         self.city_entry.insert(0, self.app.city)
         self.city_entry.pack(side=tk.LEFT, padx=(0, 5))
+        self.city_entry.bind("<KeyRelease>", self.suggest_cities)
+        self.city_entry.bind("<<ComboboxSelected>>", lambda e: self.update_city())
+        self.city_entry.bind("<Return>", lambda e: self.update_city())
         
         self.set_city_btn = ttk.Button(loc_frame, text="Set City", command=self.update_city)
         self.set_city_btn.pack(side=tk.LEFT, padx=5)
@@ -80,6 +166,15 @@ class WeatherTab:
         self.feels_like_label = ttk.Label(info_frame, text="Feels like: -- °C")
         self.feels_like_label.pack(anchor="w", pady=2)
         
+        self.forecast_label = ttk.Label(info_frame, text="Forecast: --")
+        if self.app.forecast_enabled:
+            self.forecast_label.pack(anchor="w", pady=2)
+        
+        # Status of the additional monitored cities
+        self.cities_frame = ttk.LabelFrame(details_frame, text="Monitored Cities")
+        self.city_status_labels = {}
+        self.refresh_city_list()
+        
         # CSV link frame
         csv_frame = ttk.Frame(self.tab)
         csv_frame.pack(fill=tk.X, pady=(10, 0))
@@ -101,6 +196,266 @@ class WeatherTab:
         )
         self.csv_path.pack(anchor="w")
 
+    def open_cache(self):
+        """Create the response cache according to the settings"""
+        self.cache = WeatherCache(
+            self.cache_ttl(), CACHE_FILE if self.app.cache_persist else None,
+            on_error=lambda e: self.app.root.after(0, lambda: self.app.status_label.config(
+                text=f"Error saving weather cache: {str(e)}")))
+
+    def cache_ttl(self):
+        """
+        Seconds a response is reused: the configured time, capped below the
+        shortest poll interval so that scheduled updates always make a request
+        """
+        interval = self.app.min_interval if self.app.adaptive_polling else self.app.update_interval
+        return effective_ttl(self.app.cache_ttl, min(interval, self.app.update_interval))
+
+    def open_binary_store(self):
+        """Open (or close) the binary history store according to the settings"""
+        self.binary_store = None
+        if not self.app.binary_history:
+            return False
+            
+        if not NUMPY_AVAILABLE:
+            self.app.status_label.config(text="Binary history needs NumPy (pip install numpy)")
+            return False
+            
+        try:
+            self.binary_store = BinaryHistoryStore(history_dir_for(self.app.weather_file))
+            return True
+        except Exception as e:
+            self.app.status_label.config(text=f"Error opening binary history: {str(e)}")
+            return False
+
+    def open_history_db(self, on_ready=None):
+        """
+        Open (or close) the SQLite history according to the settings
+        
+        An empty database is filled from the existing CSV history once, on a
+        background thread. New records are written to it during the import,
+        but queries only switch to it once the import has finished.
+        on_ready is called on the UI thread when the database serves queries.
+        
+        Returns:
+            bool: True if the database was opened
+        """
+        self.close_history_db()
+        if self.app.history_backend != BACKEND_SQLITE:
+            return False
+            
+        try:
+            history_db = HistoryDatabase(database_path_for(self.app.weather_file))
+            empty = history_db.count() == 0
+        except Exception as e:
+            self.app.status_label.config(text=f"Error opening history database: {str(e)}")
+            return False
+            
+        if not empty:
+            self.history_db = history_db
+            if on_ready:
+                on_ready()
+            return True
+            
+        self.pending_history_db = history_db
+        self.app.status_label.config(text="Indexing weather history...")
+        weather_files = self.csv_files()
+        layout = self.app.csv_layout
+        
+        def run():
+            try:
+                count = sum(history_db.import_csv(weather_file, layout) for weather_file in weather_files)
+                error = None
+            except Exception as e:
+                count, error = 0, e
+            self.app.root.after(0, lambda: self._finish_history_import(history_db, count, error, on_ready))
+            
+        thread = threading.Thread(target=run)
+        thread.daemon = True
+        thread.start()
+        return True
+    
+    def _finish_history_import(self, history_db, count, error, on_ready):
+        """Switch queries to the imported SQLite history (UI thread)"""
+        # The database was closed or replaced while importing
+        if self.pending_history_db is not history_db:
+            return
+        self.pending_history_db = None
+        
+        if error:
+            history_db.close()
+            self.app.status_label.config(text=f"Error indexing weather history: {str(error)}")
+            return
+            
+        self.history_db = history_db
+        self.app.status_label.config(text=f"Weather history indexed ({count} rows)")
+        if on_ready:
+            on_ready()
+    
+    def close_history_db(self):
+        """Close the SQLite history, including one still being filled from the CSV history"""
+        for history_db in (self.history_db, self.pending_history_db):
+            if history_db:
+                history_db.close()
+        self.history_db = None
+        self.pending_history_db = None
+
+    def after_writes(self, action, on_timeout=None, waited=0):
+        """
+        Run action once the queued records are written, so they still go to the old history files
+        
+        The writer is polled from the Tk loop instead of being waited for, so
+        the UI stays responsive. If the records are not written within
+        DRAIN_TIMEOUT_MS (or the writer stays paused by another change)
+        the change is dropped and on_timeout is called.
+        """
+        if not self.writer.paused and self.writer.drain(timeout=0):
+            action()
+        elif waited >= DRAIN_TIMEOUT_MS:
+            self.app.status_label.config(text="Weather data is still being written - settings not changed, try again")
+            if on_timeout:
+                on_timeout()
+        else:
+            self.app.root.after(FETCH_POLL_MS, lambda: self.after_writes(action, on_timeout, waited + FETCH_POLL_MS))
+
+    def export_history_db(self):
+        """
+        Regenerate the current CSV files from the SQLite history
+        
+        Each file receives the cities that are written to it: the main file
+        only the main city when cities are partitioned, all monitored cities
+        otherwise.
+        
+        Returns:
+            int: Number of rows written
+        """
+        cities = self.monitored_cities()
+        if self.app.partition_by_city:
+            targets = [(self.csv_file_for(None), [city_name(cities[0])])]
+            targets.extend((self.csv_file_for(city), [city_name(city)]) for city in cities[1:])
+        else:
+            targets = [(self.app.weather_file, [city_name(city) for city in cities])]
+            
+        return sum(self.history_db.export_csv(weather_file, self.app.csv_layout, names)
+                   for weather_file, names in targets)
+
+    def monitored_cities(self):
+        """The main city followed by the additional cities, without duplicates"""
+        cities = [self.app.city]
+        seen = {self.app.city.lower()}
+        for city in self.app.extra_cities:
+            if city.lower() not in seen:
+                seen.add(city.lower())
+                cities.append(city)
+        return cities
+
+    def refresh_city_list(self):
+        """Rebuild the per-city status rows for the additional cities"""
+        for widget in self.cities_frame.winfo_children():
+            widget.destroy()
+        self.city_status_labels = {}
+        
+        extra_cities = self.monitored_cities()[1:]
+        if not extra_cities:
+            self.cities_frame.pack_forget()
+            return
+        
+        self.cities_frame.pack(fill=tk.X, pady=5)
+        for city in extra_cities:
+            row = ttk.Frame(self.cities_frame)
+            row.pack(fill=tk.X, padx=5, pady=2)
+            ttk.Label(row, text=f"{city}:", width=15).pack(side=tk.LEFT)
+            self.city_status_labels[city] = ttk.Label(row, text="Waiting for data")
+            self.city_status_labels[city].pack(side=tk.LEFT)
+
+    def csv_file_for(self, city=None):
+        """CSV file that receives the rows of a city (None for the main city)"""
+        if city is None or not self.app.partition_by_city:
+            return self.app.weather_file
+        return city_file_for(self.app.weather_file, city)
+
+    def csv_files(self):
+        """All CSV files written with the current settings, main file first"""
+        files = [self.app.weather_file]
+        if self.app.partition_by_city:
+            files.extend(self.csv_file_for(city) for city in self.monitored_cities()[1:])
+        return files
+
+    def load_city_index(self, download=False, on_complete=None):
+        """
+        Load the offline city index on a background thread
+        
+        Without download only an index built earlier, or one built from a
+        local copy of the city list, is loaded; downloading the OWM city
+        list (about 10 MB) is only done when asked for in the Settings tab.
+        
+        Args:
+            on_complete: Optional callback run on the UI thread when done
+        """
+        def run():
+            try:
+                build = download or any(os.path.exists(path) for path in CITY_LIST_FILES)
+                index = load_city_index(build=build)
+                message = f"City index ready ({len(index)} cities)" if index else None
+            except Exception as e:
+                message = f"City index unavailable: {str(e)}"
+            self.app.root.after(0, lambda: finish(message))
+            
+        def finish(message):
+            if message:
+                self.app.status_label.config(text=message)
+            self.resolve_city_ids()
+            if on_complete:
+                on_complete()
+            
+        thread = threading.Thread(target=run)
+        thread.daemon = True
+        thread.start()
+
+    def suggest_cities(self, event=None):
+        """Offer the cities starting with the typed text as drop-down values"""
+        if event is not None and event.keysym in ("Return", "Up", "Down", "Escape"):
+            return
+        index = get_city_index()
+        if index is None:
+            return
+            
+        entries = index.search(self.city_entry.get())
+        self.city_suggestions = {city_label(entry): entry for entry in entries}
+        self.city_entry['values'] = list(self.city_suggestions)
+
+    def resolve_city_id(self, city):
+        """
+        Look up the OpenWeatherMap ID of a city query and remember it
+        
+        A suggestion picked from the drop-down gives the exact city; typed
+        names are resolved through the city index when they are unambiguous.
+        Known IDs are saved in the [CityIDs] section of config.ini and used
+        for the requests instead of the name.
+        
+        Returns:
+            bool: True if a new ID was stored
+        """
+        key = city.lower()
+        if key in self.app.city_ids:
+            return False
+            
+        entry = self.city_suggestions.get(city)
+        index = get_city_index()
+        if entry is None and index is not None:
+            entry = index.resolve(city)
+        if entry is None:
+            return False
+            
+        self.app.city_ids[key] = entry['id']
+        return True
+
+    def resolve_city_ids(self):
+        """Resolve the IDs of all monitored cities (once the index is loaded)"""
+        changed = [self.resolve_city_id(city) for city in self.monitored_cities()]
+        if any(changed):
+            self.app.save_config()
+
     def update_city(self):
         """Update the city and refresh weather"""
         new_city = self.city_entry.get().strip()
@@ -108,7 +463,9 @@ class WeatherTab:
             return
             
         self.app.city = new_city
+        self.resolve_city_id(new_city)
         self.city_label.config(text=f"Weather for {self.app.city}")
+        self.refresh_city_list()
         self.app.save_config()
         
         # Refresh weather data
@@ -116,131 +473,369 @@ class WeatherTab:
             self.fetch_weather()
 
     def geolocate_location(self):
-        """Get the user's location based on IP address"""
-        try:
-            self.app.status_label.config(text="Detecting location...")
-            self.app.root.update()  # Force GUI update
-            
-            # Use a free IP geolocation service
-            response = requests.get("http://ip-api.com/json/")
-            if response.status_code == 200:
-                data = response.json()
-                if data.get("status") == "success":
-                    # Update city entry with detected city
-                    detected_city = data.get("city", "")
-                    if detected_city:
-                        self.city_entry.delete(0, tk.END)
-                        self.city_entry.insert(0, detected_city)
-                        self.update_city()
-                        self.app.status_label.config(text=f"Location detected: {detected_city}")
-                    else:
-                        self.app.status_label.config(text="Could not determine your city")
-                else:
-                    self.app.status_label.config(text="Geolocation failed")
-            else:
-                self.app.status_label.config(text=f"Geolocation error: {response.status_code}")
-        except Exception as e:
-            self.app.status_label.config(text=f"Geolocation error: {str(e)}")
+        """Detect the user's city from the public IP address on a background thread"""
+        if self.geolocate_thread:
+            return
+            
+        self.app.status_label.config(text="Detecting location...")
+        self.geolocate_btn.config(state="disabled")
+        
+        def run():
+            try:
+                location, error = self.geolocator.locate(), None
+            except Exception as e:
+                location, error = None, e
+            self.app.root.after(0, lambda: self._finish_geolocation(location, error))
+            
+        self.geolocate_thread = threading.Thread(target=run)
+        self.geolocate_thread.daemon = True
+        self.geolocate_thread.start()
+
+    def _finish_geolocation(self, location, error):
+        """Switch to the detected city and keep its coordinates (UI thread)"""
+        self.geolocate_thread = None
+        self.geolocate_btn.config(state="normal")
+        
+        if error:
+            message = str(error) if isinstance(error, GeolocationError) else f"Geolocation error: {str(error)}"
+            self.app.status_label.config(text=message)
+            return
+            
+        city = location['city']
+        if location['country_code']:
+            city = f"{city},{location['country_code']}"
+        self.app.city_coords[city.lower()] = (location['lat'], location['lon'])
+        
+        self.city_entry.delete(0, tk.END)
+        self.city_entry.insert(0, city)
+        self.update_city()
+        
+        status = f"Location detected: {city}"
+        if location['cached']:
+            status += " (cached)"
+        self.app.status_label.config(text=status)
 
     def fetch_weather(self):
-        """Fetch weather data from API"""
+        """Request a weather update from the background fetch worker"""
         if not self.app.api_key:
             self.app.status_label.config(text="API Key not set")
             self.app.notebook.select(self.app.settings_tab_frame)  # Switch to settings tab
             return
             
-        try:
-            url = f"https://api.openweathermap.org/data/2.5/weather?q={self.app.city}&appid={self.app.api_key}&units=metric"
-            response = requests.get(url)
-            
-            if response.status_code != 200:
-                error_msg = f"Error: {response.status_code}"
-                data = response.json()
-                if "message" in data:
-                    error_msg += f" - {data['message']}"
-                self.app.status_label.config(text=error_msg)
-                return
-                
-            data = response.json()
-            
-            # Save the data to CSV
+        self.fetch_worker.submit((tuple(self.monitored_cities()), self.app.api_key))
+
+    def _fetch_job(self, job):
+        """
+        Fetch and parse the weather for a (cities, api_key) job (worker thread)
+        
+        See fetch_cities: cached cities need no request, the others are
+        fetched in parallel, in batch mode through group requests.
+        
+        Returns:
+            tuple: ([(city, result, error), ...] in the order of the cities, elapsed seconds, request count)
+        """
+        cities, api_key = job
+        start = time.perf_counter()
+        results, request_count = fetch_cities(cities, api_key, self.cache, self.app.api_base_url,
+                                              self.app.city_ids, self.app.city_coords, self.app.batch_requests)
+        return results, time.perf_counter() - start, request_count
+
+    def poll_fetch_results(self):
+        """Handle finished fetches on the UI thread and reschedule the poll"""
+        for job, result, error in self.fetch_worker.poll():
+            self._handle_fetch_result(result, error)
+        for job, result, error in self.forecast_worker.poll():
+            self._handle_forecast_result(result, error)
+        self.app.root.after(FETCH_POLL_MS, self.poll_fetch_results)
+
+    def _handle_fetch_result(self, result, error):
+        """Save and display a finished fetch"""
+        if error:
+            self.app.status_label.config(text=f"Error: {str(error)}")
+            return
+        
+        results, elapsed, request_count = result
+        for index, (city, city_result, city_error) in enumerate(results):
+            if index == 0:
+                self._handle_main_city(city_result, city_error, len(results), elapsed, request_count)
+            else:
+                self._handle_extra_city(city, city_result, city_error)
+        
+        self._remember_city_ids(results)
+        
+        # Count the requests and let adaptive polling pick the next interval
+        main_result = results[0][1]
+        self.app.adapt_interval(main_result[1] if main_result else None, request_count)
+        self.app.update_quota_label()
+
+    def fetch_forecast(self):
+        """Queue a forecast refresh of the monitored cities on the forecast worker"""
+        if not self.app.api_key or not self.app.forecast_enabled:
+            return
+        self.forecast_worker.submit((tuple(self.monitored_cities()), self.app.api_key))
+
+    def _forecast_job(self, job):
+        """
+        Fetch the forecast of every city and merge it into the forecast store (worker thread)
+        
+        Forecast requests are background work and use low priority, so they
+        are the first to be skipped when the rate limit is close.
+        
+        Returns:
+            tuple: (changed slot records, [(city, error), ...])
+        """
+        cities, api_key = job
+        path = forecast_file_for(self.app.weather_file)
+        if self.forecast_store is None or self.forecast_store.path != path:
+            self.forecast_store = ForecastStore(path)
+        
+        issued = datetime.now()
+        changes, errors = [], []
+        for city in cities:
             try:
-                # Get current date and time separately
-                now = datetime.now()
-                date_str = now.strftime("%Y-%m-%d")
-                time_str = now.strftime("%H:%M:%S")
-                
-                # Extract the most important weather data
-                weather_data = {
-                    'date': date_str,
-                    'time': time_str,
-                    'city': data['name'],
-                    'description': data['weather'][0]['description'],
-                    'temperature': data['main']['temp'],
-                    'feels_like': data['main']['feels_like'],
-                    'humidity': data['main']['humidity'],
-                    'pressure': data['main']['pressure'],
-                    'wind_speed': data['wind']['speed'],
-                    'wind_deg': data['wind'].get('deg', ''),
-                    'visibility': data.get('visibility', ''),
-                    'longitude': data['coord']['lon'],
-                    'latitude': data['coord']['lat']
-                }
-                
-                # Ensure the directory exists
-                os.makedirs(os.path.dirname(os.path.abspath(self.app.weather_file)), exist_ok=True)
-                
-                # Check if file exists and handle CSV format migration if needed
-                file_exists = False
-                existing_rows = []
-                fieldnames = list(weather_data.keys())
-                
-                try:
-                    with open(self.app.weather_file, 'r', newline='') as f:
-                        # Read first line to check header format
-                        first_line = f.readline().strip()
-                        file_exists = True
-                        
-                        # Check if the CSV format needs migration
-                        if first_line.startswith('timestamp,') and 'longitude' not in first_line:
-                            self.app.status_label.config(text="Migrating CSV format...")
-                            self.app.root.update()  # Force GUI update to show status
-                            self.migrate_csv_format()
-                            self.app.status_label.config(text="CSV migration completed")
-                        else:
-                            # If no migration needed, read existing data
-                            f.seek(0)  # Go back to beginning of file
-                            reader = csv.DictReader(f)
-                            existing_rows = list(reader)
-                            
-                except FileNotFoundError:
-                    pass
-                
-                # Write to CSV file with newest entry at the top
-                with open(self.app.weather_file, 'w', newline='') as f:
-                    writer = csv.DictWriter(f, fieldnames=fieldnames)
-                    writer.writeheader()
-                    
-                    # Write the new row first (at the top)
-                    writer.writerow(weather_data)
-                    
-                    # Write all existing rows after
-                    for row in existing_rows:
-                        # Ensure all rows have the same fieldnames
-                        cleaned_row = {field: row.get(field, '') for field in fieldnames}
-                        writer.writerow(cleaned_row)
-                
-                # Update UI with weather information
-                self.update_weather_ui(data)
-                
-                # Update status
-                self.app.status_label.config(text=f"Last updated: {time_str}")
-                
+                data = fetch_forecast(api_key, city, base_url=self.app.api_base_url, priority=PRIORITY_LOW,
+                                      city_id=self.app.city_ids.get(city.lower()),
+                                      coords=self.app.city_coords.get(city.lower()))
+                changes.extend(self.forecast_store.merge(build_forecast_records(data, issued),
+                                                         rotation=self.app.rotation,
+                                                         max_bytes=self.app.rotation_max_bytes))
             except Exception as e:
-                self.app.status_label.config(text=f"Error saving weather data: {str(e)}")
-                
+                errors.append((city, e))
+        return changes, errors
+
+    def _handle_forecast_result(self, result, error):
+        """Show a finished forecast refresh"""
+        if error:
+            self.app.status_label.config(text=f"Forecast error: {str(error)}")
+            return
+        
+        changes, errors = result
+        self.app.update_quota_label()
+        
+        for city, city_error in errors:
+            self.app.status_label.config(text=f"Forecast error for {city}: {str(city_error)}")
+        self.update_forecast_ui(len(changes))
+
+    def update_forecast_ui(self, changed=None):
+        """Show the next forecast slot of the main city"""
+        if not self.app.forecast_enabled:
+            self.forecast_label.pack_forget()
+            return
+        self.forecast_label.pack(anchor="w", pady=2)
+        
+        slots = self.forecast_store.slots(city_name(self.app.city), time.time()) if self.forecast_store else []
+        if not slots:
+            self.forecast_label.config(text="Forecast: --")
+            return
+        
+        slot = slots[0]
+        text = f"Forecast {slot['target_time'][:5]}: {float(slot['temperature']):.1f} °C, {slot['description']}"
+        if changed is not None:
+            text += f" ({changed} slots changed)"
+        self.forecast_label.config(text=text)
+
+    def _remember_city_ids(self, results):
+        """Store the city IDs returned by the API so later updates request them by ID"""
+        changed = False
+        for city, city_result, _ in results:
+            city_id = city_result[0].get('id') if city_result else None
+            if city_id and self.app.city_ids.get(city.lower()) != city_id:
+                self.app.city_ids[city.lower()] = city_id
+                changed = True
+        if changed:
+            self.app.save_config()
+
+    def _handle_main_city(self, result, error, city_count, elapsed, request_count):
+        """Save and display the weather of the main city"""
+        if error:
+            known = isinstance(error, (WeatherAPIError, RateLimitExceeded, CircuitOpenError))
+            status = str(error) if known else f"Error: {str(error)}"
+            age = self.serve_stale(error)
+            if age is not None:
+                status += f" - repeating the reading from {format_age(age)} ago"
+            self.app.status_label.config(text=status)
+            return
+            
+        data, weather_data, now, fetched_at = result
+        self.last_good[self.app.city.lower()] = (weather_data, fetched_at)
+        
+        try:
+            stored = self.store_record(weather_data, now)
+            
+            # Update UI with weather information
+            self.update_weather_ui(data)
+            
+            # Update status with the time and the API round trip
+            if stored:
+                status = f"Last updated: {weather_data['time']}"
+            else:
+                status = f"No new observation (checked {weather_data['time']})"
+            if city_count > 1:
+                requests_text = "1 request" if request_count == 1 else f"{request_count} requests"
+                status += f" ({city_count} cities, {requests_text}, {elapsed * 1000:.0f} ms)"
+            elif now.timestamp() - fetched_at >= 1:
+                status += f" (cached {now.timestamp() - fetched_at:.0f} s ago)"
+            else:
+                latency = api_latency(self.app.api_base_url).get('last_latency')
+                if latency:
+                    status += f" ({latency * 1000:.0f} ms)"
+            self.app.status_label.config(text=status)
+            
         except Exception as e:
-            self.app.status_label.config(text=f"Error: {str(e)}")
+            self.app.status_label.config(text=f"Error saving weather data: {str(e)}")
+
+    def _handle_extra_city(self, city, result, error):
+        """Save an additional city's weather and show it in its status row"""
+        label = self.city_status_labels.get(city)
+        if error:
+            age = self.serve_stale(error, city)
+            if label:
+                known = isinstance(error, (WeatherAPIError, RateLimitExceeded, CircuitOpenError))
+                text = str(error) if known else f"Error: {str(error)}"
+                if age is not None:
+                    text += f" (repeating reading from {format_age(age)} ago)"
+                label.config(text=text)
+            return
+        
+        data, weather_data, now, fetched_at = result
+        self.last_good[city.lower()] = (weather_data, fetched_at)
+        stored = self.store_record(weather_data, now, city)
+        
+        if label:
+            checked = weather_data['time'] if stored else f"unchanged, checked {weather_data['time']}"
+            label.config(text=f"{data['main']['temp']:.1f} °C, {weather_data['description']} ({checked})")
+
+    def serve_stale(self, error, city=None):
+        """
+        Write the last good reading of a city again while fresh data is unavailable
+        
+        The repeated row gets the current date and time and its age in the
+        'stale_seconds' column, so NOTCH keeps receiving data during an
+        outage and can tell how old it is. Errors in the request itself
+        (unknown city, invalid key) are not covered.
+        
+        Returns:
+            float: Age of the repeated reading in seconds, None if nothing was written
+        """
+        if not self.app.stale_fallback or not is_unavailable(error):
+            return None
+        
+        key = (city or self.app.city).lower()
+        if key not in self.last_good:
+            self.last_good[key] = self._stored_reading(city)
+        if not self.last_good[key]:
+            return None
+        
+        weather_data, fetched_at = self.last_good[key]
+        now = datetime.now()
+        age = max(0, now.timestamp() - fetched_at)
+        record = dict(weather_data, date=now.strftime("%Y-%m-%d"), time=now.strftime("%H:%M:%S"),
+                      stale_seconds=int(age))
+        self.store_record(record, now, city, stale=True)
+        return age
+
+    def store_record(self, weather_data, now, city=None, stale=False):
+        """
+        Save a fetched record unless it repeats the last stored observation
+        
+        Writes wait for a pending CSV migration to finish first. Stale
+        records always repeat an observation and are written regardless.
+        New records of the main city are also sent to the MIDI mapping.
+        
+        Returns:
+            bool: False if the observation was unchanged and nothing was written
+        """
+        if self.app.skip_duplicates and not stale and self._is_duplicate(weather_data, city):
+            return False
+        
+        if self.migration_thread or self.files_needing_migration():
+            self.migrate_csv_format(on_complete=lambda: self.save_weather_record(weather_data, now, city))
+        else:
+            self.save_weather_record(weather_data, now, city)
+        
+        if city is None and getattr(self.app, 'midi', None):
+            self.app.midi.send_weather_burst(weather_data)
+        return True
+
+    def _is_duplicate(self, weather_data, city=None):
+        """Compare the provider observation time (dt) with the last one stored for the city"""
+        observed = str(weather_data.get('observed', ''))
+        if not observed:
+            return False
+        
+        key = (city or self.app.city).lower()
+        if key not in self.last_observed:
+            self.last_observed[key] = self._stored_observation(city)
+        if self.last_observed[key] == observed:
+            return True
+        
+        self.last_observed[key] = observed
+        return False
+
+    def _latest_stored_row(self, city=None):
+        """Newest stored row of a city (None for the main city), or None"""
+        name = city_name(city or self.app.city)
+        try:
+            if self.history_db:
+                row = self.history_db.latest(name)
+            else:
+                row = read_latest_history_row(self.csv_file_for(city), self.app.csv_layout, name)
+        except Exception:
+            return None
+        
+        if not row or str(row.get('city', '')).lower() != name.lower():
+            return None
+        return row
+
+    def _stored_observation(self, city=None):
+        """
+        Observation time of the newest stored row of a city (None for the main city)
+        
+        The main city's is read from the binary history when it is enabled,
+        without parsing any text; the CSV or SQLite history is the fallback.
+        """
+        if city is None and self.binary_store is not None:
+            try:
+                latest = self.binary_store.latest()
+            except Exception:
+                latest = None
+            observed = latest.get('observed') if latest else None
+            if observed is not None and observed == observed:  # NaN for rows stored before the column existed
+                return str(int(observed))
+        
+        row = self._latest_stored_row(city)
+        observed = row.get('observed') if row else None
+        return str(observed) if observed not in (None, '') else None
+
+    def latest_reading(self, city=None):
+        """
+        Latest good reading of a city (None for the main city)
+        
+        Returns:
+            dict: The weather record, or None if there is none yet
+        """
+        key = (city or self.app.city).lower()
+        reading = self.last_good.get(key) or self._stored_reading(city)
+        return reading[0] if reading else None
+
+    def _stored_reading(self, city=None):
+        """
+        Newest stored reading of a city as a (weather_data, fetched_at) pair
+        
+        Used after a restart during an outage, before any fetch succeeded.
+        """
+        row = self._latest_stored_row(city)
+        if not row:
+            return None
+        try:
+            written = datetime.strptime(f"{row['date']} {row['time']}", "%Y-%m-%d %H:%M:%S").timestamp()
+            stale_seconds = float(row.get('stale_seconds') or 0)
+        except (KeyError, TypeError, ValueError):
+            return None
+        
+        weather_data = {field: row.get(field, '') for field in WEATHER_FIELDNAMES}
+        weather_data['stale_seconds'] = 0
+        return weather_data, written - stale_seconds
     
     def update_weather_ui(self, data):
         """Update UI with weather data"""
@@ -276,18 +871,14 @@ class WeatherTab:
     def load_weather_from_csv(self):
         """Load the most recent weather data from CSV file"""
         try:
-            if not os.path.exists(self.app.weather_file):
-                return False
-                
-            with open(self.app.weather_file, 'r', newline='') as f:
-                reader = csv.DictReader(f)
-                rows = list(reader)
-                
-            if not rows:
+            # Use an indexed lookup when the SQLite history is enabled, otherwise
+            # seek straight to the newest CSV row instead of parsing the whole history
+            if self.history_db:
+                latest = self.history_db.latest(city_name(self.app.city)) or self.history_db.latest()
+            else:
+                latest = read_latest_history_row(self.app.weather_file, self.app.csv_layout, self.app.city)
+            if not latest:
                 return False
-                
-            # Get the first entry (since we now add new entries at the top)
-            latest = rows[0]
             
             # Update UI with this data - safely handle potential data type issues
             try:
@@ -340,88 +931,142 @@ class WeatherTab:
             self.app.status_label.config(text=f"Error loading weather data: {str(e)}")
             return False
 
+    def save_weather_record(self, weather_data, now, city=None):
+        """
+        Queue a weather record for the background writer (never blocks the UI)
+        
+        city names the additional city the record belongs to (None for the main city).
+        """
+        if not self.writer.enqueue((weather_data, int(now.timestamp()), city)):
+            self.app.status_label.config(text="Write queue full - weather record dropped")
+
+    def _write_batch(self, records, done):
+        """
+        Write a batch of (weather_data, timestamp, city) records (writer thread)
+        
+        Every CSV file and store that has been written is added to done, so a
+        retry after a failure only writes the ones that are still missing.
+        """
+        # Group the rows by the CSV file they belong to, keeping their order
+        rows_by_file = {}
+        for weather_data, _, city in records:
+            rows_by_file.setdefault(self.csv_file_for(city), []).append(weather_data)
+        
+        for weather_file, rows in rows_by_file.items():
+            if ('csv', weather_file) in done:
+                continue
+            
+            # Roll the current file into a segment if the rotation policy requires it
+            rotate_history(weather_file, self.app.rotation, self.app.rotation_max_bytes)
+            
+            # Write the new rows using the configured layout
+            save_weather_rows(weather_file, rows, self.app.csv_layout)
+            done.add(('csv', weather_file))
+        
+        # Mirror the main city's numeric fields into the binary history
+        if self.binary_store is not None and 'binary' not in done:
+            self.binary_store.append_many([(weather_data, timestamp)
+                                           for weather_data, timestamp, city in records if city is None])
+            done.add('binary')
+            
+        # Index the records of every city in the SQLite history, also while it is being imported
+        history_db = self.history_db or self.pending_history_db
+        if history_db and 'sqlite' not in done:
+            history_db.insert_many([(weather_data, timestamp) for weather_data, timestamp, _ in records])
+            done.add('sqlite')
+
+    def _show_writer_stats(self, stats):
+        """Show write queue depth and flush latency in the status bar"""
+        self.app.storage_label.config(
+            text=f"Queue: {stats['queue_depth']} | Write: {stats['last_flush_latency'] * 1000:.0f} ms"
+        )
+
+    def close(self):
+        """Stop the fetch worker, write any queued records and close the history stores"""
+        self.fetch_worker.stop()
+        self.forecast_worker.stop()
+        self.writer.stop()
+        self.close_history_db()
+
+    def files_needing_migration(self, upgrade=False):
+        """
+        CSV files that still use an older column layout (none once a migration has failed)
+        
+        With upgrade, files that only lack newer columns are included.
+        """
+        if self.migration_failed and not upgrade:
+            return []
+        return [weather_file for weather_file in self.csv_files() if needs_migration(weather_file, upgrade)]
+
     def check_and_migrate_csv_format(self):
-        """Check if CSV needs migration and perform it if necessary"""
+        """Check if CSV needs migration and start it in the background if necessary"""
         try:
-            if os.path.exists(self.app.weather_file):
-                with open(self.app.weather_file, 'r') as f:
-                    # Read first line to check header format
-                    first_line = f.readline().strip()
-                    
-                    # Check if the CSV format needs migration
-                    if first_line.startswith('timestamp,') and 'longitude' not in first_line:
-                        self.app.status_label.config(text="Migrating CSV format...")
-                        self.app.root.update()  # Force GUI update to show status
-                        self.migrate_csv_format()
-                        self.app.status_label.config(text="CSV migration completed")
+            if self.files_needing_migration():
+                self.migrate_csv_format()
         except Exception as e:
             self.app.status_label.config(text=f"Error checking CSV format: {str(e)}")
     
-    def migrate_csv_format(self):
-        """Migrate existing CSV to new format with separate date/time columns and coordinates"""
-        try:
-            # Create a backup of the current file
-            backup_file = f"{self.app.weather_file}.bak"
-            if os.path.exists(self.app.weather_file):
-                with open(self.app.weather_file, 'r', newline='') as src, open(backup_file, 'w', newline='') as dst:
-                    dst.write(src.read())
-                
-                # Read the old format
-                rows = []
-                with open(self.app.weather_file, 'r', newline='') as f:
-                    reader = csv.DictReader(f)
-                    fieldnames = reader.fieldnames
-                    for row in reader:
-                        rows.append(row)
-                
-                # Create the new format file
-                if rows:
-                    with open(self.app.weather_file, 'w', newline='') as f:
-                        # Define new fieldnames
-                        new_fieldnames = ['date', 'time', 'city', 'description', 'temperature', 
-                                        'feels_like', 'humidity', 'pressure', 'wind_speed', 
-                                        'wind_deg', 'visibility', 'longitude', 'latitude']
-                        
-                        writer = csv.DictWriter(f, fieldnames=new_fieldnames)
-                        writer.writeheader()
-                        
-                        # Convert each row
-                        for row in rows:
-                            # Split timestamp into date and time if available
-                            date_str = ""
-                            time_str = ""
-                            if 'timestamp' in row:
-                                parts = row['timestamp'].split(' ')
-                                if len(parts) >= 2:
-                                    date_str = parts[0]
-                                    time_str = parts[1]
-                            
-                            # Create new row
-                            new_row = {
-                                'date': date_str,
-                                'time': time_str,
-                                'city': row.get('city', ''),
-                                'description': row.get('description', ''),
-                                'temperature': row.get('temperature', ''),
-                                'feels_like': row.get('feels_like', ''),
-                                'humidity': row.get('humidity', ''),
-                                'pressure': row.get('pressure', ''),
-                                'wind_speed': row.get('wind_speed', ''),
-                                'wind_deg': row.get('wind_deg', ''),
-                                'visibility': row.get('visibility', ''),
-                                'longitude': '',  # No coordinates in old format
-                                'latitude': ''    # No coordinates in old format
-                            }
-                            writer.writerow(new_row)
-        except Exception as e:
-            messagebox.showerror("Migration Error", f"Error migrating CSV format: {str(e)}")
-            # If there was an error, try to restore from backup
-            if os.path.exists(backup_file):
-                try:
-                    os.replace(backup_file, self.app.weather_file)
-                    self.app.status_label.config(text="Restored from backup due to error.")
-                except Exception:
-                    self.app.status_label.config(text="Failed to restore from backup.")
+    def migrate_csv_format(self, on_complete=None, upgrade=False):
+        """
+        Migrate existing CSV files to the current column layout
+        
+        Each file is transformed row by row on a background thread while the
+        status bar shows progress. on_complete is called on the UI thread
+        once the files are ready to be written again. If the migration
+        fails the files keep their layout, are written as they are and are
+        not migrated again this session. With upgrade, files that only lack
+        newer columns are migrated too.
+        """
+        if on_complete:
+            self.migration_callbacks.append(on_complete)
+            
+        # A migration is already running - the callback will run when it finishes
+        if self.migration_thread:
+            return
+            
+        weather_files = self.files_needing_migration(upgrade)
+        if not weather_files:
+            self._finish_migration(None)
+            return
+            
+        self.app.status_label.config(text="Migrating CSV format...")
+        
+        def report_progress(done, total):
+            percent = int(done * 100 / total) if total else 100
+            self.app.root.after(0, lambda: self.app.status_label.config(text=f"Migrating CSV format... {percent}%"))
+            
+        def run():
+            try:
+                for weather_file in weather_files:
+                    migrate_legacy_csv(weather_file, progress=report_progress)
+                error = None
+            except Exception as e:
+                error = e
+            self.app.root.after(0, lambda: self._finish_migration(error))
+            
+        self.migration_thread = threading.Thread(target=run)
+        self.migration_thread.daemon = True
+        self.migration_thread.start()
+    
+    def _finish_migration(self, error):
+        """Report the migration result and run the queued callbacks (UI thread)"""
+        self.migration_thread = None
+        
+        if error:
+            # The original file is only replaced once the new one is complete
+            messagebox.showerror("Migration Error", f"Error migrating CSV format: {str(error)}")
+            # Keep writing in the original layout instead of retrying on every write
+            self.migration_failed = True
+            self.app.status_label.config(text="CSV migration failed, original file kept")
+        else:
+            self.app.status_label.config(text="CSV migration completed")
+        
+        callbacks, self.migration_callbacks = self.migration_callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                self.app.status_label.config(text=f"Error saving weather data: {str(e)}")
     
     def open_csv_file(self, event=None):
         """Open the CSV file with the default application"""
@@ -433,11 +1078,7 @@ class WeatherTab:
             
             # Create the file if it doesn't exist
             if not os.path.exists(self.app.weather_file):
-                with open(self.app.weather_file, 'w', newline='') as f:
-                    writer = csv.writer(f)
-                    writer.writerow(['date', 'time', 'city', 'description', 'temperature', 
-                                   'feels_like', 'humidity', 'pressure', 'wind_speed', 
-                                   'wind_deg', 'visibility', 'longitude', 'latitude'])
+                write_header(self.app.weather_file)
             
             # Use the appropriate command based on the operating system
             if os.name == 'nt':  # Windows
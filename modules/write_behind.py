@@ -0,0 +1,219 @@
+"""
+Background write-behind queue for NOTCH Data Tool
+"""
+import queue
+import threading
+import time
+
+# Default queue and flush settings
+DEFAULT_QUEUE_SIZE = 1000
+DEFAULT_BATCH_SIZE = 50
+DEFAULT_FLUSH_INTERVAL = 1.0  # Seconds a record may wait before being written
+
+
+class WriteBehindWriter:
+    """
+    Dedicated writer thread fed by a bounded queue
+
+    Callers only enqueue records; the writer thread collects them into
+    batches and hands each batch to the sink function once batch_size
+    records are waiting or flush_interval seconds have passed since the
+    first one arrived. A failed batch is kept and retried on its own after
+    another interval, so a temporarily unavailable disk or network share
+    does not lose data; new records wait in the queue meanwhile. The sink
+    also receives a set that survives the retries of a batch, in which it
+    records the stages it has completed so a retry does not write them
+    twice. While the writer is paused records are accepted but not
+    written, so the files can be rewritten by someone else.
+    """
+
+    def __init__(self, sink, batch_size=DEFAULT_BATCH_SIZE, flush_interval=DEFAULT_FLUSH_INTERVAL,
+                 max_queue=DEFAULT_QUEUE_SIZE, on_flush=None, on_error=None):
+        """
+        Args:
+            sink: Function called with a list of records to persist and the set of
+                stages already completed for them (writer thread)
+            batch_size: Number of records that triggers an immediate flush
+            flush_interval: Maximum seconds a record waits in the queue
+            max_queue: Maximum number of queued records
+            on_flush: Optional callback receiving the stats dict after each flush
+            on_error: Optional callback receiving the exception of a failed flush
+        """
+        self.sink = sink
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = max(0.0, flush_interval)
+        self.on_flush = on_flush
+        self.on_error = on_error
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._pending = []
+        self._done = set()
+        self._idle = threading.Condition()
+        self._unwritten = 0  # Records accepted but not written yet, guarded by _idle
+        self._running = True
+        self._paused = False
+        self._flush_lock = threading.Lock()  # Held while the sink runs
+
+        # Statistics
+        self.records_written = 0
+        self.records_dropped = 0
+        self.flush_count = 0
+        self.last_flush_latency = 0.0
+        self.max_flush_latency = 0.0
+        self._total_flush_latency = 0.0
+
+        self._thread = threading.Thread(target=self._run, name="WriteBehindWriter")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def enqueue(self, record):
+        """
+        Queue a record for writing without blocking
+
+        Returns:
+            bool: False if the queue was full and the record was dropped
+        """
+        with self._idle:
+            try:
+                self._queue.put_nowait(record)
+            except queue.Full:
+                self.records_dropped += 1
+                return False
+            self._unwritten += 1
+        return True
+
+    def queue_depth(self):
+        """Number of records waiting to be written"""
+        return self._queue.qsize() + len(self._pending)
+
+    def stats(self):
+        """Queue and flush statistics"""
+        average = self._total_flush_latency / self.flush_count if self.flush_count else 0.0
+        return {
+            'queue_depth': self.queue_depth(),
+            'records_written': self.records_written,
+            'records_dropped': self.records_dropped,
+            'flush_count': self.flush_count,
+            'last_flush_latency': self.last_flush_latency,
+            'avg_flush_latency': average,
+            'max_flush_latency': self.max_flush_latency
+        }
+
+    def drain(self, timeout=5.0):
+        """
+        Wait until everything queued so far has been written
+
+        A timeout of 0 only checks whether the writer is idle.
+
+        Returns:
+            bool: True if the queue drained before the timeout
+        """
+        deadline = time.monotonic() + timeout
+        with self._idle:
+            while self._unwritten:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._thread.is_alive():
+                    return False
+                self._idle.wait(min(remaining, 0.1))
+        return True
+
+    @property
+    def paused(self):
+        """True while records are held back by pause()"""
+        return self._paused
+
+    def pause(self):
+        """Stop writing until resume(), waiting for a flush in progress to finish"""
+        self._paused = True
+        with self._flush_lock:
+            pass
+
+    def resume(self):
+        """Write the records held back by pause()"""
+        self._paused = False
+
+    def stop(self, timeout=5.0):
+        """Flush the remaining records and stop the writer thread"""
+        self._running = False
+        self._thread.join(timeout)
+
+    def _run(self):
+        """Writer thread loop"""
+        first_arrival = None
+        retry_at = None
+
+        while self._running or not self._queue.empty():
+            # A failed batch is retried on its own, leaving new records in the queue
+            if retry_at is not None:
+                if not self._running:
+                    break
+                remaining = retry_at - time.monotonic()
+                if remaining > 0 or self._paused:
+                    time.sleep(min(remaining, 0.1))
+                elif self._flush():
+                    retry_at = None
+                    first_arrival = None
+                else:
+                    retry_at = time.monotonic() + max(self.flush_interval, 0.1)
+                continue
+
+            # Wait for the next record, but never beyond the flush deadline
+            if self._pending and first_arrival is not None and not self._paused:
+                wait = max(0.0, first_arrival + self.flush_interval - time.monotonic())
+            else:
+                wait = 0.1
+            try:
+                record = self._queue.get(timeout=wait)
+                self._pending.append(record)
+                if first_arrival is None:
+                    first_arrival = time.monotonic()
+            except queue.Empty:
+                pass
+
+            due = first_arrival is not None and time.monotonic() - first_arrival >= self.flush_interval
+            if self._paused and self._running:
+                continue
+            if self._pending and (len(self._pending) >= self.batch_size or due or not self._running):
+                first_arrival = None
+                if not self._flush():
+                    retry_at = time.monotonic() + max(self.flush_interval, 0.1)
+
+        # Final attempt for anything still pending or queued at shutdown
+        if not self._pending or self._flush():
+            while not self._queue.empty():
+                self._pending.append(self._queue.get_nowait())
+            if self._pending:
+                self._flush()
+        with self._idle:
+            self._idle.notify_all()
+
+    def _flush(self):
+        """Hand the pending batch to the sink and record the latency"""
+        batch = self._pending
+        start = time.perf_counter()
+        with self._flush_lock:
+            # Paused since the batch was collected
+            if self._paused and self._running:
+                return False
+            try:
+                self.sink(batch, self._done)
+            except Exception as e:
+                if self.on_error:
+                    self.on_error(e)
+                return False
+
+        latency = time.perf_counter() - start
+        self._pending = []
+        self._done = set()
+        with self._idle:
+            self._unwritten -= len(batch)
+            self._idle.notify_all()
+        self.records_written += len(batch)
+        self.flush_count += 1
+        self.last_flush_latency = latency
+        self.max_flush_latency = max(self.max_flush_latency, latency)
+        self._total_flush_latency += latency
+
+        if self.on_flush:
+            self.on_flush(self.stats())
+        return True
@@ -1,10 +1,16 @@
 #!/usr/bin/env python3
 # NOTCH Data Tool - Main Application
+import sys
 import tkinter as tk
 from modules.app import NOTCHDataTool
 
 if __name__ == "__main__":
+    # "backfill" runs the historical backfill from the command line instead of the GUI
+    if len(sys.argv) > 1 and sys.argv[1] == "backfill":
+        from modules.backfill import main
+        sys.exit(main(sys.argv[2:]))
+        
     root = tk.Tk()
     app = NOTCHDataTool(root)
     root.protocol("WM_DELETE_WINDOW", app.on_closing)
-    root.mainloop()
\ No newline at end of file
+    root.mainloop()
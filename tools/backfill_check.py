@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Backfill resume check for NOTCH Data Tool
+
+Serves a stand-in for the OpenWeatherMap History API (/history/city) on
+localhost, runs the backfill command against it in a scratch directory
+and makes it exit right after it merged the CSV segment of the Nth day,
+before that day reaches the SQLite database, the binary history and the
+checkpoint. It then runs the backfill again. The check passes when every
+day is in the CSV history, the SQLite database and the binary history
+exactly once, and the second run did not request the days the first one
+had finished.
+
+Usage:
+    python tools/backfill_check.py [--days 10] [--kill-after 3] [--keep]
+"""
+import argparse
+import base64
+import csv
+import json
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from modules.binary_history import NUMPY_AVAILABLE, BinaryHistoryStore, history_dir_for
+from modules.weather_store import list_segments
+
+CITY = "London"
+
+# First run: the backfill command, ending the process without any cleanup
+# right after the given number of days were merged into their CSV segments
+CRASHING_BACKFILL = """
+import os, sys
+sys.path.insert(0, {root!r})
+import modules.backfill as backfill
+
+merged = []
+merge_segment_rows = backfill.merge_segment_rows
+
+def merge_then_crash(*args, **kwargs):
+    path = merge_segment_rows(*args, **kwargs)
+    merged.append(path)
+    if len(merged) >= {kill_after}:
+        os._exit(9)
+    return path
+
+backfill.merge_segment_rows = merge_then_crash
+sys.exit(backfill.main(sys.argv[1:]))
+"""
+
+
+class FakeHistoryServer(ThreadingHTTPServer):
+    """Local /history/city endpoint returning one entry per hour, recording every request"""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), HistoryHandler)
+        self.requests = []
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def requested_days(self):
+        """Days requested so far (YYYY-MM-DD of the start parameter)"""
+        with self.lock:
+            return [datetime.fromtimestamp(start).strftime("%Y-%m-%d") for start in self.requests]
+
+
+class HistoryHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != "/history/city":
+            self.send_error(404)
+            return
+
+        params = parse_qs(url.query)
+        start, end = int(params['start'][0]), int(params['end'][0])
+        with self.server.lock:
+            self.server.requests.append(start)
+
+        first = start + (-start) % 3600
+        entries = [{
+            'dt': dt,
+            'weather': [{'description': 'clear sky'}],
+            'main': {'temp': 10 + dt % 7, 'feels_like': 9, 'humidity': 70, 'pressure': 1015},
+            'wind': {'speed': 3.0, 'deg': 180},
+            'visibility': 10000
+        } for dt in range(first, end + 1, 3600)]
+
+        body = json.dumps({'cod': '200', 'city_id': 2643743, 'cnt': len(entries), 'list': entries}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # The backfill ended while waiting for this day
+
+    def log_message(self, format, *args):
+        pass
+
+
+def write_config(directory):
+    """config.ini for the backfill: SQLite and binary history on, generous rate limits"""
+    with open(os.path.join(directory, "config.ini"), 'w') as f:
+        f.write("[Settings]\n"
+                f"api_key = {base64.b64encode(b'test-key').decode()}\n"
+                f"city = {CITY}\n"
+                "weather_file = weather.csv\n"
+                "history_backend = sqlite\n"
+                f"binary_history = {NUMPY_AVAILABLE}\n"
+                "rate_limit_per_minute = 600\n"
+                "rate_limit_per_day = 100000\n")
+
+def run_backfill(directory, base_url, first_day, last_day, kill_after=None):
+    """
+    Run the backfill command in the scratch directory
+
+    With kill_after, the process ends right after that many days were merged into the CSV history.
+
+    Returns:
+        subprocess.CompletedProcess: The finished run (output in stdout)
+    """
+    arguments = [f"--start={first_day:%Y-%m-%d}", f"--end={last_day:%Y-%m-%d}",
+                 f"--base-url={base_url}", "--workers=2"]
+    if kill_after:
+        command = [sys.executable, "-c", CRASHING_BACKFILL.format(root=ROOT_DIR, kill_after=kill_after)]
+    else:
+        command = [sys.executable, os.path.join(ROOT_DIR, "notch_data_tool.py"), "backfill"]
+    return subprocess.run(command + arguments, cwd=directory, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                          text=True, timeout=120)
+
+def finished_days(directory):
+    """Days recorded as finished in the backfill checkpoint"""
+    try:
+        with open(os.path.join(directory, "weather.csv.backfill.json")) as f:
+            return set(json.load(f)[CITY.lower()]['done'])
+    except (OSError, ValueError, KeyError, TypeError):
+        return set()
+
+def check_history(directory, days):
+    """
+    Compare the stored history with the expected hourly rows
+
+    Returns:
+        list: Problems found (empty if the history is complete)
+    """
+    problems = []
+    weather_file = os.path.join(directory, "weather.csv")
+    expected = days * 24
+
+    rows = []
+    for segment in list_segments(weather_file):
+        with open(segment, newline='') as f:
+            rows.extend((row['date'], row['time']) for row in csv.DictReader(f))
+    if len(rows) != expected or len(set(rows)) != len(rows):
+        problems.append(f"CSV: {len(rows)} rows ({len(set(rows))} distinct), expected {expected}")
+
+    connection = sqlite3.connect(os.path.join(directory, "weather.db"))
+    count = connection.execute("SELECT COUNT(*) FROM observations").fetchone()[0]
+    connection.close()
+    if count != expected:
+        problems.append(f"SQLite: {count} rows, expected {expected}")
+
+    if NUMPY_AVAILABLE:
+        store = BinaryHistoryStore(history_dir_for(weather_file))
+        timestamps = store.column('epoch').tolist()
+        if len(timestamps) != expected or timestamps != sorted(set(timestamps)):
+            problems.append(f"Binary: {len(timestamps)} rows, expected {expected} in ascending order")
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(description="Kill and resume a backfill against a fake history server")
+    parser.add_argument("--days", type=int, default=10, help="Days to backfill")
+    parser.add_argument("--kill-after", type=int, default=3, help="Days merged into the CSV before the first run ends")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch directory")
+    args = parser.parse_args()
+
+    server = FakeHistoryServer()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    directory = tempfile.mkdtemp(prefix="notch-backfill-")
+    write_config(directory)
+
+    last_day = datetime.now() - timedelta(days=2)
+    first_day = last_day - timedelta(days=args.days - 1)
+    try:
+        # First run, ending between the CSV merge of a day and the rest of its writes
+        process = run_backfill(directory, server.base_url, first_day, last_day, args.kill_after)
+        done_before = finished_days(directory)
+        first_requests = len(server.requested_days())
+        print(f"First run ended with {process.returncode} after {len(done_before)} finished days "
+              f"({first_requests} requests)")
+
+        # Second run finishes the rest
+        process = run_backfill(directory, server.base_url, first_day, last_day)
+        print(process.stdout.strip())
+
+        repeated = done_before & set(server.requested_days()[first_requests:])
+        problems = check_history(directory, args.days)
+        if len(done_before) != args.kill_after - 1:
+            problems.append(f"First run finished {len(done_before)} days, expected {args.kill_after - 1}")
+        if process.returncode != 0:
+            problems.append(f"Second run exited with {process.returncode}")
+        if repeated:
+            problems.append(f"Finished days requested again: {', '.join(sorted(repeated))}")
+        if len(finished_days(directory)) != args.days:
+            problems.append(f"Checkpoint has {len(finished_days(directory))} of {args.days} days")
+    finally:
+        server.shutdown()
+        if args.keep:
+            print(f"Scratch directory: {directory}")
+        else:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    for problem in problems:
+        print(f"FAIL {problem}")
+    if not problems:
+        print("OK: every day stored once, finished days not fetched again")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Group request check for NOTCH Data Tool
+
+Serves a stand-in for the OpenWeatherMap current weather (/weather) and
+group (/group) endpoints on localhost and fetches a set of cities through
+fetch_cities against it: one by one, in groups, with a group response
+missing a city and with a group request the server rejects. The check
+passes when every mode produces the same per-city records as the single
+requests, with the expected number of requests, and the request count
+reported by fetch_cities matches the requests the server received.
+
+Usage:
+    python tools/group_fetch_check.py [--cities 25]
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from modules.city_fetch import fetch_cities
+from modules.rate_limiter import configure_limiter
+from modules.weather_api import GROUP_MAX_IDS
+from modules.weather_cache import WeatherCache
+
+# First OWM city ID handed out by the fake server
+FIRST_CITY_ID = 1000
+
+# Fields of a record that depend on the time of the fetch
+TIME_FIELDS = ('date', 'time')
+
+
+class FakeWeatherServer(ThreadingHTTPServer):
+    """Local /weather and /group endpoints for numbered cities, recording every request"""
+
+    daemon_threads = True
+
+    def __init__(self, names):
+        super().__init__(('127.0.0.1', 0), WeatherHandler)
+        self.ids = {name.lower(): FIRST_CITY_ID + i for i, name in enumerate(names)}
+        self.names = {city_id: name for name, city_id in zip(names, self.ids.values())}
+        self.omitted = set()    # IDs left out of group responses
+        self.rejected = set()   # IDs that make a group request fail with 400
+        self.requests = []
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def entry(self, city_id):
+        """Current weather of a city, the same for every request"""
+        return {
+            'id': city_id,
+            'name': self.names[city_id],
+            'dt': 1700000000 + city_id,
+            'coord': {'lon': city_id % 180, 'lat': city_id % 90},
+            'weather': [{'description': 'clear sky'}],
+            'main': {'temp': city_id % 40, 'feels_like': city_id % 35, 'humidity': city_id % 100,
+                     'pressure': 1000 + city_id % 50},
+            'wind': {'speed': city_id % 20, 'deg': city_id % 360},
+            'visibility': 10000
+        }
+
+    def take_requests(self):
+        """Requests since the last call, as (path, query) pairs"""
+        with self.lock:
+            requests, self.requests = self.requests, []
+        return requests
+
+
+class WeatherHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        with self.server.lock:
+            self.server.requests.append((url.path, params))
+
+        if url.path.endswith("/group"):
+            ids = [int(city_id) for city_id in params.get('id', '').split(',') if city_id]
+            if self.server.rejected & set(ids):
+                self.reply(400, {'cod': '400', 'message': 'invalid id'})
+                return
+            entries = [self.server.entry(city_id) for city_id in ids
+                       if city_id in self.server.names and city_id not in self.server.omitted]
+            self.reply(200, {'cnt': len(entries), 'list': entries})
+        elif url.path.endswith("/weather"):
+            city_id = int(params['id']) if 'id' in params else self.server.ids.get(params.get('q', '').lower())
+            if city_id not in self.server.names:
+                self.reply(404, {'cod': '404', 'message': 'city not found'})
+                return
+            self.reply(200, self.server.entry(city_id))
+        else:
+            self.send_error(404)
+
+    def reply(self, status, data):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def records_of(results):
+    """
+    Split fetch results into records and city IDs
+
+    Returns:
+        tuple: (city -> weather record without the fetch time or the error text,
+        lower-case city -> OWM city ID)
+    """
+    records = {}
+    city_ids = {}
+    for city, result, error in results:
+        if error:
+            records[city] = f"error: {error}"
+        else:
+            records[city] = {key: value for key, value in result[1].items() if key not in TIME_FIELDS}
+            city_ids[city.lower()] = result[0]['id']
+    return records, city_ids
+
+def count_paths(requests):
+    """Number of /weather and /group requests"""
+    counts = {'/weather': 0, '/group': 0}
+    for path, _ in requests:
+        for name in counts:
+            if path.endswith(name):
+                counts[name] += 1
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the batched group fetch against a fake weather server")
+    parser.add_argument("--cities", type=int, default=25, help="Number of monitored cities")
+    args = parser.parse_args()
+
+    names = [f"City{i:02d}" for i in range(args.cities)]
+    server = FakeWeatherServer(names)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    directory = tempfile.mkdtemp(prefix="notch-group-")
+    configure_limiter(600, 100000, path=os.path.join(directory, "rate_limits.json"))
+
+    def fetch(batch, city_ids, cache=None):
+        results, request_count = fetch_cities(names, "test-key", cache or WeatherCache(), server.base_url,
+                                              city_ids, batch=batch)
+        records, city_ids = records_of(results)
+        return records, city_ids, request_count, count_paths(server.take_requests())
+
+    problems = []
+    groups = -(-len(names) // GROUP_MAX_IDS)
+    try:
+        # One request per city by name: the reference records and the city IDs
+        cache = WeatherCache()
+        expected, city_ids, count, paths = fetch(False, {}, cache)
+        print(f"Single requests: {paths['/weather']} requests (request count {count})")
+        if len(city_ids) != len(names) or paths['/weather'] != len(names) or count != len(names):
+            problems.append(f"Single requests: {len(city_ids)} of {len(names)} cities "
+                            f"in {paths['/weather']} requests (request count {count})")
+
+        # Answered from the cache: nothing sent and nothing counted
+        records, _, count, paths = fetch(True, city_ids, cache)
+        print(f"Cached: {sum(paths.values())} requests (request count {count})")
+        if sum(paths.values()) or count or records != expected:
+            problems.append(f"Cached: {paths} requests, request count {count}")
+
+        checks = [
+            ("Group requests", set(), set(), {'/weather': 0, '/group': groups}),
+            ("Group response missing a city", {city_ids[names[1].lower()]}, set(),
+             {'/weather': 1, '/group': groups}),
+            ("Group request rejected", set(), {city_ids[names[0].lower()]},
+             {'/weather': min(len(names), GROUP_MAX_IDS), '/group': groups}),
+        ]
+        for label, omitted, rejected, expected_paths in checks:
+            server.omitted, server.rejected = omitted, rejected
+            records, _, count, paths = fetch(True, city_ids)
+            print(f"{label}: {paths['/group']} group and {paths['/weather']} single requests "
+                  f"(request count {count})")
+            if paths != expected_paths:
+                problems.append(f"{label}: requests {paths}, expected {expected_paths}")
+            if count != sum(paths.values()):
+                problems.append(f"{label}: request count {count}, {sum(paths.values())} requests sent")
+            differing = [city for city in names if records.get(city) != expected[city]]
+            if differing:
+                problems.append(f"{label}: records differ for {', '.join(differing)}")
+    finally:
+        server.shutdown()
+        shutil.rmtree(directory, ignore_errors=True)
+
+    for problem in problems:
+        print(f"FAIL {problem}")
+    if not problems:
+        print("OK: group fetches match the single requests")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())